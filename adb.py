@@ -0,0 +1,408 @@
+import asyncio
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from db import DB
+from metrics import timed_db
+
+log = logging.getLogger(__name__)
+
+# yozuvchi metodlar — faqat bitta "db-writer" thread'da, ketma-ket
+WRITE_METHODS = {
+    "ensure_user",
+    "set_joined_ok",
+    "save_user_context",
+    "ban_user",
+    "set_reachable",
+    "audit_start_pass",
+    "audit_checkpoint",
+    "unban_user",
+    "add_referral_if_unique",
+    "set_flag",
+    "clear_flags",
+    "wipe_flags",
+    "set_setting",
+    "set_target",
+    "reset_user_progress",
+    "wipe_all_referrals",
+    "start_season",
+    "prune_seasons",
+    "create_broadcast",
+    "broadcast_checkpoint",
+    "set_broadcast_status",
+    "enqueue_reward",
+    "claim_reward_jobs",
+    "claim_invite_link",
+    "attach_invite_link",
+    "add_invite_links",
+    "finish_reward",
+    "fail_reward",
+    "retry_failed_rewards",
+    "import_rows",
+    "rebuild_aggregates",
+    # o'qiydi, lekin board bilan bir vaqtda ko'rinishi uchun writer'da
+    "leaderboard_check",
+    "refresh_settings",
+}
+
+# SELECT metodlar — WAL read-only ulanishlar pool'ida parallel
+READ_METHODS = {
+    "get_user",
+    "load_user_context",
+    "is_banned",
+    "referrals_count",
+    "referrals_count_since",
+    "referrals_count_on",
+    "top_referrers_on",
+    "daily_totals",
+    "hourly_histogram",
+    "flag_set",
+    "get_setting",
+    "get_target",
+    "users_count",
+    "referrals_total",
+    "top_referrers",
+    "top_referrers_since",
+    "user_rank",
+    "users_at_count",
+    "users_near_goal",
+    "referrers_at_least",
+    "referrers_at_least_count",
+    "user_ids_after",
+    "active_users_count",
+    "is_reachable",
+    "unreachable_count",
+    "audit_state",
+    "audit_priority_users",
+    "joined_users_after",
+    "referrals_left_count",
+    "get_broadcast",
+    "broadcasts_by_status",
+    "settings_version",
+    "current_season",
+    "seasons_info",
+    "invite_pool_size",
+    "reward_stats",
+    "rewards_by_status",
+}
+
+# group commit'da umumiy batch'ga qo'shilmaydi: o'z tranzaksiyalarini boshqaradi (uzun/bo'lakli)
+# yoki SQL'ni commit qilingan board bilan solishtiradi
+SOLO_METHODS = {
+    "import_rows",
+    "rebuild_aggregates",
+    "prune_seasons",
+    "leaderboard_check",
+}
+
+# xotiradagi strukturadan javob beradi — thread kerak emas, loop ichida.
+# qiymat: DB dagi atribut (None bo'lsa — oddiy READ kabi pool'ga ketadi)
+MEMORY_METHODS = {
+    "user_rank": "board",
+    "top_referrers": "board",
+    "users_at_count": "board",
+    "get_setting": "settings",
+    "get_target": "settings",
+}
+
+# GroupCommitWriter: "ko'chirilgan element yo'q" belgisi (None — yopish signali, u bilan adashmasin)
+_EMPTY = object()
+
+
+class GroupCommitWriter:
+    """
+    Group commit: bitta "db-writer" thread navbatdagi yozuvlarni ochiq tranzaksiyada ketma-ket
+    bajaradi va har `window` soniyada (yoki `max_batch` yozuvda) bitta COMMIT qiladi —
+    parallel update'lar yozuvlari bitta fsync'ga yig'iladi. Har yozuv o'z SAVEPOINT'ida:
+    xato faqat o'shani bekor qiladi.
+
+    Durability oynasi: chaqiruvchi natijani faqat batch COMMIT bo'lgandan keyin oladi, ya'ni
+    tasdiqlangan yozuv yo'qolmaydi. Jarayon yiqilsa oxirgi <= `window` dagi hali javob
+    qaytmagan yozuvlar yo'qoladi (update qayta kelganda takrorlanadi). Narxi — har yozuvga
+    `window` gacha qo'shimcha kechikish va shu vaqt davomida boshqa jarayonlar (WORKERS > 1)
+    uchun yozish lock'i band.
+    """
+
+    def __init__(self, db: DB, window: float = 0.005, max_batch: int = 256):
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._q: "queue.SimpleQueue[Optional[tuple]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.ops = 0
+
+    def submit(self, fn: Callable[[], Any], solo: bool = False) -> Future:
+        fut: Future = Future()
+        self._q.put((fn, fut, solo))
+        return fut
+
+    def _run(self):
+        carry: Any = _EMPTY
+        while True:
+            item = self._q.get() if carry is _EMPTY else carry
+            carry = _EMPTY
+            if item is None:
+                return
+            fn, fut, solo = item
+            if solo:
+                self._finish([(fut, *self._call(fn))])
+                continue
+            # olingan har bir future shu ro'yxatda — BEGIN yoki COMMIT yiqilsa ham hammasi javob oladi
+            taken: List[Future] = [fut]
+            done: List[tuple] = []
+            try:
+                with self.db.transaction():
+                    deadline = time.monotonic() + self.window
+                    while True:
+                        done.append((fut, *self._call(fn, savepoint=True)))
+                        timeout = deadline - time.monotonic()
+                        if len(done) >= self.max_batch or timeout <= 0:
+                            break
+                        try:
+                            nxt = self._q.get(timeout=timeout)
+                        except queue.Empty:
+                            break
+                        if nxt is None or nxt[2]:
+                            carry = nxt
+                            break
+                        fn, fut, _ = nxt
+                        taken.append(fut)
+            except Exception as e:
+                # BEGIN/COMMIT o'tmadi — batch'dagi hamma yozuv bekor
+                log.exception("group commit xatosi")
+                done = [(f, None, e) for f in taken]
+            self.batches += 1
+            self.ops += len(done)
+            self._finish(done)
+
+    def _call(self, fn: Callable[[], Any], savepoint: bool = False) -> tuple:
+        try:
+            if savepoint:
+                with self.db.transaction():
+                    return fn(), None
+            return fn(), None
+        except Exception as e:
+            return None, e
+
+    @staticmethod
+    def _finish(done: List[tuple]):
+        for fut, result, error in done:
+            if fut.cancelled():
+                # chaqiruvchi kutishni bekor qilgan (asyncio cancel) — natija kerak emas
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "ops": self.ops,
+            "avg_batch": round(self.ops / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class UnitOfWork:
+    """
+    Bir nechta yozuvni yig'ib, bitta tranzaksiyada bajaradi:
+
+        async with adb.unit_of_work() as uow:
+            uow.save_user_context(uid, True)
+            added = uow.add_referral_if_unique(ref_id, uid)
+        added.result()  # blokdan keyin
+
+    Metodlar darhol bajarilmaydi — natija (Future) blok tugagach tayyor bo'ladi.
+    Biror yozuv xato bersa hammasi bekor va xato blokdan ko'tariladi.
+    """
+
+    def __init__(self, adb: "AsyncDB"):
+        self._adb = adb
+        self._ops: List[tuple] = []
+
+    def __getattr__(self, name: str) -> Callable[..., "asyncio.Future"]:
+        if name not in WRITE_METHODS or name in SOLO_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs) -> "asyncio.Future":
+            fut = asyncio.get_running_loop().create_future()
+            self._ops.append((name, args, kwargs, fut))
+            return fut
+
+        return call
+
+    def _apply(self, db: DB) -> List[Any]:
+        return [getattr(db, name)(*args, **kwargs) for name, args, kwargs, _ in self._ops]
+
+    async def commit(self):
+        if not self._ops:
+            return
+        try:
+            results = await self._adb.transaction(self._apply)
+        except BaseException as e:
+            for *_, fut in self._ops:
+                if not fut.done():
+                    fut.set_exception(e)
+                    # chaqiruvchi Future'ni tekshirmasa ham "never retrieved" ogohlantirishi bo'lmasin
+                    fut.exception()
+            raise
+        for (*_, fut), result in zip(self._ops, results):
+            fut.set_result(result)
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.commit()
+
+
+class AsyncDB:
+    """
+    db.DB ustidan async fasad: handlerlar `await adb.referrals_count(uid)`
+    ko‘rinishida chaqiradi, event loop esa SQLite kutib turmaydi.
+
+    - yozuvlar: bitta writer thread (SQLite baribir bitta yozuvchiga ruxsat beradi)
+    - o‘qishlar: `readers` ta read-only ulanish (WAL tufayli yozuvni bloklamaydi)
+    - inline=True: eski rejim, hammasi loop ichida (taqqoslash/o‘lchash uchun)
+    - group_commit > 0: yozuvlar shu oyna (soniya) ichida bitta COMMIT'ga yig'iladi (GroupCommitWriter)
+    - transaction(fn) / unit_of_work(): bir nechta yozuv bitta tranzaksiyada
+    """
+
+    def __init__(self, db: DB, readers: int = 4, inline: bool = False, group_commit: float = 0):
+        self.db = db
+        self.inline = inline
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self.group: Optional[GroupCommitWriter] = None
+        if group_commit > 0 and not inline:
+            self.group = GroupCommitWriter(db, window=group_commit)
+        self._reader_exec = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self._readers: "queue.SimpleQueue[DB]" = queue.SimpleQueue()
+        for _ in range(readers):
+            self._readers.put(DB(db.path, readonly=True))
+        self._n_readers = readers
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        if name in WRITE_METHODS:
+            return functools.partial(self.write, name)
+        if name in READ_METHODS:
+            return functools.partial(self.read, name)
+        raise AttributeError(name)
+
+    async def write(self, name: str, *args, **kwargs) -> Any:
+        fn = timed_db(name, functools.partial(getattr(self.db, name), *args, **kwargs))
+        return await self._submit(fn, solo=name in SOLO_METHODS)
+
+    async def _submit(self, fn: Callable[[], Any], solo: bool = False) -> Any:
+        if self.inline:
+            return fn()
+        if self.group is not None:
+            return await asyncio.wrap_future(self.group.submit(fn, solo))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, fn)
+
+    async def transaction(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """`fn(db, *args)` writer thread'da, bitta tranzaksiya ichida. Xato — hammasi bekor."""
+
+        def run():
+            with self.db.transaction():
+                return fn(self.db, *args, **kwargs)
+
+        return await self._submit(timed_db("transaction", run))
+
+    def unit_of_work(self) -> UnitOfWork:
+        return UnitOfWork(self)
+
+    async def read(self, name: str, *args, **kwargs) -> Any:
+        if self.inline or getattr(self.db, MEMORY_METHODS.get(name, ""), None) is not None:
+            return timed_db(name, functools.partial(getattr(self.db, name), *args, **kwargs))()
+        fn = timed_db(name, functools.partial(self._read_sync, name, args, kwargs))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader_exec, fn)
+
+    def _read_sync(self, name: str, args: tuple, kwargs: dict) -> Any:
+        conn = self._readers.get()
+        try:
+            return getattr(conn, name)(*args, **kwargs)
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        if self.group is not None:
+            self.group.close()
+        self._writer.shutdown(wait=True)
+        self._reader_exec.shutdown(wait=True)
+        for _ in range(self._n_readers):
+            self._readers.get().close()
+
+
+class LoopLagMonitor:
+    """
+    Event loop qancha bloklanayotganini o‘lchaydi: har `interval` soniyada
+    uxlab, kechikishni (lag) yig‘adi. DB_INLINE=1 va 0 rejimlarda solishtirish
+    uchun `LOOP_LAG_LOG_SEC` da logga yozadi.
+    """
+
+    def __init__(self, interval: float = 0.05, log_every: int = 0):
+        self.interval = interval
+        self.log_every = log_every
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.blocked_total = 0.0
+        self.max_lag = 0.0
+        self.over_100ms = 0
+        self.started_at = time.monotonic()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self.samples += 1
+            self.blocked_total += lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag > 0.1:
+                self.over_100ms += 1
+            if self.log_every and time.monotonic() - self.started_at >= self.log_every:
+                log.info("loop lag: %s", self.snapshot())
+                self.reset()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = max(1e-9, time.monotonic() - self.started_at)
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "samples": self.samples,
+            "blocked_ms": round(self.blocked_total * 1000, 1),
+            "blocked_pct": round(self.blocked_total / elapsed * 100, 3),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "over_100ms": self.over_100ms,
+        }
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from adb import AsyncDB
+from sender import TokenBucket
+
+log = logging.getLogger(__name__)
+
+# (bot, user_id) -> obuna bo'lganmi (API xatosida exception)
+Check = Callable[[Bot, int], Awaitable[bool]]
+
+
+class SubscriptionAudit:
+    """
+    Fon sweeper: joined_ok userlarning kanal a'zoligini `rps` so'rov/s byudjet bilan qayta tekshiradi.
+    Har o'tish (pass) ikki bosqich:
+    - priority: TOP referrerlar va targetga yaqinlar + ular taklif qilganlar (hisob shularga muhim)
+    - all: `users` jadvali joined_ok=1 bo'yicha keyset pagination
+    Chiqqanlar joined_ok=0 (qaytganlar 1) bo'ladi, flag_referrals=True bo'lsa referrals.left_at belgilanadi.
+    Har batch natijasi progress bilan birga `sub_audit` ga yoziladi — restartdan keyin shu joydan
+    davom etadi (eng ko'pi bitta batch qayta tekshiriladi). O'tish tugagach `period` kutiladi.
+    """
+
+    def __init__(self, adb: AsyncDB, check: Check, target: Callable[[], Awaitable[int]],
+                 rps: float = 2, chunk: int = 100, period: float = 86400,
+                 flag_referrals: bool = False, concurrency: int = 4):
+        self.adb = adb
+        self.check = check
+        self.target = target
+        self.bucket = TokenBucket(rps, burst=1)
+        self.chunk = chunk
+        self.period = period
+        self.flag_referrals = flag_referrals
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+        self._force = False
+        self.errors = 0
+        self.retry_after_hits = 0
+
+    def start(self, bot: Bot):
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def restart(self):
+        """Admin: joriy o'tishni tashlab, yangisini darhol boshlash."""
+        await self.stop()
+        self._force = True
+        self.start(self._bot)
+
+    async def _loop(self):
+        while True:
+            try:
+                st = await self.adb.audit_state()
+                if self._force or st["phase"] == "idle":
+                    wait = 0 if self._force else (st["finished_at"] or 0) + self.period - time.time()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._force = False
+                    st = await self.adb.audit_start_pass()
+                    log.info("sub audit #%s boshlandi", st["pass"])
+                await self._run_pass(st)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("sub audit xatosi")
+                await asyncio.sleep(60)
+
+    async def _run_pass(self, st: Dict):
+        if st["phase"] == "priority":
+            users = await self.adb.audit_priority_users(await self.target())
+            pos = st["position"]
+            while pos < len(users):
+                batch = users[pos:pos + self.chunk]
+                pos += len(batch)
+                await self._apply("priority", pos, *await self._check_batch(batch))
+            await self.adb.audit_checkpoint("all", 0, 0, [], [])
+            st = {**st, "phase": "all", "position": 0}
+
+        after = st["position"]
+        while True:
+            batch = await self.adb.joined_users_after(after, self.chunk)
+            if not batch:
+                break
+            after = batch[-1]
+            await self._apply("all", after, *await self._check_batch(batch))
+        await self.adb.audit_checkpoint("all", after, 0, [], [], finished=True)
+        s = await self.adb.audit_state()
+        log.info("sub audit #%s tugadi: checked=%s left=%s", s["pass"], s["checked"], s["left_cnt"])
+
+    async def _apply(self, phase: str, position: int, checked: int, left: List[int], back: List[int]):
+        await self.adb.audit_checkpoint(phase, position, checked, left, back, self.flag_referrals)
+
+    async def _check_batch(self, batch: List[int]) -> Tuple[int, List[int], List[int]]:
+        sem = asyncio.Semaphore(self.concurrency)
+        results: Dict[int, bool] = {}
+
+        async def one(uid: int):
+            async with sem:
+                ok = await self._check_one(uid)
+                if ok is not None:
+                    results[uid] = ok
+
+        tasks = []
+        for uid in batch:
+            # token bo'lmaguncha keyingi so'rov boshlanmaydi — byudjet shu yerda
+            delay = self.bucket.delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.bucket.take()
+            tasks.append(asyncio.create_task(one(uid)))
+        await asyncio.gather(*tasks)
+        left = [u for u, ok in results.items() if not ok]
+        back = [u for u, ok in results.items() if ok]
+        return len(results), left, back
+
+    async def _check_one(self, uid: int) -> Optional[bool]:
+        for _ in range(3):
+            try:
+                return await self.check(self._bot, uid)
+            except TelegramRetryAfter as e:
+                self.retry_after_hits += 1
+                self.bucket.block(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                # tarmoq xatosi va h.k. — holatni o'zgartirmaymiz
+                self.errors += 1
+                log.debug("sub audit %s: %r", uid, e)
+                return None
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rps": self.bucket.rate,
+            "running": int(self._task is not None and not self._task.done()),
+            "errors": self.errors,
+            "retry_after": self.retry_after_hits,
+        }
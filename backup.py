@@ -0,0 +1,171 @@
+"""
+Onlayn backup: SQLite backup API bilan, bot to'xtamaydi.
+
+    python backup.py [bot.db] [backups] [keep]
+
+Natija: <papka>/<nom>-<vaqt>.db.gz. Eng yangi `keep` tasi saqlanadi.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+
+def snapshot(db_path: str, directory: str, pages: int = 256, pause: float = 0.002,
+             keep: int = 7) -> Dict:
+    """
+    Sinxron (thread'da chaqiriladi):
+    1) read-only ulanishda bitta o'qish tranzaksiyasi ochiladi — WAL snapshot muzlaydi,
+       backup qadamlar orasida qayta boshlanmaydi, DB.DB yozuvlari esa davom etadi
+    2) `pages` sahifadan qadamlar, orasida `pause` — disk/CPU'ni egallab olmaydi
+    3) nusxada PRAGMA integrity_check, keyin gzip va eski nusxalarni o'chirish
+    """
+    os.makedirs(directory, exist_ok=True)
+    t0 = time.monotonic()
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    name = f"{base}-{time.strftime('%Y%m%d-%H%M%S')}.db"
+    raw = os.path.join(directory, name + ".part")
+    out = os.path.join(directory, name + ".gz")
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(raw)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+        src.backup(dst, pages=max(1, pages), progress=progress, sleep=pause)
+        src.rollback()
+        copied = time.monotonic() - t0
+        check = dst.execute("PRAGMA integrity_check").fetchone()[0]
+        version = int(dst.execute("PRAGMA user_version").fetchone()[0])
+        page_count = int(dst.execute("PRAGMA page_count").fetchone()[0])
+        dst.close()
+        if check != "ok":
+            raise RuntimeError(f"integrity_check: {check}")
+        raw_size = os.path.getsize(raw)
+        with open(raw, "rb") as f, gzip.open(out + ".part", "wb", compresslevel=6) as g:
+            shutil.copyfileobj(f, g, 1 << 20)
+        os.replace(out + ".part", out)
+    except BaseException:
+        dst.close()
+        for p in (raw, out + ".part"):
+            if os.path.exists(p):
+                os.remove(p)
+        raise
+    finally:
+        src.close()
+    os.remove(raw)
+    removed = rotate(directory, base, keep)
+    return {
+        "file": out,
+        "size": os.path.getsize(out),
+        "raw_size": raw_size,
+        "pages": page_count,
+        "steps": steps,
+        "schema": version,
+        "copy_s": round(copied, 2),
+        "total_s": round(time.monotonic() - t0, 2),
+        "removed": removed,
+    }
+
+
+def backups(directory: str, base: str = "bot") -> List[str]:
+    """Eng yangisi birinchi."""
+    if not os.path.isdir(directory):
+        return []
+    names = [n for n in os.listdir(directory) if n.startswith(base + "-") and n.endswith(".db.gz")]
+    return [os.path.join(directory, n) for n in sorted(names, reverse=True)]
+
+
+def rotate(directory: str, base: str, keep: int) -> int:
+    old = backups(directory, base)[max(1, keep):]
+    for p in old:
+        os.remove(p)
+    return len(old)
+
+
+class BackupManager:
+    """
+    Jadval bo'yicha backup (`every` soniyada) va admin so'rovi bilan darhol. Bir vaqtda bittasi.
+    Oxirgi backup vaqti papkadagi eng yangi fayldan olinadi — restartdan keyin jadval saqlanadi.
+    """
+
+    def __init__(self, db_path: str, directory: str = "backups", every: float = 6 * 3600,
+                 keep: int = 7, pages: int = 256):
+        self.db_path = db_path
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.pages = pages
+        self.base = os.path.splitext(os.path.basename(db_path))[0]
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.last: Optional[Dict] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def run(self) -> Dict:
+        async with self._lock:
+            try:
+                self.last = await asyncio.to_thread(
+                    snapshot, self.db_path, self.directory, self.pages, 0.002, self.keep
+                )
+            except Exception as e:
+                self.last = {"error": repr(e), "at": int(time.time())}
+                raise
+            log.info("backup: %s", self.last)
+            return self.last
+
+    def _last_at(self) -> float:
+        files = backups(self.directory, self.base)
+        return os.path.getmtime(files[0]) if files else 0
+
+    async def _loop(self):
+        while True:
+            wait = self._last_at() + self.every - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("backup xatosi")
+                await asyncio.sleep(min(self.every, 600))
+
+    def start(self):
+        if self._task is None and self.every > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def files(self) -> List[str]:
+        return backups(self.directory, self.base)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    result = snapshot(
+        args[0] if args else "bot.db",
+        args[1] if len(args) > 1 else "backups",
+        keep=int(args[2]) if len(args) > 2 else 7,
+    )
+    print(json.dumps(result))
@@ -0,0 +1,338 @@
+"""
+db.DB benchmark: sintetik bazalar (100k / 1M user) ustida har public metodni o'lchaydi.
+
+    python bench.py                              # 100k va 1M, natija bench_results.json
+    python bench.py --sizes 20000 --repeat 20    # tezkor
+    python bench.py --compare old.json           # oldingi natija bilan solishtirish
+
+Referral taqsimoti og'ma: bir nechta "viral" referrer + uzun dum (Pareto).
+Yaratilgan bazalar --dir da keshlanadi (seed + size bo'yicha), har o'lchashdan
+oldin nusxa olinadi — yozuvchi metodlar asl bazani buzmaydi.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from db import DB, local_day
+
+DAY = 86400
+# referral yaratilgan vaqtlar shu oraliqqa (oxirgi N kun) tarqatiladi
+SPAN_DAYS = 30
+TARGET = 5
+# o'lchanmaydigan public metodlar (ulanishni yopadi / listener qo'shadi)
+SKIP_METHODS = {"close", "on_change"}
+
+
+def generate(path: str, users: int, seed: int = 1, ref_ratio: float = 0.8):
+    """users ta user, ~ref_ratio*users ta referral. Sxema DB() orqali yaratiladi."""
+    rnd = random.Random(seed)
+    DB(path, leaderboard=False).close()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+
+    ids = list(range(1, users + 1))
+    # Pareto og'irliklar: kichik alpha — og'irroq dum (bir nechta juda katta referrer)
+    weights = [rnd.paretovariate(1.1) for _ in ids]
+    cum, acc = [], 0.0
+    for w in weights:
+        acc += w
+        cum.append(acc)
+
+    now = int(time.time())
+    invited = rnd.sample(ids, int(users * ref_ratio))
+    referrers = rnd.choices(ids, cum_weights=cum, k=len(invited))
+    refs = [
+        (r, u, now - rnd.randrange(SPAN_DAYS * DAY))
+        for r, u in zip(referrers, invited) if r != u
+    ]
+    referrer_of = {u: r for r, u, _ in refs}
+
+    conn.executemany(
+        "INSERT INTO users(user_id, referrer_id, joined_ok, banned) VALUES(?, ?, ?, ?)",
+        ((u, referrer_of.get(u), 1 if u in referrer_of else 0, 1 if rnd.random() < 0.005 else 0) for u in ids),
+    )
+    conn.executemany(
+        "INSERT INTO referrals(season_id, referrer_id, invited_user_id, created_at) VALUES(1, ?, ?, ?)", refs
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO user_flags(season_id, user_id, key) VALUES(1, ?, ?)",
+        ((r, "near_sent") for r in set(referrers[: len(referrers) // 10])),
+    )
+    conn.commit()
+    conn.close()
+    # referral_counts va rollup'lar referrals'dan qayta quriladi
+    db = DB(path, leaderboard=False)
+    db.rebuild_aggregates()
+    db.conn.execute("ANALYZE")
+    db.close()
+
+
+def dataset(directory: str, users: int, seed: int) -> str:
+    path = os.path.join(directory, f"bench_{users}_{seed}.db")
+    if not os.path.exists(path):
+        t0 = time.perf_counter()
+        generate(path + ".tmp", users, seed)
+        os.replace(path + ".tmp", path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + ".tmp" + suffix):
+                os.remove(path + ".tmp" + suffix)
+        print(f"  generated {path} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return path
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    return {
+        "n": len(s),
+        "median_ms": round(statistics.median(s) * 1000, 4),
+        "p95_ms": round(s[min(len(s) - 1, int(len(s) * 0.95))] * 1000, 4),
+        "min_ms": round(s[0] * 1000, 4),
+        "max_ms": round(s[-1] * 1000, 4),
+    }
+
+
+def _time(fn: Callable[[int], Any], repeat: int) -> Dict[str, float]:
+    samples = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    return _stats(samples)
+
+
+def cases(db: DB, users: int, rnd: random.Random) -> List[tuple]:
+    """(name, fn(i), repeat_scale). Tartib muhim: buzuvchi metodlar oxirida."""
+    cur = db.conn.execute("SELECT referrer_id FROM referral_counts ORDER BY cnt DESC LIMIT 200")
+    heavy = [int(r[0]) for r in cur.fetchall()]
+    uid = lambda i: rnd.randrange(1, users + 1)
+    new_id = lambda i: users + 1 + i
+    now = int(time.time())
+    today = local_day(now)
+    bid = db.create_broadcast(1, "bench", None, None, users)
+    # enqueue_reward yaratgan joblar — keyingi reward metodlari ular ustida
+    jobs = [db.enqueue_reward(users, TARGET)]
+    job = lambda i: jobs[i % len(jobs)]
+
+    def enqueue(i: int):
+        jid = db.enqueue_reward(uid(i), TARGET)
+        if jid is not None:
+            jobs.append(jid)
+
+    def unit_of_work(i: int):
+        with db.transaction():
+            db.save_user_context(uid(i), True)
+            db.add_referral_if_unique(heavy[i % len(heavy)], users * 3 + i)
+
+    return [
+        # o'qish
+        ("get_user", lambda i: db.get_user(uid(i)), 1),
+        ("is_banned", lambda i: db.is_banned(uid(i)), 1),
+        ("load_user_context", lambda i: db.load_user_context(uid(i)), 1),
+        ("user_ids_after", lambda i: db.user_ids_after(uid(i), 500), 1),
+        ("active_users_count", lambda i: db.active_users_count(), 0.2),
+        ("is_reachable", lambda i: db.is_reachable(uid(i)), 1),
+        ("unreachable_count", lambda i: db.unreachable_count(), 1),
+        ("joined_users_after", lambda i: db.joined_users_after(uid(i), 100), 1),
+        ("audit_priority_users", lambda i: db.audit_priority_users(TARGET), 0.2),
+        ("referrals_count", lambda i: db.referrals_count(uid(i)), 1),
+        ("referrals_count(heavy)", lambda i: db.referrals_count(heavy[i % len(heavy)]), 1),
+        ("referrals_count_since", lambda i: db.referrals_count_since(heavy[i % len(heavy)], now - 7 * DAY), 1),
+        ("referrals_count_on", lambda i: db.referrals_count_on(uid(i), today), 1),
+        ("top_referrers_on", lambda i: db.top_referrers_on(today, 10), 1),
+        ("daily_totals", lambda i: db.daily_totals(7), 1),
+        ("hourly_histogram", lambda i: db.hourly_histogram(today), 1),
+        ("flag_set", lambda i: db.flag_set(uid(i), "near_sent"), 1),
+        ("get_setting", lambda i: db.get_setting("invite_target"), 1),
+        ("get_target", lambda i: db.get_target(TARGET), 1),
+        ("settings_version", lambda i: db.settings_version(), 1),
+        ("refresh_settings", lambda i: db.refresh_settings(), 1),
+        ("schema_version", lambda i: db.schema_version(), 1),
+        ("current_season", lambda i: db.current_season(), 1),
+        ("seasons_info", lambda i: db.seasons_info(), 1),
+        ("get_broadcast", lambda i: db.get_broadcast(bid), 1),
+        ("broadcasts_by_status", lambda i: db.broadcasts_by_status("running"), 1),
+        ("users_count", lambda i: db.users_count(), 0.2),
+        ("referrals_total", lambda i: db.referrals_total(), 0.2),
+        ("top_referrers", lambda i: db.top_referrers(10), 1),
+        ("top_referrers_since(1d)", lambda i: db.top_referrers_since(now - DAY, 10), 0.2),
+        ("top_referrers_since(7d)", lambda i: db.top_referrers_since(now - 7 * DAY, 10), 0.2),
+        ("user_rank", lambda i: db.user_rank(uid(i)), 1),
+        ("user_rank(heavy)", lambda i: db.user_rank(heavy[i % len(heavy)]), 1),
+        ("users_at_count", lambda i: db.users_at_count(TARGET - 1), 1),
+        ("users_near_goal", lambda i: db.users_near_goal(TARGET - 1, 50), 1),
+        ("referrers_at_least", lambda i: db.referrers_at_least(TARGET - 1, (TARGET - 1, uid(i)), 200), 1),
+        ("referrers_at_least_count", lambda i: db.referrers_at_least_count(TARGET - 1), 0.2),
+        ("reward_stats", lambda i: db.reward_stats(), 1),
+        ("invite_pool_size", lambda i: db.invite_pool_size(), 1),
+        ("rewards_by_status", lambda i: db.rewards_by_status(("failed", "pending"), 10), 1),
+        ("audit_state", lambda i: db.audit_state(), 1),
+        ("referrals_left_count", lambda i: db.referrals_left_count(), 0.2),
+        ("in_transaction", lambda i: db.in_transaction, 1),
+        ("referral_edges", lambda i: sum(1 for _ in db.referral_edges()), 0.05),
+        ("export_rows", lambda i: sum(1 for _ in db.export_rows("referrals")), 0),
+        ("leaderboard_check", lambda i: db.leaderboard_check(), 0.05),
+        # yozish
+        ("ensure_user(new)", lambda i: db.ensure_user(new_id(i), heavy[0]), 1),
+        ("ensure_user(existing)", lambda i: db.ensure_user(uid(i)), 1),
+        ("set_joined_ok", lambda i: db.set_joined_ok(uid(i), True), 1),
+        ("save_user_context", lambda i: db.save_user_context(uid(i), True), 1),
+        ("ban_user", lambda i: db.ban_user(uid(i)), 1),
+        ("unban_user", lambda i: db.unban_user(uid(i)), 1),
+        ("set_reachable", lambda i: db.set_reachable(uid(i), bool(i % 2)), 1),
+        ("add_referral_if_unique", lambda i: db.add_referral_if_unique(heavy[i % len(heavy)], new_id(i)), 1),
+        ("add_referral_if_unique(dup)", lambda i: db.add_referral_if_unique(heavy[0], new_id(i)), 1),
+        ("set_flag", lambda i: db.set_flag(uid(i), f"bench_{i}"), 1),
+        ("clear_flags", lambda i: db.clear_flags(uid(i)), 1),
+        ("set_setting", lambda i: db.set_setting("bench", str(i)), 1),
+        ("set_target", lambda i: db.set_target(TARGET), 1),
+        ("create_broadcast", lambda i: db.create_broadcast(1, "bench", None, None, users), 1),
+        ("broadcast_checkpoint", lambda i: db.broadcast_checkpoint(bid, i, 1, 0), 1),
+        ("set_broadcast_status", lambda i: db.set_broadcast_status(bid, "running"), 1),
+        ("transaction", unit_of_work, 1),
+        ("add_invite_links", lambda i: db.add_invite_links([f"https://t.me/+b{i}_{k}" for k in range(20)]), 1),
+        ("enqueue_reward", enqueue, 1),
+        ("claim_reward_jobs", lambda i: db.claim_reward_jobs(now + i, 20), 1),
+        ("claim_invite_link", lambda i: db.claim_invite_link(job(i)), 1),
+        ("attach_invite_link", lambda i: db.attach_invite_link(job(i), f"https://t.me/+a{i}"), 1),
+        ("fail_reward", lambda i: db.fail_reward(job(i), "bench", None if i % 2 else now + 60), 1),
+        ("retry_failed_rewards", lambda i: db.retry_failed_rewards(), 1),
+        ("finish_reward", lambda i: db.finish_reward(job(i)), 1),
+        ("audit_start_pass", lambda i: db.audit_start_pass(), 1),
+        ("audit_checkpoint", lambda i: db.audit_checkpoint("all", uid(i), i, [uid(i)], [uid(i)], True), 1),
+        ("import_rows(users)", lambda i: db.import_rows(
+            "users", [(users * 2 + i * 1000 + k, None, 1, 0, 1) for k in range(1000)]), 0.2),
+        ("reset_user_progress(heavy)", lambda i: db.reset_user_progress(heavy[i % len(heavy)]), 0.2),
+        ("reset_user_progress", lambda i: db.reset_user_progress(uid(i)), 1),
+        ("rebuild_aggregates", lambda i: db.rebuild_aggregates(), 0),
+        ("wipe_flags", lambda i: db.wipe_flags(), 0),
+        ("wipe_all_referrals", lambda i: db.wipe_all_referrals(), 0),
+        ("start_season", lambda i: db.start_season(), 0),
+        ("prune_seasons", lambda i: db.prune_seasons(keep=1), 0.2),
+    ]
+
+
+def uncovered(names: Iterable[str]) -> List[str]:
+    """db.DB ning case'i yo'q public metodlari — yangi metod bench'siz qolmasin."""
+    covered = {n.split("(")[0] for n in names}
+    public = {n for n, _ in inspect.getmembers(DB) if not n.startswith("_")}
+    return sorted(public - covered - SKIP_METHODS)
+
+
+def run_size(src: str, users: int, leaderboard: bool, repeat: int, seed: int,
+             only: Optional[List[str]]) -> List[Dict[str, Any]]:
+    work = src + ".work"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(work + suffix):
+            os.remove(work + suffix)
+    shutil.copyfile(src, work)
+    out: List[Dict[str, Any]] = []
+    common = {"users": users, "leaderboard": leaderboard}
+
+    t0 = time.perf_counter()
+    db = DB(work, leaderboard=leaderboard)
+    out.append({**common, "method": "__init__", **_stats([time.perf_counter() - t0])})
+    try:
+        rnd = random.Random(seed)
+        todo = cases(db, users, rnd)
+        missing = uncovered(name for name, _, _ in todo)
+        if missing:
+            raise SystemExit(f"bench case yo'q: {', '.join(missing)}")
+        for name, fn, scale in todo:
+            if only and name.split("(")[0] not in only:
+                continue
+            n = max(1, int(repeat * scale))
+            row = {**common, "method": name, **_time(fn, n)}
+            out.append(row)
+            print(f"  {users:>8} lb={int(leaderboard)} {name:<30} median {row['median_ms']:>10.3f} ms"
+                  f"  p95 {row['p95_ms']:>10.3f} ms  (n={n})", file=sys.stderr)
+    finally:
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+    return out
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5,
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(old_path: str, results: List[Dict[str, Any]], threshold: float):
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r["users"], r["leaderboard"], r["method"]): r for r in json.load(f)["results"]}
+    print(f"\n{'users':>8} lb {'method':<30} {'old ms':>10} {'new ms':>10}  ratio")
+    regressions = 0
+    for r in results:
+        o = old.get((r["users"], r["leaderboard"], r["method"]))
+        if not o or not o["median_ms"]:
+            continue
+        ratio = r["median_ms"] / o["median_ms"]
+        mark = "  <-- sekinlashdi" if ratio > threshold else ""
+        regressions += bool(mark)
+        print(f"{r['users']:>8} {int(r['leaderboard']):>2} {r['method']:<30} "
+              f"{o['median_ms']:>10.3f} {r['median_ms']:>10.3f}  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="db.DB benchmark")
+    p.add_argument("--sizes", default="100000,1000000", help="userlar soni, vergul bilan")
+    p.add_argument("--repeat", type=int, default=200, help="har metod necha marta (og'irlari kamroq)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "referal_bench"),
+                   help="yaratilgan bazalar keshi")
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--only", default="", help="faqat shu metodlar (vergul bilan)")
+    p.add_argument("--no-sql", action="store_true", help="leaderboard=False (WORKERS>1 yo'li) o'lchanmasin")
+    p.add_argument("--compare", default="", help="oldingi natija fayli")
+    p.add_argument("--threshold", type=float, default=1.5, help="regressiya deb hisoblash koeffitsienti")
+    args = p.parse_args(argv)
+
+    os.makedirs(args.dir, exist_ok=True)
+    only = [x.strip() for x in args.only.split(",") if x.strip()] or None
+    results: List[Dict[str, Any]] = []
+    for users in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        src = dataset(args.dir, users, args.seed)
+        for lb in ([True] if args.no_sql else [True, False]):
+            results += run_size(src, users, lb, args.repeat, args.seed, only)
+
+    report = {
+        "meta": {
+            "created_at": int(time.time()),
+            "git": _git_rev(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"-> {args.out}", file=sys.stderr)
+
+    if args.compare:
+        return 1 if compare(args.compare, results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
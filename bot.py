@@ -1,48 +1,108 @@
 import os
 import re
 import asyncio
+import logging
+import shutil
+import tempfile
+import time
 from typing import Optional
 from urllib.parse import quote
 from datetime import datetime
-from zoneinfo import ZoneInfo
 
-from aiogram import Bot, Dispatcher, F
+from aiogram import Bot, Dispatcher, F, Router
 from aiogram.types import (
-    Message, CallbackQuery,
+    Message, CallbackQuery, ChatMemberUpdated,
     InlineKeyboardMarkup, InlineKeyboardButton,
-    ReplyKeyboardMarkup, KeyboardButton
+    ReplyKeyboardMarkup, KeyboardButton, FSInputFile
 )
 from aiogram.enums import ChatMemberStatus
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from aiogram.client.default import DefaultBotProperties
-from aiogram.utils.markdown import hbold
-from aiogram.types import FSInputFile
+from aiogram.utils.markdown import hbold, hcode
 
 from config import load_config
-from db import DB
+from db import DB, TZ, local_day
+from adb import AsyncDB, LoopLagMonitor
+from subcache import SubscriptionCache
+from media import MediaRegistry
+from sender import Sender, INTERACTIVE, PROGRESS
+from broadcast import Broadcaster
+from rewards import RewardQueue
+from retarget import TargetSweep
+from webhook import InflightTracker, run_webhook
+from context import UserContext, UserContextMiddleware
+from throttle import ThrottleMiddleware
+from views import ViewCache
+from workers import Supervisor
+from refgraph import ReferralGraph
+from audit import SubscriptionAudit
+from backup import BackupManager
+from dataio import DATA_TABLES, FORMATS, export_file, read_rows, table_of
+import metrics
+from metrics import ApiTimingMiddleware, HandlerTimingMiddleware
 
 cfg = load_config()
-db = DB("bot.db")
-dp = Dispatcher()
 
-# ✅ Admin ID
-ADMIN_ID = 5037587016
+# Jarayon holati — setup() to'ldiradi. Modul darajasida faqat handlerlar (router):
+# spawn bilan worker bot.py ni avval `__mp_main__`, keyin `import bot` sifatida bajaradi —
+# DB ulanishlari, reader thread'lar va migratsiyalar esa jarayonda bir marta quriladi.
+db: DB
+adb: AsyncDB
+lag_monitor: LoopLagMonitor
+sub_cache: SubscriptionCache
+media: MediaRegistry
+sender: Sender
+broadcaster: Broadcaster
+rewards: RewardQueue
+inflight: InflightTracker
+views: ViewCache
+throttle: ThrottleMiddleware
+target_sweep: TargetSweep
+audit: Optional[SubscriptionAudit] = None
+backups: BackupManager
+dp: Optional[Dispatcher] = None
+router = Router()
+_reach_tasks: set = set()
+
+
+def mark_unreachable(chat_id: int):
+    """Sender: 403 — user botni bloklagan. Keyingi bildirishnoma/broadcast'larda o'tkazib yuboriladi."""
+    if chat_id <= 0:
+        return
+    task = asyncio.create_task(adb.set_reachable(chat_id, False))
+    _reach_tasks.add(task)
+    task.add_done_callback(_reach_tasks.discard)
+
 
-TZ = ZoneInfo("Asia/Tashkent")
+def throttled_action(event) -> Optional[str]:
+    # reply tugma, inline tugma va /start — hammasi obuna tekshiruvi + asosiy post
+    if isinstance(event, CallbackQuery):
+        return "check_sub" if event.data == "check_sub" else None
+    text = getattr(event, "text", None) or ""
+    if text == "✅ Obunani tekshirish":
+        return "check_sub"
+    if text.startswith("/start"):
+        return "start"
+    return None
 
 
 def is_admin(uid: int) -> bool:
-    return uid == ADMIN_ID
+    # supervisor ham admin update'larini shu ro'yxat bo'yicha 0-workerga yo'naltiradi
+    return uid in cfg.ADMIN_IDS
+
 
+def is_owner() -> bool:
+    """Global vazifalar (broadcast va h.k.) shu jarayonda ishlaydimi."""
+    return cfg.WORKERS <= 1 or cfg.WORKER_INDEX == 0
 
-def current_target() -> int:
-    return db.get_target(cfg.INVITE_TARGET)
 
+async def current_target() -> int:
+    return await adb.get_target(cfg.INVITE_TARGET)
 
-def today_start_ts() -> int:
-    now = datetime.now(TZ)
-    start = datetime(now.year, now.month, now.day, 0, 0, 0, tzinfo=TZ)
-    return int(start.timestamp())
+
+def today_key() -> str:
+    """Bugungi mahalliy (Asia/Tashkent) kun: referral_daily kaliti."""
+    return local_day(int(time.time()))
 
 
 # ---------- UX helpers ----------
@@ -73,7 +133,8 @@ def kb_admin_panel() -> ReplyKeyboardMarkup:
             [KeyboardButton(text="📊 Hisobot"), KeyboardButton(text="🏆 TOP-10")],
             [KeyboardButton(text="🔥 4/5 ro‘yxati"), KeyboardButton(text="🧹 Hammasini 0")],
             [KeyboardButton(text="♻️ User reset"), KeyboardButton(text="🎯 Targetni o‘zgartirish")],
-            [KeyboardButton(text="🧾 Menyu")],
+            [KeyboardButton(text="📣 Broadcast"), KeyboardButton(text="📆 Kunlik statistika")],
+            [KeyboardButton(text="⏱ Metrikalar"), KeyboardButton(text="🧾 Menyu")],
         ],
         resize_keyboard=True
     )
@@ -101,34 +162,66 @@ def kb_share(bot_username: str, user_id: int) -> InlineKeyboardMarkup:
 
 
 # ---------- Helpers ----------
-async def is_subscribed(bot: Bot, user_id: int) -> bool:
+SUBSCRIBED_STATUSES = {
+    ChatMemberStatus.MEMBER,
+    ChatMemberStatus.ADMINISTRATOR,
+    ChatMemberStatus.CREATOR,
+}
+
+
+async def _fetch_subscribed(bot: Bot, user_id: int) -> bool:
     try:
         m = await bot.get_chat_member(chat_id=cfg.PUBLIC_CHANNEL, user_id=user_id)
-        return m.status in {
-            ChatMemberStatus.MEMBER,
-            ChatMemberStatus.ADMINISTRATOR,
-            ChatMemberStatus.CREATOR,
-        }
+        return m.status in SUBSCRIBED_STATUSES
     except (TelegramBadRequest, TelegramForbiddenError):
         return False
 
 
+async def is_subscribed(bot: Bot, user_id: int, explicit: bool = False) -> bool:
+    """explicit — user o'zi "tekshirish" bosdi: keshdagi "obuna emas" javobi qayta so'raladi."""
+    return await sub_cache.get(
+        cfg.PUBLIC_CHANNEL, user_id, lambda: _fetch_subscribed(bot, user_id), trust_negative=not explicit
+    )
+
+
+async def audit_check(bot: Bot, user_id: int) -> bool:
+    """
+    Audit uchun qat'iyroq: faqat aniq status (yoki user topilmadi) "chiqdi" hisoblanadi.
+    Boshqa xatolar (bot kanalda admin emas va h.k.) ko'tariladi — joined_ok o'zgarmaydi.
+    """
+    try:
+        m = await bot.get_chat_member(chat_id=cfg.PUBLIC_CHANNEL, user_id=user_id)
+    except TelegramBadRequest as e:
+        if "user not found" in str(e).lower():
+            return False
+        raise
+    ok = m.status in SUBSCRIBED_STATUSES
+    sub_cache.put(cfg.PUBLIC_CHANNEL, user_id, ok)
+    return ok
+
+
+async def reply(message: Message, text: str, **kwargs):
+    """message.answer() o'rniga — javob ham umumiy navbat/limitlardan o'tadi."""
+    return await sender.send_message(message.bot, message.chat.id, text, lane=INTERACTIVE, **kwargs)
+
+
 def parse_referrer(start_text: str) -> Optional[int]:
     m = re.search(r"ref_(\d+)", start_text)
     return int(m.group(1)) if m else None
 
 
-async def send_main_post(bot: Bot, user_id: int):
+async def send_main_post(bot: Bot, user_id: int, count: Optional[int] = None):
     """
     ✅ Obuna tasdiqlangandan keyin bitta post:
     - assets/kuch.jpg
     - caption: siz bergan matn
     """
-    me = await bot.get_me()
+    me = await bot.me()
     link = f"https://t.me/{me.username}?start=ref_{user_id}"
 
-    target = current_target()
-    count = db.referrals_count(user_id)
+    target = await current_target()
+    if count is None:
+        count = await adb.referrals_count(user_id)
     bar = progress_bar(count, target)
 
     caption = (
@@ -143,11 +236,27 @@ async def send_main_post(bot: Bot, user_id: int):
     )
 
     photo_path = os.path.join("assets", "kuch.jpg")
-    await bot.send_photo(
-        chat_id=user_id,
-        photo=FSInputFile(photo_path),
-        caption=caption,
-        reply_markup=kb_share(me.username, user_id),
+    await sender.submit(
+        user_id,
+        lambda: media.send_photo(
+            bot,
+            user_id,
+            photo_path,
+            caption=caption,
+            reply_markup=kb_share(me.username, user_id),
+        ),
+        lane=INTERACTIVE,
+    )
+
+
+async def send_near_notice(bot: Bot, user_id: int, cnt: int, target: int):
+    await sender.send_message(
+        bot,
+        user_id,
+        "🔥 DEYARLI BO‘LDI!\n\n"
+        f"Siz {cnt}/{target} ga yetdingiz.\n"
+        "Yana 1 ta odam qoldi 💪",
+        lane=PROGRESS,
     )
 
 
@@ -156,125 +265,106 @@ async def maybe_notify_and_reward(bot: Bot, referrer_id: int):
     ✅ 4/5 -> deyarlibo'ldi (1 marta)
     ✅ 5/5 -> G'ALABA + invite (1 marta)
     """
-    target = current_target()
-    cnt = db.referrals_count(referrer_id)
-
-    # 4/5
-    if cnt == target - 1 and not db.flag_set(referrer_id, "near_sent"):
-        if db.set_flag(referrer_id, "near_sent"):
-            await bot.send_message(
-                referrer_id,
-                "🔥 DEYARLI BO‘LDI!\n\n"
-                f"Siz {cnt}/{target} ga yetdingiz.\n"
-                "Yana 1 ta odam qoldi 💪"
-            )
+    target = await current_target()
+    cnt = await adb.referrals_count(referrer_id)
 
-    # 5/5
-    if cnt >= target and not db.flag_set(referrer_id, "win_sent"):
-        if db.set_flag(referrer_id, "win_sent"):
-            try:
-                invite = await bot.create_chat_invite_link(
-                    chat_id=cfg.PRIVATE_CHANNEL_ID,
-                    member_limit=1,
-                    name=f"reward_{referrer_id}"
-                )
-                await bot.send_message(
-                    referrer_id,
-                    "🏁 G‘ALABA! 🎉\n\n"
-                    f"Siz {target} ta odamni taklif qildingiz.\n"
-                    f"🔐 Yopiq kanalga 1 martalik kirish havolasi:\n{invite.invite_link}"
-                )
-            except TelegramForbiddenError:
-                await bot.send_message(
-                    referrer_id,
-                    "❌ Invite link bera olmadim.\n"
-                    "Bot yopiq kanalga ADMIN qilinganmi? Invite link yaratish huquqi bormi?"
-                )
-            except TelegramBadRequest as e:
-                await bot.send_message(referrer_id, f"❌ Invite link xatosi: {e.message}")
+    # 4/5 — botni bloklaganlarga yubormaymiz
+    if cnt == target - 1 and not await adb.flag_set(referrer_id, "near_sent") \
+            and await adb.is_reachable(referrer_id):
+        if await adb.set_flag(referrer_id, "near_sent"):
+            await send_near_notice(bot, referrer_id, cnt, target)
+
+    # 5/5 — link va xabar fon navbatida (rewards.py); bloklagan bo'lsa qaytganda beriladi
+    if cnt >= target and not await adb.flag_set(referrer_id, "win_sent"):
+        await rewards.enqueue(referrer_id, target)
 
 
 # =========================
 #   MENYU / PANELLAR
 # =========================
-@dp.message(F.text.in_({"🧾 Menyu", "/menu", "menu"}))
+@router.message(F.text.in_({"🧾 Menyu", "/menu", "menu"}))
 async def menu_cmd(message: Message):
     uid = message.from_user.id
-    if db.is_banned(uid):
-        return
-
     if is_admin(uid):
-        await message.answer("🛠 Admin menyu:", reply_markup=kb_admin_panel())
+        await reply(message, "🛠 Admin menyu:", reply_markup=kb_admin_panel())
     else:
-        await message.answer("✅ Menyu:", reply_markup=kb_user_panel())
+        await reply(message, "✅ Menyu:", reply_markup=kb_user_panel())
 
 
 # =========================
 #   USER BUTTONS
 # =========================
-@dp.message(F.text == "📈 Progressim")
-async def user_progress(message: Message):
+@router.message(F.text == "📈 Progressim")
+async def user_progress(message: Message, ctx: UserContext):
     uid = message.from_user.id
-    target = current_target()
-    cnt = db.referrals_count(uid)
+    target = await current_target()
+    cnt = ctx.referrals
     bar = progress_bar(cnt, target)
-    rank = db.user_rank(uid)
-    await message.answer(f"📈 Progress: {bar} {cnt}/{target}\n🏅 Reyting: #{rank}")
+    rank = await adb.user_rank(uid)
+    await reply(message, f"📈 Progress: {bar} {cnt}/{target}\n🏅 Reyting: #{rank}")
 
 
-@dp.message(F.text == "🔗 Referal havolam")
+@router.message(F.text == "🔗 Referal havolam")
 async def user_ref_link(message: Message, bot: Bot):
-    me = await bot.get_me()
+    me = await bot.me()
     uid = message.from_user.id
     link = f"https://t.me/{me.username}?start=ref_{uid}"
-    await message.answer(f"🔗 Sizning referal havolangiz:\n{link}")
+    await reply(message, f"🔗 Sizning referal havolangiz:\n{link}")
 
 
-@dp.message(F.text == "✅ Obunani tekshirish")
-async def user_check_sub(message: Message, bot: Bot):
+@router.message(F.text == "✅ Obunani tekshirish")
+async def user_check_sub(message: Message, bot: Bot, ctx: UserContext):
     uid = message.from_user.id
-    ok = await is_subscribed(bot, uid)
+    ok = await is_subscribed(bot, uid, explicit=True)
     if ok:
-        db.set_joined_ok(uid, True)
-        await message.answer("✅ Obuna tasdiqlandi!")
-        await send_main_post(bot, uid)
+        ctx.set_joined_ok(True)
+        await reply(message, "✅ Obuna tasdiqlandi!")
+        await send_main_post(bot, uid, ctx.referrals)
     else:
-        await message.answer(
+        await reply(
+            message,
             "❌ Hali obuna bo‘lmagansiz. Avval kanalga obuna bo‘ling 👇",
             reply_markup=kb_subscribe(cfg.PUBLIC_CHANNEL)
         )
 
 
-@dp.message(F.text == "🏆 TOP-10")
-async def user_top10(message: Message):
-    top = db.top_referrers(10)
+async def render_top10() -> str:
+    top = await adb.top_referrers(10)
     if not top:
-        await message.answer("Hali TOP-10 yo‘q.")
-        return
+        return "Hali TOP-10 yo‘q."
 
-    target = current_target()
+    target = await current_target()
     lines = [f"🏆 {hbold('TOP-10 Reyting')}\n"]
     medals = ["🥇", "🥈", "🥉"]
     for i, (uid, cnt) in enumerate(top, start=1):
         medal = medals[i-1] if i <= 3 else f"{i})"
         bar = progress_bar(cnt, target)
         lines.append(f"{medal} {uid} — {bar} {cnt}/{target}")
+    return "\n".join(lines)
 
-    await message.answer("\n".join(lines))
 
+def view_footer(generated_at: float) -> str:
+    return f"\n\n🕒 {datetime.fromtimestamp(generated_at, TZ):%H:%M:%S} holatiga"
 
-@dp.message(F.text == "📅 Bugungi natija")
+
+@router.message(F.text == "🏆 TOP-10")
+async def user_top10(message: Message):
+    html, ts = await views.get("top10", render_top10)
+    await reply(message, html + view_footer(ts))
+
+
+@router.message(F.text == "📅 Bugungi natija")
 async def user_today(message: Message):
     uid = message.from_user.id
-    since = today_start_ts()
-    today_cnt = db.referrals_count_since(uid, since)
-    await message.answer(f"📅 Bugungi natijangiz: {today_cnt} ta referral ✅")
+    today_cnt = await adb.referrals_count_on(uid, today_key())
+    await reply(message, f"📅 Bugungi natijangiz: {today_cnt} ta referral ✅")
 
 
-@dp.message(F.text == "ℹ️ Yordam")
+@router.message(F.text == "ℹ️ Yordam")
 async def user_help(message: Message):
-    target = current_target()
-    await message.answer(
+    target = await current_target()
+    await reply(
+        message,
         "ℹ️ Yordam:\n"
         "1) Kanalga obuna bo‘ling\n"
         "2) '✅ Obunani tekshirish' ni bosing\n"
@@ -286,104 +376,420 @@ async def user_help(message: Message):
 # =========================
 #   ADMIN BUTTONS
 # =========================
-@dp.message(F.text == "📊 Hisobot")
-async def admin_stats_btn(message: Message):
-    if not is_admin(message.from_user.id):
-        return
-
-    users = db.users_count()
-    refs = db.referrals_total()
-    target = current_target()
+async def render_report() -> str:
+    users = await adb.users_count()
+    unreachable = await adb.unreachable_count()
+    refs = await adb.referrals_total()
+    target = await current_target()
 
     # bugungi top-10
-    since = today_start_ts()
-    top_today = db.top_referrers_since(since, 10)
+    top_today = await adb.top_referrers_on(today_key(), 10)
 
-    txt = (
+    return (
         f"📊 {hbold('Admin Hisobot')}\n\n"
         f"👥 Userlar: {users}\n"
+        f"🚫 Botni bloklagan: {unreachable}\n"
         f"🔗 Jami referral: {refs}\n"
         f"🎯 Target: {target}\n\n"
         f"📅 Bugungi TOP-10 (son): {', '.join(str(c) for _, c in top_today) if top_today else 'yo‘q'}"
     )
-    await message.answer(txt)
 
 
-@dp.message(F.text == "🔥 4/5 ro‘yxati")
+@router.message(F.text == "📊 Hisobot")
+async def admin_stats_btn(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+
+    # DB agregatlari keshdan; runtime hisoblagichlar har safar yangi (arzon)
+    report, ts = await views.get("report", render_report)
+    sc = sub_cache.stats()
+    sq = sender.stats()
+
+    txt = (
+        f"{report}\n\n"
+        f"🔎 Obuna keshi: hit {sc['hits']} / miss {sc['misses']} / birlashgan {sc['coalesced']}\n"
+        f"📤 Navbat: {sq['depth']} ta, retry_after: {sq['retry_after']}\n"
+        + "\n".join(
+            f"   • {name}: {st['depth']} kutmoqda, o‘rtacha {st['wait_avg_ms']} ms, max {st['wait_max_ms']} ms"
+            for name, st in sq["lanes"].items()
+        )
+        + view_footer(ts)
+    )
+    await reply(message, txt)
+
+
+@router.message(F.text == "📆 Kunlik statistika")
+async def admin_daily_stats(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    days = await adb.daily_totals(7)
+    hours = await adb.hourly_histogram(today_key())
+
+    peak = max([c for _, c in days] + [1])
+    lines = [f"📆 {hbold('Oxirgi 7 kun')}"]
+    for day, cnt in days:
+        lines.append(f"{day[5:]} {progress_bar(cnt, peak)} {cnt}")
+
+    hpeak = max(hours + [1])
+    lines.append(f"\n🕐 {hbold('Bugun soatlar bo‘yicha')}")
+    now_hour = datetime.now(TZ).hour
+    for h in range(now_hour + 1):
+        lines.append(f"{h:02d}:00 {progress_bar(hours[h], hpeak)} {hours[h]}")
+    await reply(message, "\n".join(lines))
+
+
+@router.message(F.text == "⏱ Metrikalar")
+async def admin_metrics(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    lag = lag_monitor.snapshot()
+    txt = (
+        f"⏱ {hbold('Latency (start/restartdan beri)')}\n\n"
+        f"{metrics.summary_text()}\n\n"
+        f"🔁 Loop: max {lag['max_lag_ms']} ms, bloklangan {lag['blocked_pct']}%"
+    )
+    await reply(message, txt)
+
+
+@router.message(F.text == "🔥 4/5 ro‘yxati")
 async def admin_near_btn(message: Message):
     if not is_admin(message.from_user.id):
         return
-    target = current_target()
-    near = db.users_near_goal(target - 1, limit=50)
+    target = await current_target()
+    near = await adb.users_near_goal(target - 1, limit=50)
     if not near:
-        await message.answer("Hozircha 4/5 ga yetgan userlar yo‘q.")
+        await reply(message, "Hozircha 4/5 ga yetgan userlar yo‘q.")
         return
 
     lines = [f"🔥 {hbold('4/5 dagilar ro‘yxati')}\n"]
     for uid, cnt in near:
         lines.append(f"• {uid} — {cnt}/{target}")
-    await message.answer("\n".join(lines))
+    await reply(message, "\n".join(lines))
 
 
-@dp.message(F.text == "🧹 Hammasini 0")
+@router.message(F.text == "🧹 Hammasini 0")
 async def admin_wipe_btn(message: Message):
     if not is_admin(message.from_user.id):
         return
-    db.wipe_all_referrals()
-    await message.answer("✅ Hammasi 0 qilindi: referral + flaglar tozalandi.")
+    await adb.wipe_all_referrals()
+    season = await adb.current_season()
+    await reply(
+        message,
+        f"✅ Hammasi 0 qilindi: {season}-mavsum boshlandi.\n"
+        f"Eski referral va flaglar fonda o‘chiriladi (oxirgi {cfg.SEASONS_KEEP} mavsum saqlanadi).",
+    )
 
 
-@dp.message(F.text == "♻️ User reset")
+@router.message(F.text == "♻️ User reset")
 async def admin_reset_hint(message: Message):
     if not is_admin(message.from_user.id):
         return
-    await message.answer("User reset: /reset_user 123456789")
+    await reply(message, "User reset: /reset_user 123456789")
+
+
+@router.message(F.text == "📣 Broadcast")
+async def admin_broadcast_hint(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    await reply(
+        message,
+        "Hammaga xabar: /broadcast matn\n"
+        "yoki istalgan xabarga reply qilib: /broadcast\n"
+        "To‘xtatish: /broadcast_stop ID"
+    )
 
 
-@dp.message(F.text == "🎯 Targetni o‘zgartirish")
+@router.message(F.text == "🎯 Targetni o‘zgartirish")
 async def admin_target_hint(message: Message):
     if not is_admin(message.from_user.id):
         return
-    await message.answer("Target o‘zgartirish: /set_target 5")
+    await reply(message, "Target o‘zgartirish: /set_target 5")
 
 
 # =========================
 #   ADMIN COMMANDS
 # =========================
-@dp.message(F.text.startswith("/set_target"))
+@router.message(F.text.startswith("/set_target"))
 async def admin_set_target(message: Message):
     if not is_admin(message.from_user.id):
         return
     parts = (message.text or "").split()
     if len(parts) != 2 or not parts[1].isdigit():
-        await message.answer("To‘g‘ri format: /set_target 5")
+        await reply(message, "To‘g‘ri format: /set_target 5")
         return
     n = int(parts[1])
     if n < 1 or n > 1000:
-        await message.answer("Target 1..1000 oralig‘ida bo‘lsin.")
+        await reply(message, "Target 1..1000 oralig‘ida bo‘lsin.")
         return
-    db.set_target(n)
-    await message.answer(f"✅ Target yangilandi: {n}")
+    await adb.set_target(n)
+    await reply(message, f"✅ Target yangilandi: {n}")
+    # allaqachon yetganlar (yoki target-1 dagilar) yangi referralni kutmasin
+    await target_sweep.start(message.bot, message.chat.id, n)
 
 
-@dp.message(F.text.startswith("/reset_user"))
+@router.message(F.text.startswith("/reset_user"))
 async def admin_reset_user(message: Message):
     if not is_admin(message.from_user.id):
         return
     parts = (message.text or "").split()
     if len(parts) != 2 or not parts[1].isdigit():
-        await message.answer("Format: /reset_user 123456789")
+        await reply(message, "Format: /reset_user 123456789")
         return
     uid = int(parts[1])
-    db.reset_user_progress(uid)
-    await message.answer(f"✅ Reset qilindi: {uid}")
+    await adb.reset_user_progress(uid)
+    await reply(message, f"✅ Reset qilindi: {uid}")
+
+
+@router.message(F.text.startswith("/broadcast_stop"))
+async def admin_broadcast_stop(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    parts = (message.text or "").split()
+    if len(parts) != 2 or not parts[1].isdigit():
+        await reply(message, "Format: /broadcast_stop 12")
+        return
+    if await broadcaster.stop(int(parts[1])):
+        await reply(message, f"⏹ Broadcast #{parts[1]} to‘xtatilmoqda...")
+    else:
+        await reply(message, "Bunday faol broadcast yo‘q.")
+
+
+@router.message(F.text.startswith("/broadcast"))
+async def admin_broadcast(message: Message, bot: Bot):
+    if not is_admin(message.from_user.id):
+        return
+    src = message.reply_to_message
+    text = (message.text or "").partition(" ")[2].strip()
+    if src is None and not text:
+        await reply(message, "Format: /broadcast matn (yoki xabarga reply qiling)")
+        return
+    if src is not None:
+        bid = await broadcaster.start(
+            bot, message.chat.id, from_chat_id=src.chat.id, message_id=src.message_id
+        )
+    else:
+        bid = await broadcaster.start(bot, message.chat.id, text=text)
+    await reply(message, f"📣 Broadcast #{bid} boshlandi.")
+
+
+@router.message(F.text == "/lb_check")
+async def admin_lb_check(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    problems = await adb.leaderboard_check()
+    if not problems:
+        await reply(message, "✅ Reyting indeksi SQL bilan mos.")
+        return
+    lines = [f"⚠️ {hbold('Reyting farqlari')} ({len(problems)}):"]
+    lines.extend(f"• {p}" for p in problems[:20])
+    await reply(message, "\n".join(lines))
+
+
+@router.message(F.text == "/rewards")
+async def admin_rewards(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    st = await adb.reward_stats()
+    pool = await adb.invite_pool_size()
+    lines = [
+        f"🎁 {hbold('Mukofotlar')}",
+        f"✅ {st.get('done', 0)}  ⏳ {st.get('pending', 0) + st.get('sending', 0)}  ❌ {st.get('failed', 0)}",
+        f"🔗 Tayyor linklar: {pool}",
+    ]
+    for job in await adb.rewards_by_status(("failed", "pending", "sending"), 15):
+        err = (job["last_error"] or "")[:80]
+        lines.append(f"• #{job['id']} {job['user_id']} [{job['status']}] x{job['attempts']} {err}")
+    if st.get("failed"):
+        lines.append("\nQayta urinish: /reward_retry all yoki /reward_retry ID")
+    await reply(message, "\n".join(lines), disable_web_page_preview=True)
+
+
+@router.message(F.text.startswith("/reward_retry"))
+async def admin_reward_retry(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    parts = message.text.split()
+    if len(parts) != 2 or not (parts[1] == "all" or parts[1].isdigit()):
+        await reply(message, "Format: /reward_retry all yoki /reward_retry 12")
+        return
+    n = await adb.retry_failed_rewards(None if parts[1] == "all" else int(parts[1]))
+    await reply(message, f"🔁 Navbatga qaytarildi: {n} ta")
+
+
+@router.message(F.text.startswith("/audit"))
+async def admin_audit(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    if audit is None:
+        await reply(message, "Obuna auditi o‘chiq (AUDIT_RPS=0).")
+        return
+    if message.text.split()[1:] == ["restart"]:
+        await audit.restart()
+        await reply(message, "🔁 Audit qaytadan boshlandi.")
+        return
+    st = await adb.audit_state()
+    rt = audit.stats()
+    when = datetime.fromtimestamp(st["updated_at"], TZ).strftime("%d.%m %H:%M") if st["updated_at"] else "—"
+    lines = [
+        f"🔍 {hbold('Obuna auditi')} #{st['pass']} [{st['phase']}]",
+        f"👀 Tekshirildi: {st['checked']}   🚪 Chiqqan: {st['left_cnt']}",
+        f"📍 Pozitsiya: {st['position']}   🕒 {when}",
+        f"⚡ {rt['rps']} so‘rov/s   ⚠️ xato: {rt['errors']}   retry_after: {rt['retry_after']}",
+    ]
+    if cfg.AUDIT_FLAG_REFERRALS:
+        lines.append(f"🏷 Chiqqan taklif qilinganlar (mavsum): {await adb.referrals_left_count()}")
+    lines.append("\nQaytadan: /audit restart")
+    await reply(message, "\n".join(lines))
+
+
+def _fmt_size(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+@router.message(F.text == "/backup")
+async def admin_backup(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    if backups.busy:
+        await reply(message, "⏳ Backup hozir ishlayapti, biroz kuting.")
+        return
+    await reply(message, "💾 Backup boshlandi (bot ishlashda davom etadi)...")
+    try:
+        r = await backups.run()
+    except Exception as e:
+        await reply(message, f"❌ Backup xatosi: {hcode(repr(e)[:300])}")
+        return
+    await reply(
+        message,
+        f"✅ {hbold('Backup tayyor')}\n"
+        f"📄 {hcode(os.path.basename(r['file']))}\n"
+        f"📦 {_fmt_size(r['size'])} (gzip, asli {_fmt_size(r['raw_size'])})\n"
+        f"⏱ {r['total_s']} s (nusxa {r['copy_s']} s, {r['steps']} qadam)\n"
+        f"🩺 integrity_check: ok\n"
+        f"🗂 Saqlangan: {len(backups.files())} ta (o‘chirildi: {r['removed']})",
+    )
+
+
+@router.message(F.text.startswith("/export"))
+async def admin_export(message: Message, bot: Bot):
+    if not is_admin(message.from_user.id):
+        return
+    parts = message.text.split()
+    what = parts[1] if len(parts) > 1 else "all"
+    fmt = parts[2] if len(parts) > 2 else "csv"
+    names = list(DATA_TABLES) if what == "all" else [what]
+    if any(n not in DATA_TABLES for n in names) or fmt not in FORMATS:
+        await reply(message, f"Format: /export [{'|'.join(DATA_TABLES)}|all] [csv|jsonl]")
+        return
+
+    tmp = tempfile.mkdtemp(prefix="export-")
+    try:
+        for name in names:
+            started = time.monotonic()
+            # oqimli yozish alohida thread'da, o'z read-only ulanishi bilan
+            path, n = await asyncio.to_thread(export_file, db.path, name, fmt, tmp)
+            took = time.monotonic() - started
+            await sender.submit(
+                message.chat.id,
+                lambda: bot.send_document(
+                    message.chat.id, FSInputFile(path),
+                    caption=f"📦 {name}: {n} qator, {os.path.getsize(path) // 1024} KB, {took:.1f}s",
+                ),
+                lane=INTERACTIVE,
+            )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+@router.message(F.document, F.caption.startswith("/import"))
+async def admin_import(message: Message, bot: Bot):
+    if not is_admin(message.from_user.id):
+        return
+    parts = message.caption.split()
+    name = parts[1] if len(parts) > 1 else table_of(message.document.file_name or "")
+    if name not in DATA_TABLES or DATA_TABLES[name][2] is None:
+        await reply(message, "Jadval: /import users|referrals|flags (yoki fayl nomi users-....csv.gz)")
+        return
+
+    tmp = tempfile.mkdtemp(prefix="import-")
+    path = os.path.join(tmp, message.document.file_name or f"{name}.csv.gz")
+    try:
+        await bot.download(message.document, destination=path)
+        started = time.monotonic()
+        # fayl yozuvchi thread'da o'qiladi: batch executemany, katta tranzaksiyalar
+        n = await adb.import_rows(name, read_rows(path, name))
+        await reply(message, f"✅ {name}: {n} ta yangi qator ({time.monotonic() - started:.1f}s)")
+    except Exception as e:
+        await reply(message, f"❌ Import xatosi: {hcode(str(e)[:300])}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _graph_snapshot() -> ReferralGraph:
+    ro = DB(db.path, readonly=True)
+    try:
+        return ReferralGraph.from_edges(ro.referral_edges())
+    finally:
+        ro.close()
+
+
+async def referral_graph() -> ReferralGraph:
+    if db.graph is not None:
+        return db.graph
+    return await asyncio.to_thread(_graph_snapshot)
+
+
+@router.message(F.text.startswith("/graph"))
+async def admin_graph(message: Message):
+    if not is_admin(message.from_user.id):
+        return
+    parts = message.text.split()
+    if len(parts) > 2 or (len(parts) == 2 and not parts[1].isdigit()):
+        await reply(message, "Format: /graph yoki /graph USER_ID")
+        return
+    g = await referral_graph()
+
+    if len(parts) == 1:
+        # ikkalasi ham O(n): 1M tugunda ~0.1s — loop'ni to'smaslik uchun thread'da
+        st = await asyncio.to_thread(g.stats)
+        top = await asyncio.to_thread(g.top_subtrees, 10, True)
+        lines = [
+            f"🌳 {hbold('Referral grafi (joriy mavsum)')}",
+            f"Tugunlar: {st['nodes']}, qirralar: {st['edges']}, ildizlar: {st['roots']}",
+            f"Eng chuqur zanjir: {st['max_depth']}, kesilgan sikllar: {st['cut']}",
+            f"\n🏆 {hbold('Eng katta daraxtlar')} (barcha darajalar):",
+        ]
+        for i, (uid, n) in enumerate(top, start=1):
+            lines.append(f"{i}) {hcode(str(uid))} — {n} ta (to‘g‘ridan {g.direct(uid)})")
+        await reply(message, "\n".join(lines))
+        return
+
+    uid = int(parts[1])
+    height = await asyncio.to_thread(g.height, uid)
+    chain = g.chain(uid, limit=11)
+    lines = [
+        f"👤 {hcode(str(uid))}",
+        f"To‘g‘ridan takliflar: {g.direct(uid)}",
+        f"Barcha darajalar: {g.descendants(uid)}",
+        f"Chuqurlik (ildizgacha): {g.depth_of(uid)}, pastga eng uzun zanjir: {height}",
+        "Zanjir: " + " ← ".join(str(x) for x in chain) + (" ← …" if len(chain) > 10 else ""),
+    ]
+    kids = g.top_children(uid, 5)
+    if kids:
+        lines.append(f"\n{hbold('Eng katta shoxlar')}:")
+        lines.extend(f"• {hcode(str(c))} — {n + 1} ta" for c, n in kids)
+    await reply(message, "\n".join(lines))
 
 
 # =========================
 #   START / CHECK_SUB
 # =========================
-@dp.message(F.text.startswith("/start"))
-async def start(message: Message, bot: Bot):
+@router.message(F.text.startswith("/start"))
+async def start(message: Message, bot: Bot, ctx: UserContext):
     text = message.text or "/start"
     user_id = message.from_user.id
 
@@ -391,57 +797,62 @@ async def start(message: Message, bot: Bot):
     if referrer_id == user_id:
         referrer_id = None
 
-    db.ensure_user(user_id, referrer_id=referrer_id)
-
-    if db.is_banned(user_id):
-        await message.answer("⛔ Siz botdan foydalanishdan cheklangansiz.")
-        return
+    # ban tekshiruvi — UserContextMiddleware da
+    if not ctx.exists:
+        await adb.ensure_user(user_id, referrer_id=referrer_id)
+        ctx.exists, ctx.referrer_id = True, referrer_id
+    elif not ctx.reachable:
+        # botni bloklab, qayta /start bosdi
+        await restore_reachable(user_id)
+        ctx.reachable = True
 
     # menyu
     if is_admin(user_id):
-        await message.answer("🛠 Admin menyu:", reply_markup=kb_admin_panel())
+        await reply(message, "🛠 Admin menyu:", reply_markup=kb_admin_panel())
     else:
-        await message.answer("✅ Menyu:", reply_markup=kb_user_panel())
+        await reply(message, "✅ Menyu:", reply_markup=kb_user_panel())
 
     # obuna tekshir
     if not await is_subscribed(bot, user_id):
-        await message.answer("Davom etish uchun kanalga obuna bo‘ling 👇", reply_markup=kb_subscribe(cfg.PUBLIC_CHANNEL))
+        await reply(message, "Davom etish uchun kanalga obuna bo‘ling 👇", reply_markup=kb_subscribe(cfg.PUBLIC_CHANNEL))
         return
 
-    db.set_joined_ok(user_id, True)
-    await send_main_post(bot, user_id)
+    ctx.set_joined_ok(True)
+    await send_main_post(bot, user_id, ctx.referrals)
 
 
-@dp.callback_query(F.data == "check_sub")
-async def check_sub(call: CallbackQuery, bot: Bot):
+@router.callback_query(F.data == "check_sub")
+async def check_sub(call: CallbackQuery, bot: Bot, ctx: UserContext):
     user_id = call.from_user.id
 
-    if db.is_banned(user_id):
-        await call.answer("⛔ Siz cheklangansiz.", show_alert=True)
-        return
-
-    ok = await is_subscribed(bot, user_id)
+    ok = await is_subscribed(bot, user_id, explicit=True)
     if not ok:
         await call.answer("Hali obuna bo‘lmagansiz.", show_alert=True)
         return
 
-    db.set_joined_ok(user_id, True)
-
-    # ✅ referral faqat shu yerda sanaladi
-    u = db.get_user(user_id)
-    if u:
-        _, ref_id, joined_ok, banned = u
-        if (not banned) and joined_ok and ref_id and ref_id != user_id:
-            added = db.add_referral_if_unique(ref_id, user_id)
-            if added:
-                try:
-                    target = current_target()
-                    cnt = db.referrals_count(ref_id)
-                    bar = progress_bar(cnt, target)
-                    await bot.send_message(ref_id, f"✅ Yangi taklif: +1\n📈 {bar} {cnt}/{target}")
-                    await maybe_notify_and_reward(bot, ref_id)
-                except TelegramForbiddenError:
-                    pass
+    # ✅ referral faqat shu yerda sanaladi — joined_ok bilan bitta tranzaksiyada
+    ref_id = ctx.referrer_id if ctx.exists else None
+    async with adb.unit_of_work() as uow:
+        if not ctx.joined_ok:
+            uow.save_user_context(user_id, True)
+        added = uow.add_referral_if_unique(ref_id, user_id) if ref_id and ref_id != user_id else None
+    ctx.joined_ok = True
+
+    if added is not None and added.result():
+        try:
+            if await adb.is_reachable(ref_id):
+                target = await current_target()
+                cnt = await adb.referrals_count(ref_id)
+                bar = progress_bar(cnt, target)
+                # "+1" — eng past ustuvorlik, natijasini kutmaymiz
+                await sender.send_message(
+                    bot, ref_id, f"✅ Yangi taklif: +1\n📈 {bar} {cnt}/{target}",
+                    lane=PROGRESS, wait=False,
+                )
+            await maybe_notify_and_reward(bot, ref_id)
+        except TelegramForbiddenError:
+            # Sender 403 ni o'zi qayd qiladi (mark_unreachable)
+            pass
 
     # UX: eski xabarni o'chirish
     try:
@@ -451,17 +862,195 @@ async def check_sub(call: CallbackQuery, bot: Bot):
         pass
 
     await call.answer("✅ Obuna tasdiqlandi!", show_alert=False)
-    await send_main_post(bot, user_id)
+    await send_main_post(bot, user_id, ctx.referrals)
+
+
+# =========================
+#   PUBLIC KANAL A'ZOLIGI
+# =========================
+# Bot public kanalda admin bo'lsa, Telegram chat_member update yuboradi —
+# keshni API chaqiruvisiz yangilaymiz.
+@router.chat_member()
+async def on_public_member(event: ChatMemberUpdated):
+    username = (event.chat.username or "").lower()
+    if username != cfg.PUBLIC_CHANNEL.lstrip("@").lower():
+        return
+    uid = event.new_chat_member.user.id
+    sub_cache.put(cfg.PUBLIC_CHANNEL, uid, event.new_chat_member.status in SUBSCRIBED_STATUSES)
+
+
+async def restore_reachable(user_id: int):
+    sender.forget_forbidden(user_id)
+    if await adb.set_reachable(user_id, True):
+        # 'failed' mukofotlar qayta navbatga qo'yildi
+        rewards.wake()
+
+
+# Bot bloklansa / qayta ishga tushirilsa (faqat shaxsiy chat) — Telegram my_chat_member yuboradi
+@router.my_chat_member(F.chat.type == "private")
+async def on_bot_status(event: ChatMemberUpdated):
+    uid = event.chat.id
+    if event.new_chat_member.status == ChatMemberStatus.KICKED:
+        await adb.set_reachable(uid, False)
+    elif event.new_chat_member.status == ChatMemberStatus.MEMBER:
+        await restore_reachable(uid)
 
 
 # ---------- Main ----------
+async def settings_refresher(period: float = 2):
+    """WORKERS > 1: boshqa jarayon o'zgartirgan settings'ni (target va h.k.) olib kelish."""
+    while True:
+        await asyncio.sleep(period)
+        await adb.refresh_settings()
+
+
+async def season_pruner(idle: float = 600, pause: float = 0.2):
+    """Eski mavsumlarni kichik batch'larda o'chiradi; batch'lar orasida DB boshqalarga bo'sh."""
+    while True:
+        try:
+            while await adb.prune_seasons(cfg.SEASONS_KEEP):
+                await asyncio.sleep(pause)
+        except Exception:
+            logging.exception("season prune xatosi")
+        await asyncio.sleep(idle)
+
+
+background: list[asyncio.Task] = []
+metrics_runner = None
+
+
+@router.startup()
+async def on_startup(bot: Bot):
+    global metrics_runner
+    # bot identity jarayon davomida o'zgarmaydi: bir marta olib, bot.me() keshida
+    await bot.me()
+    if cfg.LOOP_LAG_LOG_SEC > 0:
+        lag_monitor.start()
+    sender.start()
+    if is_owner():
+        await broadcaster.resume_all(bot)
+        rewards.start(bot)
+        background.append(asyncio.create_task(season_pruner()))
+        if audit is not None:
+            audit.start(bot)
+        backups.start()
+    if cfg.WORKERS > 1:
+        background.append(asyncio.create_task(settings_refresher()))
+    # bitta jarayonli webhook rejimida /metrics asosiy serverda; worker'lar (polling ham,
+    # webhook ham — supervisor serveri ularning registry'sini ko'rmaydi) ketma-ket portlarda
+    if cfg.METRICS_PORT and (cfg.BOT_MODE != "webhook" or cfg.WORKERS > 1):
+        port = cfg.METRICS_PORT + max(cfg.WORKER_INDEX, 0)
+        metrics_runner = await metrics.start_http(cfg.WEB_HOST, port)
+
+
+@router.shutdown()
+async def on_shutdown():
+    for t in background:
+        t.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    background.clear()
+    await broadcaster.shutdown()
+    await target_sweep.stop()
+    await rewards.stop()
+    if audit is not None:
+        await audit.stop()
+    await backups.stop()
+    await sender.stop()
+    await lag_monitor.stop()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+def health() -> dict:
+    return {"send_queue": sender.depth(), "loop_lag": lag_monitor.snapshot()}
+
+
+def setup() -> Dispatcher:
+    """Jarayon holatini quradi (bir marta; takroriy chaqiruv tayyor Dispatcher'ni qaytaradi)."""
+    global db, adb, lag_monitor, sub_cache, media, sender, broadcaster, rewards, inflight, views
+    global throttle, target_sweep, audit, backups, dp
+    if dp is not None:
+        return dp
+    # WORKERS > 1: har jarayonning o'z xotiradagi reytingi/grafi bo'lmaydi (bir-biridan
+    # farqlanib qoladi) — reyting referral_counts indeksidan SQL bilan, graf esa
+    # admin so'raganda snapshot sifatida quriladi
+    db = DB("bot.db", leaderboard=cfg.WORKERS <= 1, graph=cfg.WORKERS <= 1)
+    adb = AsyncDB(db, readers=cfg.DB_READERS, inline=cfg.DB_INLINE, group_commit=cfg.DB_GROUP_COMMIT_MS / 1000)
+    lag_monitor = LoopLagMonitor(log_every=cfg.LOOP_LAG_LOG_SEC)
+    sub_cache = SubscriptionCache(
+        maxsize=cfg.SUB_CACHE_SIZE, ttl=cfg.SUB_CACHE_TTL, neg_ttl=cfg.SUB_CACHE_NEG_TTL
+    )
+    media = MediaRegistry(adb)
+    # global limit jarayonlar o'rtasida bo'linadi
+    sender = Sender(
+        global_rate=cfg.SEND_RATE_GLOBAL / cfg.WORKERS, chat_rate=cfg.SEND_RATE_CHAT, workers=cfg.SEND_WORKERS,
+        on_forbidden=mark_unreachable, recheck=adb.is_reachable,
+    )
+    broadcaster = Broadcaster(adb, sender)
+    rewards = RewardQueue(adb, sender, cfg.PRIVATE_CHANNEL_ID)
+    inflight = InflightTracker()
+    views = ViewCache()
+    # referral qo'shilsa/reset bo'lsa yoki target o'zgarsa — keshlangan ekranlar eskiradi
+    db.on_change(lambda event, user_id: views.invalidate())
+    db.settings.subscribe(lambda key, old, new: views.invalidate(), "invite_target")
+    target_sweep = TargetSweep(adb, rewards, send_near_notice)
+    audit = SubscriptionAudit(
+        adb, audit_check, current_target, rps=cfg.AUDIT_RPS, period=cfg.AUDIT_PERIOD_H * 3600,
+        flag_referrals=cfg.AUDIT_FLAG_REFERRALS,
+    ) if cfg.AUDIT_RPS > 0 else None
+    backups = BackupManager(
+        db.path, cfg.BACKUP_DIR, every=cfg.BACKUP_EVERY_H * 3600, keep=cfg.BACKUP_KEEP, pages=cfg.BACKUP_PAGES
+    )
+
+    dp = Dispatcher()
+    # user_ctx dan oldin: takroriy bosishlar DB'ga ham yetmaydi
+    throttle = ThrottleMiddleware(throttled_action, cooldown=cfg.THROTTLE_COOLDOWN, maxsize=cfg.THROTTLE_SIZE)
+    dp.message.outer_middleware(throttle)
+    dp.callback_query.outer_middleware(throttle)
+    user_ctx = UserContextMiddleware(adb)
+    dp.message.outer_middleware(user_ctx)
+    dp.callback_query.outer_middleware(user_ctx)
+    # inner: faqat handler topilganda, filtrlardan keyin — handler nomi bilan o'lchanadi
+    handler_timing = HandlerTimingMiddleware()
+    dp.message.middleware(handler_timing)
+    dp.callback_query.middleware(handler_timing)
+    dp.chat_member.middleware(handler_timing)
+    dp.my_chat_member.middleware(handler_timing)
+    metrics.REGISTRY.gauge("bot_send_queue_depth", "Sender navbatidagi xabarlar", sender.depth)
+    metrics.REGISTRY.gauge("bot_sub_cache_hit_rate", "Obuna keshi hit rate", lambda: sub_cache.stats()["hit_rate"])
+    metrics.REGISTRY.gauge("bot_loop_max_lag_ms", "Event loop eng katta kechikishi", lambda: lag_monitor.snapshot()["max_lag_ms"])
+    metrics.REGISTRY.gauge("bot_throttled_total", "Cheklangan takroriy bosishlar", lambda: throttle.throttled + throttle.coalesced)
+    if adb.group is not None:
+        metrics.REGISTRY.gauge("bot_db_group_commit_batch", "Bitta COMMIT'dagi o'rtacha yozuvlar", lambda: adb.group.stats()["avg_batch"])
+
+    dp.include_router(router)
+    return dp
+
+
 async def main():
+    if cfg.WORKERS > 1:
+        # supervisor DB ochmaydi: update'larni faqat worker'larga tarqatadi
+        await Supervisor(cfg).run()
+        return
+
+    setup()
     bot = Bot(
         token=cfg.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode="HTML")
     )
-    await dp.start_polling(bot)
+    bot.session.middleware(ApiTimingMiddleware())
+    dp.update.outer_middleware(inflight)
+    try:
+        if cfg.BOT_MODE == "webhook":
+            await run_webhook(dp, bot, cfg, inflight, health=health)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        await bot.session.close()
+        adb.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
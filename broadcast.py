@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from adb import AsyncDB
+from sender import Sender, BULK, INTERACTIVE
+
+log = logging.getLogger(__name__)
+
+
+def _fmt_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+class Broadcaster:
+    """
+    Admin broadcast: `users` jadvali keyset pagination bilan o'qiladi (hammasi xotiraga
+    yuklanmaydi), xabarlar Sender'ning BULK yo'lagidan ketadi (limitlar shu yerda).
+    Har `chunk` userdan keyin progress SQLite'ga yoziladi — restartdan so'ng
+    shu joydan davom etadi (eng ko'pi bilan bitta chunk qayta yuborilishi mumkin).
+    """
+
+    def __init__(self, adb: AsyncDB, sender: Sender, chunk: int = 200, report_every: float = 5):
+        self.adb = adb
+        self.sender = sender
+        self.chunk = chunk
+        self.report_every = report_every
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    async def start(self, bot: Bot, admin_chat_id: int, text: Optional[str] = None,
+                    from_chat_id: Optional[int] = None, message_id: Optional[int] = None) -> int:
+        total = await self.adb.active_users_count()
+        bid = await self.adb.create_broadcast(admin_chat_id, text, from_chat_id, message_id, total)
+        self._spawn(bot, bid)
+        return bid
+
+    async def resume_all(self, bot: Bot):
+        for bid in await self.adb.broadcasts_by_status("running"):
+            log.info("broadcast #%s davom ettirilmoqda", bid)
+            self._spawn(bot, bid)
+
+    async def stop(self, bid: int) -> bool:
+        b = await self.adb.get_broadcast(bid)
+        if not b or b["status"] != "running":
+            return False
+        await self.adb.set_broadcast_status(bid, "stopped")
+        return True
+
+    async def shutdown(self):
+        for t in self._tasks.values():
+            t.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def _spawn(self, bot: Bot, bid: int):
+        if bid in self._tasks and not self._tasks[bid].done():
+            return
+        task = asyncio.create_task(self._run(bot, bid))
+        self._tasks[bid] = task
+        task.add_done_callback(lambda _: self._tasks.pop(bid, None))
+
+    async def _send_one(self, bot: Bot, b: Dict, uid: int):
+        if b["message_id"]:
+            factory = lambda: bot.copy_message(uid, b["from_chat_id"], b["message_id"])
+        else:
+            factory = lambda: bot.send_message(uid, b["text"])
+        await self.sender.submit(uid, factory, lane=BULK)
+
+    async def _report(self, bot: Bot, b: Dict, status_msg, sent: int, failed: int,
+                      run_sent: int, started: float, final: str = ""):
+        done = sent + failed
+        total = max(b["total"], done)
+        elapsed = max(1e-6, time.monotonic() - started)
+        rate = run_sent / elapsed
+        eta = _fmt_eta((total - done) / rate) if rate > 0 and total > done else "—"
+        text = (
+            f"📣 Broadcast #{b['id']}{final}\n"
+            f"✅ {sent}  ❌ {failed}  / {total}\n"
+            f"⚡ {rate:.1f} msg/s   ⏳ ETA {eta}"
+        )
+        # admin progress ham Sender limitlari ichida — broadcast paytida 429 bermaydi
+        try:
+            if status_msg is None:
+                return await self.sender.send_message(bot, b["admin_chat_id"], text, lane=INTERACTIVE)
+            await self.sender.submit(
+                status_msg.chat.id,
+                lambda: bot.edit_message_text(text, chat_id=status_msg.chat.id, message_id=status_msg.message_id),
+                lane=INTERACTIVE,
+            )
+        except TelegramBadRequest:
+            pass
+        except Exception as e:
+            # progress — qo'shimcha: admin botni bloklagan bo'lsa ham broadcast davom etadi
+            log.warning("broadcast #%s progress: %r", b["id"], e)
+        return status_msg
+
+    async def _run(self, bot: Bot, bid: int):
+        b = await self.adb.get_broadcast(bid)
+        if not b:
+            return
+        sent, failed = int(b["sent"]), int(b["failed"])
+        last_id = int(b["last_user_id"])
+        started = time.monotonic()
+        run_done = 0
+        status_msg = await self._report(bot, b, None, sent, failed, 0, started)
+        last_report = time.monotonic()
+
+        while True:
+            cur = await self.adb.get_broadcast(bid)
+            if not cur or cur["status"] != "running":
+                await self._report(bot, b, status_msg, sent, failed, run_done, started, " — to‘xtatildi")
+                return
+
+            ids = await self.adb.user_ids_after(last_id, self.chunk)
+            if not ids:
+                break
+
+            results = await asyncio.gather(
+                *(self._send_one(bot, b, uid) for uid in ids), return_exceptions=True
+            )
+            ok = sum(1 for r in results if not isinstance(r, BaseException))
+            bad = len(results) - ok
+            sent += ok
+            failed += bad
+            run_done += len(ids)
+            last_id = ids[-1]
+            await self.adb.broadcast_checkpoint(bid, last_id, ok, bad)
+
+            if time.monotonic() - last_report >= self.report_every:
+                await self._report(bot, b, status_msg, sent, failed, run_done, started)
+                last_report = time.monotonic()
+
+        await self.adb.set_broadcast_status(bid, "done")
+        await self._report(bot, b, status_msg, sent, failed, run_done, started, " — tugadi")
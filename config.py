@@ -1,4 +1,5 @@
 import os
+import re
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
@@ -11,6 +12,51 @@ class Config:
     PRIVATE_CHANNEL_ID: int
     INVITE_TARGET: int
     ADMIN_IDS: list[int]
+    # DB: o‘qish uchun read-only ulanishlar soni; DB_INLINE=1 — eski (bloklovchi) rejim
+    DB_READERS: int = 4
+    DB_INLINE: bool = False
+    # group commit oynasi (ms): parallel yozuvlar bitta COMMIT'ga yig'iladi (0 — o'chiq)
+    DB_GROUP_COMMIT_MS: int = 0
+    # event loop bloklanishini o‘lchash (0 — o‘chirilgan)
+    LOOP_LAG_LOG_SEC: int = 60
+    # obuna tekshiruvi keshi (soniya): ijobiy / salbiy natija
+    SUB_CACHE_TTL: int = 300
+    SUB_CACHE_NEG_TTL: int = 5
+    SUB_CACHE_SIZE: int = 100_000
+    # qimmat amallar (obuna tekshiruvi) uchun har user cooldown'i (soniya) va map hajmi
+    THROTTLE_COOLDOWN: float = 3
+    THROTTLE_SIZE: int = 100_000
+    # chiquvchi xabarlar limiti (msg/s): global va har chat uchun
+    SEND_RATE_GLOBAL: float = 28
+    SEND_RATE_CHAT: float = 1
+    SEND_WORKERS: int = 8
+    # update olish: "polling" yoki "webhook"
+    BOT_MODE: str = "polling"
+    WEBHOOK_BASE_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 8080
+    # WORKERS > 1: supervisor update'larni user_id bo'yicha N ta jarayonga taqsimlaydi
+    WORKERS: int = 1
+    # supervisor -1, workerlar 0..N-1 (0 — admin va global vazifalar egasi)
+    WORKER_INDEX: int = -1
+    # /metrics porti (0 — o'chiq). Bitta jarayonli webhook'da asosiy serverda,
+    # WORKERS > 1 da (polling ham, webhook ham) i-worker METRICS_PORT+i da
+    METRICS_PORT: int = 0
+    # obuna qayta tekshiruvi: get_chat_member so'rov/s byudjeti (0 — o'chiq), o'tishlar orasi (soat),
+    # chiqqan taklif qilinganlarni referrals.left_at bilan belgilash
+    AUDIT_RPS: float = 0
+    AUDIT_PERIOD_H: float = 24
+    AUDIT_FLAG_REFERRALS: bool = False
+    # onlayn backup: papka, har necha soatda (0 — faqat /backup bilan), nechta nusxa saqlanadi,
+    # bir qadamda nechta sahifa ko'chiriladi
+    BACKUP_DIR: str = "backups"
+    BACKUP_EVERY_H: float = 6
+    BACKUP_KEEP: int = 7
+    BACKUP_PAGES: int = 256
+    # nechta oxirgi mavsum saqlanadi (joriy bilan); eskilari fonda o'chiriladi
+    SEASONS_KEEP: int = 2
 
 def _parse_admin_ids(raw: str) -> list[int]:
     ids = []
@@ -22,12 +68,45 @@ def _parse_admin_ids(raw: str) -> list[int]:
             ids.append(int(part))
     return ids
 
+def _parse_bool(raw: str) -> bool:
+    return (raw or "").strip().lower() in {"1", "true", "yes", "on"}
+
 def load_config() -> Config:
     token = os.getenv("BOT_TOKEN", "").strip()
     pub = os.getenv("PUBLIC_CHANNEL", "").strip()
     priv = os.getenv("PRIVATE_CHANNEL_ID", "").strip()
     target = os.getenv("INVITE_TARGET", "5").strip()
     admin_raw = os.getenv("ADMIN_IDS", "").strip()
+    db_readers = os.getenv("DB_READERS", "4").strip()
+    db_inline = os.getenv("DB_INLINE", "0").strip()
+    group_commit = os.getenv("DB_GROUP_COMMIT_MS", "0").strip()
+    lag_log = os.getenv("LOOP_LAG_LOG_SEC", "60").strip()
+    sub_ttl = os.getenv("SUB_CACHE_TTL", "300").strip()
+    sub_neg_ttl = os.getenv("SUB_CACHE_NEG_TTL", "5").strip()
+    sub_size = os.getenv("SUB_CACHE_SIZE", "100000").strip()
+    throttle_cd = os.getenv("THROTTLE_COOLDOWN", "3").strip()
+    throttle_size = os.getenv("THROTTLE_SIZE", "100000").strip()
+    send_global = os.getenv("SEND_RATE_GLOBAL", "28").strip()
+    send_chat = os.getenv("SEND_RATE_CHAT", "1").strip()
+    send_workers = os.getenv("SEND_WORKERS", "8").strip()
+    mode = os.getenv("BOT_MODE", "polling").strip().lower()
+    wh_url = os.getenv("WEBHOOK_BASE_URL", "").strip().rstrip("/")
+    wh_path = os.getenv("WEBHOOK_PATH", "/webhook").strip()
+    wh_secret = os.getenv("WEBHOOK_SECRET", "").strip()
+    web_host = os.getenv("WEB_HOST", "0.0.0.0").strip()
+    # Render web service PORT ni o‘zi beradi
+    web_port = os.getenv("WEB_PORT", os.getenv("PORT", "8080")).strip()
+    workers = os.getenv("WORKERS", "1").strip()
+    worker_index = os.getenv("BOT_WORKER_INDEX", "-1").strip()
+    metrics_port = os.getenv("METRICS_PORT", "0").strip()
+    seasons_keep = os.getenv("SEASONS_KEEP", "2").strip()
+    audit_rps = os.getenv("AUDIT_RPS", "0").strip()
+    backup_dir = os.getenv("BACKUP_DIR", "backups").strip()
+    backup_every = os.getenv("BACKUP_EVERY_H", "6").strip()
+    backup_keep = os.getenv("BACKUP_KEEP", "7").strip()
+    backup_pages = os.getenv("BACKUP_PAGES", "256").strip()
+    audit_period = os.getenv("AUDIT_PERIOD_H", "24").strip()
+    audit_flag = os.getenv("AUDIT_FLAG_REFERRALS", "0").strip()
 
     if not token:
         raise RuntimeError("BOT_TOKEN .env da yo‘q")
@@ -35,6 +114,10 @@ def load_config() -> Config:
         raise RuntimeError("PUBLIC_CHANNEL '@username' ko‘rinishida bo‘lishi kerak")
     if not priv:
         raise RuntimeError("PRIVATE_CHANNEL_ID .env da yo‘q (masalan -100...)")
+    if mode not in {"polling", "webhook"}:
+        raise RuntimeError("BOT_MODE 'polling' yoki 'webhook' bo‘lishi kerak")
+    if mode == "webhook" and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", wh_secret):
+        raise RuntimeError("WEBHOOK_SECRET kerak (1-256 belgi: A-Z, a-z, 0-9, _ -)")
     admins = _parse_admin_ids(admin_raw)
     if not admins:
         raise RuntimeError("ADMIN_IDS .env da yo‘q (masalan ADMIN_IDS=5037587016)")
@@ -45,4 +128,33 @@ def load_config() -> Config:
         PRIVATE_CHANNEL_ID=int(priv),
         INVITE_TARGET=int(target),
         ADMIN_IDS=admins,
+        DB_READERS=max(1, int(db_readers)),
+        DB_INLINE=_parse_bool(db_inline),
+        DB_GROUP_COMMIT_MS=max(0, int(group_commit)),
+        LOOP_LAG_LOG_SEC=int(lag_log),
+        SUB_CACHE_TTL=int(sub_ttl),
+        SUB_CACHE_NEG_TTL=int(sub_neg_ttl),
+        SUB_CACHE_SIZE=int(sub_size),
+        THROTTLE_COOLDOWN=max(0.0, float(throttle_cd)),
+        THROTTLE_SIZE=max(1, int(throttle_size)),
+        SEND_RATE_GLOBAL=float(send_global),
+        SEND_RATE_CHAT=float(send_chat),
+        SEND_WORKERS=max(1, int(send_workers)),
+        BOT_MODE=mode,
+        WEBHOOK_BASE_URL=wh_url,
+        WEBHOOK_PATH=wh_path if wh_path.startswith("/") else "/" + wh_path,
+        WEBHOOK_SECRET=wh_secret,
+        WEB_HOST=web_host,
+        WEB_PORT=int(web_port),
+        WORKERS=max(1, int(workers)),
+        WORKER_INDEX=int(worker_index),
+        METRICS_PORT=int(metrics_port),
+        SEASONS_KEEP=max(1, int(seasons_keep)),
+        AUDIT_RPS=max(0.0, float(audit_rps)),
+        BACKUP_DIR=backup_dir or "backups",
+        BACKUP_EVERY_H=max(0.0, float(backup_every)),
+        BACKUP_KEEP=max(1, int(backup_keep)),
+        BACKUP_PAGES=max(1, int(backup_pages)),
+        AUDIT_PERIOD_H=max(0.0, float(audit_period)),
+        AUDIT_FLAG_REFERRALS=_parse_bool(audit_flag),
     )
\ No newline at end of file
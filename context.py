@@ -0,0 +1,83 @@
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, User
+
+from adb import AsyncDB
+
+
+@dataclass
+class UserContext:
+    """Update boshida bir so'rov bilan yuklangan user holati (users + referral_counts)."""
+
+    user_id: int
+    exists: bool = False
+    referrer_id: Optional[int] = None
+    joined_ok: bool = False
+    banned: bool = False
+    referrals: int = 0
+    reachable: bool = True
+    dirty: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_row(cls, user_id: int, row: Optional[tuple]) -> "UserContext":
+        if row is None:
+            return cls(user_id=user_id)
+        _, referrer_id, joined_ok, banned, referrals, reachable = row
+        return cls(
+            user_id=user_id,
+            exists=True,
+            referrer_id=referrer_id,
+            joined_ok=bool(joined_ok),
+            banned=bool(banned),
+            referrals=int(referrals or 0),
+            reachable=bool(reachable),
+        )
+
+    def set_joined_ok(self, ok: bool):
+        if self.joined_ok != ok:
+            self.joined_ok = ok
+            self.dirty.add("joined_ok")
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """
+    Outer middleware (message + callback_query):
+    - userni bitta so'rov bilan yuklab, handlerga `ctx: UserContext` sifatida beradi
+    - ban tekshiruvi shu yerda (handlerlarda takrorlanmaydi)
+    - handler o'zgartirgan maydonlarni (dirty) oxirida bitta UPDATE bilan yozadi
+    """
+
+    def __init__(self, adb: AsyncDB):
+        self.adb = adb
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        ctx = UserContext.from_row(user.id, await self.adb.load_user_context(user.id))
+        if ctx.banned:
+            await self._reject(event)
+            return None
+
+        data["ctx"] = ctx
+        try:
+            return await handler(event, data)
+        finally:
+            if ctx.dirty:
+                await self.adb.save_user_context(ctx.user_id, ctx.joined_ok)
+                ctx.dirty.clear()
+
+    @staticmethod
+    async def _reject(event: TelegramObject):
+        if isinstance(event, CallbackQuery):
+            await event.answer("⛔ Siz cheklangansiz.", show_alert=True)
+        elif isinstance(event, Message) and (event.text or "").startswith("/start"):
+            await event.answer("⛔ Siz botdan foydalanishdan cheklangansiz.")
@@ -0,0 +1,104 @@
+"""
+Eksport/import (gzip CSV yoki JSONL). Fayl nomi: <jadval>-<vaqt>.<csv|jsonl>.gz
+
+    python dataio.py export users csv [bot.db] [papka]
+    python dataio.py import referrals-20260101-120000.jsonl.gz [bot.db]
+
+Importda jadval fayl nomidan aniqlanadi. Tartib: seasons -> users -> referrals -> flags.
+"""
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from typing import Iterator, Optional, Tuple
+
+from db import DB, DATA_TABLES
+
+FORMATS = ("csv", "jsonl")
+
+
+def export_file(db_path: str, name: str, fmt: str = "csv", directory: str = ".") -> Tuple[str, int]:
+    """Read-only ulanish bilan jadvalni faylga oqim qilib yozadi. (path, qatorlar soni)."""
+    if name not in DATA_TABLES:
+        raise ValueError(f"noma'lum jadval: {name}")
+    if fmt not in FORMATS:
+        raise ValueError(f"noma'lum format: {fmt}")
+    cols = DATA_TABLES[name][0]
+    path = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.{fmt}.gz")
+    db = DB(db_path, readonly=True)
+    n = 0
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                w = csv.writer(f)
+                w.writerow(cols)
+                for row in db.export_rows(name):
+                    w.writerow(row)
+                    n += 1
+            else:
+                for row in db.export_rows(name):
+                    f.write(json.dumps(dict(zip(cols, row)), ensure_ascii=False))
+                    f.write("\n")
+                    n += 1
+    except BaseException:
+        os.remove(path)
+        raise
+    finally:
+        db.close()
+    return path, n
+
+
+def table_of(path: str) -> Optional[str]:
+    name = os.path.basename(path).split("-")[0].split(".")[0]
+    return name if name in DATA_TABLES else None
+
+
+def _cell(v):
+    return None if v == "" else v
+
+
+def read_rows(path: str, name: str) -> Iterator[tuple]:
+    """Fayldan qatorlarni bittalab o'qiydi (gzip yoki oddiy)."""
+    cols = DATA_TABLES[name][0]
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        if ".jsonl" in os.path.basename(path):
+            for line in f:
+                if line.strip():
+                    obj = json.loads(line)
+                    yield tuple(obj.get(c) for c in cols)
+            return
+        r = csv.reader(f)
+        header = next(r, None)
+        if header is None:
+            return
+        idx = [header.index(c) if c in header else None for c in cols]
+        for rec in r:
+            yield tuple(_cell(rec[i]) if i is not None and i < len(rec) else None for i in idx)
+
+
+def import_file(db: DB, path: str, name: Optional[str] = None) -> Tuple[str, int]:
+    """Sinxron: db yozuvchi ulanishi bilan. AsyncDB'da `adb.import_rows(name, read_rows(...))`."""
+    name = name or table_of(path)
+    if name is None:
+        raise ValueError("jadval nomini aniqlab bo'lmadi (seasons/users/referrals/flags)")
+    return name, db.import_rows(name, read_rows(path, name))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) >= 3 and args[0] == "export":
+        path, n = export_file(args[3] if len(args) > 3 else "bot.db", args[1], args[2],
+                              args[4] if len(args) > 4 else ".")
+        print(json.dumps({"file": path, "rows": n}))
+    elif len(args) >= 2 and args[0] == "import":
+        db = DB(args[2] if len(args) > 2 else "bot.db")
+        try:
+            name, n = import_file(db, args[1])
+        finally:
+            db.close()
+        print(json.dumps({"table": name, "inserted": n}))
+    else:
+        print(__doc__)
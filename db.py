@@ -1,12 +1,426 @@
 import sqlite3
-from typing import Optional, Tuple, List, Dict
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple, List, Dict
+from zoneinfo import ZoneInfo
+
+from leaderboard import Leaderboard
+from refgraph import ReferralGraph
+from settings import SettingsRegistry, VERSION_KEY
+
+
+# "Bugun" va kunlik statistika shu vaqt zonasida hisoblanadi
+TZ = ZoneInfo("Asia/Tashkent")
+
+
+def local_day(ts: int) -> str:
+    return datetime.fromtimestamp(ts, TZ).strftime("%Y-%m-%d")
+
+
+def _backfill_rollups(conn: sqlite3.Connection):
+    """referral_daily / referral_hourly ni mavjud referrals'dan to'ldirish (soatlab guruhlab)."""
+    conn.execute("DELETE FROM referral_daily")
+    conn.execute("DELETE FROM referral_hourly")
+    cur = conn.execute("""
+        SELECT referrer_id, created_at / 3600 AS h, COUNT(*)
+        FROM referrals
+        WHERE referrer_id IS NOT NULL
+        GROUP BY referrer_id, h
+    """)
+    daily: Dict[Tuple[str, int], int] = {}
+    hourly: Dict[int, int] = {}
+    for referrer_id, h, c in cur:
+        hour = int(h) * 3600
+        day = local_day(hour)
+        daily[(day, referrer_id)] = daily.get((day, referrer_id), 0) + c
+        hourly[hour] = hourly.get(hour, 0) + c
+    conn.executemany(
+        "INSERT INTO referral_daily(day, referrer_id, cnt) VALUES(?, ?, ?)",
+        ((d, r, c) for (d, r), c in daily.items()),
+    )
+    conn.executemany(
+        "INSERT INTO referral_hourly(hour, day, cnt) VALUES(?, ?, ?)",
+        ((h, local_day(h), c) for h, c in hourly.items()),
+    )
+
+
+# Joriy mavsum: SQL ichida skalyar subquery (bir marta hisoblanadi, indeks bilan ishlaydi).
+# Har so'rov DB dagi holatni ko'radi — boshqa jarayon yangi mavsum boshlasa ham.
+SEASON = "(SELECT MAX(id) FROM seasons)"
+
+
+def _backfill_season_rollups(conn: sqlite3.Connection):
+    """Mavsumli referral_daily / referral_hourly ni referrals'dan qayta qurish."""
+    conn.execute("DELETE FROM referral_daily")
+    conn.execute("DELETE FROM referral_hourly")
+    cur = conn.execute("""
+        SELECT season_id, referrer_id, created_at / 3600 AS h, COUNT(*)
+        FROM referrals
+        WHERE referrer_id IS NOT NULL
+        GROUP BY season_id, referrer_id, h
+    """)
+    daily: Dict[Tuple[int, str, int], int] = {}
+    hourly: Dict[Tuple[int, int], int] = {}
+    for season, referrer_id, h, c in cur:
+        hour = int(h) * 3600
+        key = (season, local_day(hour), referrer_id)
+        daily[key] = daily.get(key, 0) + c
+        hourly[(season, hour)] = hourly.get((season, hour), 0) + c
+    conn.executemany(
+        "INSERT INTO referral_daily(season_id, day, referrer_id, cnt) VALUES(?, ?, ?, ?)",
+        ((se, d, r, c) for (se, d, r), c in daily.items()),
+    )
+    conn.executemany(
+        "INSERT INTO referral_hourly(season_id, hour, day, cnt) VALUES(?, ?, ?, ?)",
+        ((se, h, local_day(h), c) for (se, h), c in hourly.items()),
+    )
+
+
+# Sxema migratsiyalari (PRAGMA user_version). Faqat oxiriga qo'shing:
+# i-element bajarilgach user_version = i + 1 bo'ladi. Element — SQL ro'yxati
+# yoki callable(conn) (Python'da backfill kerak bo'lganda).
+MIGRATIONS: List[List[Any]] = [
+    # 1: indekslar + referral_counts (har referrer uchun tayyor son)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_referrals_created ON referrals(created_at)",
+        """
+        CREATE TABLE IF NOT EXISTS referral_counts(
+            referrer_id INTEGER PRIMARY KEY,
+            cnt INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_referral_counts_cnt ON referral_counts(cnt)",
+        "DELETE FROM referral_counts",
+        """
+        INSERT INTO referral_counts(referrer_id, cnt)
+        SELECT referrer_id, COUNT(*) FROM referrals
+        WHERE referrer_id IS NOT NULL
+        GROUP BY referrer_id
+        """,
+    ],
+    # 2: admin broadcast (checkpoint bilan, restartdan keyin davom etadi)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_chat_id INTEGER,
+            text TEXT,
+            from_chat_id INTEGER,
+            message_id INTEGER,
+            status TEXT DEFAULT 'running',
+            last_user_id INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            created_at INTEGER DEFAULT (strftime('%s','now')),
+            updated_at INTEGER DEFAULT (strftime('%s','now'))
+        )
+        """,
+    ],
+    # 3: kunlik (mahalliy kun) va soatlik rollup — "bugun" va statistikalar uchun
+    [
+        """
+        CREATE TABLE IF NOT EXISTS referral_daily(
+            day TEXT NOT NULL,
+            referrer_id INTEGER NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(day, referrer_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_referral_daily_day_cnt ON referral_daily(day, cnt)",
+        """
+        CREATE TABLE IF NOT EXISTS referral_hourly(
+            hour INTEGER PRIMARY KEY,
+            day TEXT NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_referral_hourly_day ON referral_hourly(day)",
+        _backfill_rollups,
+    ],
+    # 4: mukofot navbati (retry + idempotency key) va oldindan yaratilgan invite linklar
+    [
+        """
+        CREATE TABLE IF NOT EXISTS reward_jobs(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL UNIQUE,
+            user_id INTEGER NOT NULL,
+            target INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_at INTEGER NOT NULL DEFAULT 0,
+            invite_link TEXT,
+            last_error TEXT,
+            created_at INTEGER DEFAULT (strftime('%s','now')),
+            updated_at INTEGER DEFAULT (strftime('%s','now'))
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reward_jobs_due ON reward_jobs(status, next_at)",
+        """
+        CREATE TABLE IF NOT EXISTS invite_links(
+            link TEXT PRIMARY KEY,
+            job_id INTEGER,
+            created_at INTEGER DEFAULT (strftime('%s','now')),
+            used_at INTEGER
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_invite_links_free ON invite_links(job_id, created_at)",
+    ],
+    # 5: mavsumlar — referrals/flags/hisoblagichlar season_id bilan. "Hammasini 0" = yangi
+    # mavsum (bitta INSERT); eski mavsumlar fonda kichik batch'larda o'chiriladi.
+    # UNIQUE cheklovlar o'zgargani uchun jadvallar qayta quriladi (rowid saqlanadi).
+    [
+        """
+        CREATE TABLE IF NOT EXISTS seasons(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at INTEGER DEFAULT (strftime('%s','now')),
+            pruned_at INTEGER
+        )
+        """,
+        "INSERT INTO seasons(id) SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM seasons)",
+        """
+        CREATE TABLE referrals_v5(
+            season_id INTEGER NOT NULL,
+            referrer_id INTEGER,
+            invited_user_id INTEGER,
+            created_at INTEGER DEFAULT (strftime('%s','now')),
+            UNIQUE(season_id, invited_user_id)
+        )
+        """,
+        """
+        INSERT INTO referrals_v5(rowid, season_id, referrer_id, invited_user_id, created_at)
+        SELECT rowid, 1, referrer_id, invited_user_id, created_at FROM referrals
+        """,
+        "DROP TABLE referrals",
+        "ALTER TABLE referrals_v5 RENAME TO referrals",
+        "CREATE INDEX idx_referrals_season_referrer ON referrals(season_id, referrer_id, created_at)",
+        "CREATE INDEX idx_referrals_season_created ON referrals(season_id, created_at)",
+        """
+        CREATE TABLE user_flags_v5(
+            season_id INTEGER NOT NULL,
+            user_id INTEGER,
+            key TEXT,
+            created_at INTEGER DEFAULT (strftime('%s','now')),
+            UNIQUE(season_id, user_id, key)
+        )
+        """,
+        """
+        INSERT INTO user_flags_v5(rowid, season_id, user_id, key, created_at)
+        SELECT rowid, 1, user_id, key, created_at FROM user_flags
+        """,
+        "DROP TABLE user_flags",
+        "ALTER TABLE user_flags_v5 RENAME TO user_flags",
+        "DROP TABLE referral_counts",
+        """
+        CREATE TABLE referral_counts(
+            season_id INTEGER NOT NULL,
+            referrer_id INTEGER NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(season_id, referrer_id)
+        )
+        """,
+        "CREATE INDEX idx_referral_counts_cnt ON referral_counts(season_id, cnt, referrer_id)",
+        """
+        INSERT INTO referral_counts(season_id, referrer_id, cnt)
+        SELECT season_id, referrer_id, COUNT(*) FROM referrals
+        WHERE referrer_id IS NOT NULL
+        GROUP BY season_id, referrer_id
+        """,
+        "DROP TABLE referral_daily",
+        """
+        CREATE TABLE referral_daily(
+            season_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            referrer_id INTEGER NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(season_id, day, referrer_id)
+        )
+        """,
+        "CREATE INDEX idx_referral_daily_day_cnt ON referral_daily(season_id, day, cnt)",
+        "DROP TABLE referral_hourly",
+        """
+        CREATE TABLE referral_hourly(
+            season_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY(season_id, hour)
+        )
+        """,
+        "CREATE INDEX idx_referral_hourly_day ON referral_hourly(season_id, day)",
+        _backfill_season_rollups,
+    ],
+    # 6: yetib borish — user botni bloklagan (403) bo'lsa xabar yuborilmaydi
+    [
+        "ALTER TABLE users ADD COLUMN reachable INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE users ADD COLUMN unreachable_at INTEGER",
+        "CREATE INDEX idx_users_unreachable ON users(user_id) WHERE reachable = 0",
+    ],
+    # 7: obuna qayta tekshiruvi (audit) holati; kanaldan chiqqan taklif qilinganlar belgisi
+    [
+        """
+        CREATE TABLE IF NOT EXISTS sub_audit(
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pass INTEGER NOT NULL DEFAULT 0,
+            phase TEXT NOT NULL DEFAULT 'idle',
+            position INTEGER NOT NULL DEFAULT 0,
+            checked INTEGER NOT NULL DEFAULT 0,
+            left_cnt INTEGER NOT NULL DEFAULT 0,
+            started_at INTEGER,
+            finished_at INTEGER,
+            updated_at INTEGER
+        )
+        """,
+        "INSERT OR IGNORE INTO sub_audit(id) VALUES(1)",
+        "ALTER TABLE referrals ADD COLUMN left_at INTEGER",
+    ],
+]
+
+
+# Eksport/import: nom -> (ustunlar, SELECT, INSERT). "counts" faqat eksport (hosila jadval).
+# INSERT OR IGNORE: import mavjud ma'lumot ustiga "merge" qiladi, hech narsani o'chirmaydi.
+DATA_TABLES: Dict[str, Tuple[Tuple[str, ...], str, Optional[str]]] = {
+    # referrals/flags dan oldin: season_id lar manzil bazada ham bo'lishi kerak
+    "seasons": (
+        ("id", "started_at", "pruned_at"),
+        "SELECT id, started_at, pruned_at FROM seasons ORDER BY id",
+        "INSERT OR IGNORE INTO seasons(id, started_at, pruned_at) VALUES(?, COALESCE(?, strftime('%s','now')), ?)",
+    ),
+    "users": (
+        ("user_id", "referrer_id", "joined_ok", "banned", "reachable"),
+        "SELECT user_id, referrer_id, joined_ok, banned, reachable FROM users ORDER BY user_id",
+        "INSERT OR IGNORE INTO users(user_id, referrer_id, joined_ok, banned, reachable) "
+        "VALUES(?, ?, ?, ?, COALESCE(?, 1))",
+    ),
+    # season_id bo'sh bo'lsa (eski eksport) — joriy mavsumga yoziladi; created_at bo'sh bo'lsa
+    # (CSV'da "" -> NULL) — ustun default'i, aks holda rollup backfill'i yiqiladi
+    "referrals": (
+        ("referrer_id", "invited_user_id", "created_at", "season_id"),
+        "SELECT referrer_id, invited_user_id, created_at, season_id FROM referrals ORDER BY rowid",
+        "INSERT OR IGNORE INTO referrals(referrer_id, invited_user_id, created_at, season_id) "
+        f"VALUES(?, ?, COALESCE(?, strftime('%s','now')), COALESCE(?, {SEASON}))",
+    ),
+    "flags": (
+        ("user_id", "key", "created_at", "season_id"),
+        "SELECT user_id, key, created_at, season_id FROM user_flags ORDER BY rowid",
+        "INSERT OR IGNORE INTO user_flags(user_id, key, created_at, season_id) "
+        f"VALUES(?, ?, COALESCE(?, strftime('%s','now')), COALESCE(?, {SEASON}))",
+    ),
+    "counts": (
+        ("referrer_id", "cnt"),
+        f"SELECT referrer_id, cnt FROM referral_counts WHERE season_id = {SEASON} AND cnt > 0 "
+        "ORDER BY cnt DESC, referrer_id",
+        None,
+    ),
+}
 
 
 class DB:
-    def __init__(self, path: str = "bot.db"):
-        self.conn = sqlite3.connect(path)
+    def __init__(self, path: str = "bot.db", readonly: bool = False, leaderboard: bool = True,
+                 graph: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self.board: Optional[Leaderboard] = None
+        self.graph: Optional[ReferralGraph] = None
+        self.settings: Optional[SettingsRegistry] = None
+        self._change_listeners: List[Callable[[str, int], None]] = []
+        # transaction() ichma-ichligi va COMMIT'dan keyin bajariladigan ishlar (board, graph, ...)
+        self._tx_depth = 0
+        self._after: List[Callable[[], None]] = []
+        # check_same_thread=False: ulanish AsyncDB ichida bitta thread'dan
+        # (yozuvchi) yoki pool'dan navbat bilan ishlatiladi
+        if readonly:
+            self.conn = sqlite3.connect(
+                f"file:{path}?mode=ro", uri=True, check_same_thread=False
+            )
+            self.conn.execute("PRAGMA query_only=1;")
+            return
+        # timeout: bir nechta jarayon yozganda (WORKERS > 1) lock'ni kutish
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
         self.conn.execute("PRAGMA journal_mode=WAL;")
         self._init()
+        self.settings = SettingsRegistry()
+        self.settings.define("invite_target", int)
+        self._load_settings()
+        if leaderboard:
+            self.board = Leaderboard.from_counts(self._season_counts())
+        if graph:
+            self.graph = ReferralGraph.from_edges(self.referral_edges())
+
+    def close(self):
+        self.conn.close()
+
+    def _season_counts(self):
+        return self.conn.execute(
+            f"SELECT referrer_id, cnt FROM referral_counts WHERE season_id = {SEASON}"
+        )
+
+    def referral_edges(self):
+        """Joriy mavsum (referrer_id, invited_user_id) — ReferralGraph uchun."""
+        return self.conn.execute(
+            f"SELECT referrer_id, invited_user_id FROM referrals "
+            f"WHERE season_id = {SEASON} AND referrer_id IS NOT NULL"
+        )
+
+    def on_change(self, fn: Callable[[str, int], None]):
+        """Referral ma'lumotlari o'zgarganda (commitdan keyin, yozuvchi thread'da) chaqiriladi.
+        event: "referral" | "reset" | "wipe" (yangi mavsum) | "import"."""
+        self._change_listeners.append(fn)
+
+    def _emit(self, event: str, user_id: int = 0):
+        for fn in self._change_listeners:
+            fn(event, user_id)
+
+    # ---------- unit of work ----------
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: blok ichidagi barcha yozuvlar bitta tranzaksiyada (bitta COMMIT / fsync).
+        Tashqi daraja — BEGIN IMMEDIATE, ichma-ich — SAVEPOINT. Metodlarning o'z commit'lari
+        ichkarida o'tkazib yuboriladi. Xato bo'lsa blok to'liq bekor qilinadi; xotiradagi
+        board/graph/settings va on_change faqat tashqi COMMIT muvaffaqiyatli bo'lgach yangilanadi.
+        """
+        depth = self._tx_depth
+        mark = len(self._after)
+        self.conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT uow{depth}")
+        self._tx_depth += 1
+        try:
+            yield self
+            if depth:
+                self.conn.execute(f"RELEASE uow{depth}")
+            else:
+                self.conn.commit()
+        except BaseException:
+            del self._after[mark:]
+            if depth:
+                self.conn.execute(f"ROLLBACK TO uow{depth}")
+                self.conn.execute(f"RELEASE uow{depth}")
+            else:
+                self.conn.rollback()
+            raise
+        finally:
+            self._tx_depth = depth
+        if depth == 0:
+            after, self._after = self._after, []
+            for fn in after:
+                fn()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._tx_depth > 0
+
+    def _commit(self):
+        # transaction() ichida COMMIT tashqi blok oxirida bo'ladi
+        if not self._tx_depth:
+            self.conn.commit()
+
+    def _after_commit(self, fn: Callable[[], None]):
+        if self._tx_depth:
+            self._after.append(fn)
+        else:
+            fn()
 
     def _init(self):
         self.conn.execute("""
@@ -44,17 +458,43 @@ class DB:
         """)
 
         self.conn.commit()
+        self._migrate()
+
+    def _migrate(self):
+        # BEGIN IMMEDIATE + versiyani tranzaksiya ichida o'qish: bir nechta jarayon
+        # bir vaqtda ishga tushsa ham har migratsiya bir marta bajariladi
+        while True:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                ver = int(self.conn.execute("PRAGMA user_version").fetchone()[0])
+                if ver >= len(MIGRATIONS):
+                    self.conn.commit()
+                    return
+                for step in MIGRATIONS[ver]:
+                    if callable(step):
+                        step(self.conn)
+                    else:
+                        self.conn.execute(step)
+                self.conn.execute(f"PRAGMA user_version={ver + 1}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def schema_version(self) -> int:
+        return int(self.conn.execute("PRAGMA user_version").fetchone()[0])
 
     # ---------- users ----------
     def ensure_user(self, user_id: int, referrer_id: Optional[int] = None):
         cur = self.conn.cursor()
         cur.execute("SELECT user_id FROM users WHERE user_id=?", (user_id,))
         if cur.fetchone() is None:
+            # OR IGNORE: boshqa jarayon shu orada qo'shib ulgurgan bo'lishi mumkin
             cur.execute(
-                "INSERT INTO users(user_id, referrer_id) VALUES(?, ?)",
+                "INSERT OR IGNORE INTO users(user_id, referrer_id) VALUES(?, ?)",
                 (user_id, referrer_id),
             )
-            self.conn.commit()
+            self._commit()
 
     def get_user(self, user_id: int) -> Optional[Tuple[int, Optional[int], int, int]]:
         cur = self.conn.cursor()
@@ -69,7 +509,7 @@ class DB:
             "UPDATE users SET joined_ok=? WHERE user_id=?",
             (1 if ok else 0, user_id),
         )
-        self.conn.commit()
+        self._commit()
 
     def is_banned(self, user_id: int) -> bool:
         cur = self.conn.cursor()
@@ -79,64 +519,210 @@ class DB:
 
     def ban_user(self, user_id: int):
         self.conn.execute("UPDATE users SET banned=1 WHERE user_id=?", (user_id,))
-        self.conn.commit()
+        self._commit()
 
     def unban_user(self, user_id: int):
         self.conn.execute("UPDATE users SET banned=0 WHERE user_id=?", (user_id,))
-        self.conn.commit()
+        self._commit()
+
+    def load_user_context(self, user_id: int) -> Optional[tuple]:
+        """users qatori + joriy mavsum referral soni — bitta so'rovda."""
+        cur = self.conn.cursor()
+        cur.execute(f"""
+            SELECT u.user_id, u.referrer_id, u.joined_ok, u.banned,
+                   COALESCE(rc.cnt, 0),
+                   u.reachable
+            FROM users u
+            LEFT JOIN referral_counts rc ON rc.season_id = {SEASON} AND rc.referrer_id = u.user_id
+            WHERE u.user_id = ?
+        """, (user_id,))
+        return cur.fetchone()
+
+    def save_user_context(self, user_id: int, joined_ok: bool):
+        self.conn.execute(
+            "UPDATE users SET joined_ok=? WHERE user_id=?",
+            (1 if joined_ok else 0, user_id),
+        )
+        self._commit()
+
+    def user_ids_after(self, after_id: int, limit: int = 500) -> List[int]:
+        """Keyset pagination: banlanmagan va yetib boriladigan userlar, user_id > after_id."""
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT user_id FROM users WHERE user_id > ? AND banned = 0 AND reachable = 1 "
+            "ORDER BY user_id LIMIT ?",
+            (after_id, limit),
+        )
+        return [int(r[0]) for r in cur.fetchall()]
+
+    def active_users_count(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM users WHERE banned = 0 AND reachable = 1")
+        return int(cur.fetchone()[0])
+
+    # ---------- reachability ----------
+    def set_reachable(self, user_id: int, ok: bool) -> bool:
+        """
+        403 (bloklagan) yoki my_chat_member bo'yicha. True — holat o'zgardi.
+        Qaytganda 'failed' mukofot joblari qayta navbatga qo'yiladi.
+        """
+        cur = self.conn.execute(
+            "UPDATE users SET reachable=?, unreachable_at=? WHERE user_id=? AND reachable<>?",
+            (1 if ok else 0, None if ok else int(time.time()), user_id, 1 if ok else 0),
+        )
+        changed = cur.rowcount > 0
+        if changed and ok:
+            self.conn.execute(
+                "UPDATE reward_jobs SET status='pending', attempts=0, next_at=0 "
+                "WHERE user_id=? AND status='failed'",
+                (user_id,),
+            )
+        self._commit()
+        return changed
+
+    def is_reachable(self, user_id: int) -> bool:
+        cur = self.conn.cursor()
+        cur.execute("SELECT reachable FROM users WHERE user_id=?", (user_id,))
+        row = cur.fetchone()
+        return row is None or int(row[0]) == 1
+
+    def unreachable_count(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM users WHERE reachable = 0")
+        return int(cur.fetchone()[0])
 
     # ---------- referrals ----------
     def add_referral_if_unique(self, referrer_id: int, invited_user_id: int) -> bool:
+        # referral + hisoblagich + kunlik/soatlik rollup bitta tranzaksiyada (joriy mavsum)
+        now = int(time.time())
+        day = local_day(now)
         try:
-            self.conn.execute(
-                "INSERT INTO referrals(referrer_id, invited_user_id) VALUES(?, ?)",
-                (referrer_id, invited_user_id),
-            )
-            self.conn.commit()
-            return True
+            with self.transaction():
+                season = self.current_season()
+                self.conn.execute(
+                    "INSERT INTO referrals(season_id, referrer_id, invited_user_id, created_at) VALUES(?, ?, ?, ?)",
+                    (season, referrer_id, invited_user_id, now),
+                )
+                self.conn.execute(
+                    "INSERT INTO referral_counts(season_id, referrer_id, cnt) VALUES(?, ?, 1) "
+                    "ON CONFLICT(season_id, referrer_id) DO UPDATE SET cnt=cnt+1",
+                    (season, referrer_id),
+                )
+                self.conn.execute(
+                    "INSERT INTO referral_daily(season_id, day, referrer_id, cnt) VALUES(?, ?, ?, 1) "
+                    "ON CONFLICT(season_id, day, referrer_id) DO UPDATE SET cnt=cnt+1",
+                    (season, day, referrer_id),
+                )
+                self.conn.execute(
+                    "INSERT INTO referral_hourly(season_id, hour, day, cnt) VALUES(?, ?, ?, 1) "
+                    "ON CONFLICT(season_id, hour) DO UPDATE SET cnt=cnt+1",
+                    (season, now - now % 3600, day),
+                )
+                self._after_commit(lambda: self._referral_added(referrer_id, invited_user_id))
         except sqlite3.IntegrityError:
             return False
+        return True
+
+    def _referral_added(self, referrer_id: int, invited_user_id: int):
+        if self.board is not None:
+            self.board.incr(referrer_id)
+        if self.graph is not None:
+            self.graph.add(referrer_id, invited_user_id)
+        self._emit("referral", referrer_id)
 
     def referrals_count(self, referrer_id: int) -> int:
         cur = self.conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM referrals WHERE referrer_id=?", (referrer_id,))
-        return int(cur.fetchone()[0])
+        cur.execute(
+            f"SELECT cnt FROM referral_counts WHERE season_id = {SEASON} AND referrer_id=?",
+            (referrer_id,),
+        )
+        row = cur.fetchone()
+        return int(row[0]) if row else 0
 
     def referrals_count_since(self, referrer_id: int, since_ts: int) -> int:
         cur = self.conn.cursor()
         cur.execute(
-            "SELECT COUNT(*) FROM referrals WHERE referrer_id=? AND created_at>=?",
+            f"SELECT COUNT(*) FROM referrals WHERE season_id = {SEASON} AND referrer_id=? AND created_at>=?",
             (referrer_id, since_ts)
         )
         return int(cur.fetchone()[0])
 
+    def referrals_count_on(self, referrer_id: int, day: str) -> int:
+        """Mahalliy kun ('YYYY-MM-DD') bo'yicha — referral_daily dan."""
+        cur = self.conn.cursor()
+        cur.execute(
+            f"SELECT cnt FROM referral_daily WHERE season_id = {SEASON} AND day=? AND referrer_id=?",
+            (day, referrer_id),
+        )
+        row = cur.fetchone()
+        return int(row[0]) if row else 0
+
+    def top_referrers_on(self, day: str, limit: int = 10) -> List[Tuple[int, int]]:
+        cur = self.conn.cursor()
+        cur.execute(f"""
+            SELECT referrer_id, cnt FROM referral_daily
+            WHERE season_id = {SEASON} AND day = ? AND cnt > 0
+            ORDER BY cnt DESC, referrer_id ASC
+            LIMIT ?
+        """, (day, limit))
+        return [(int(r[0]), int(r[1])) for r in cur.fetchall()]
+
+    def daily_totals(self, days: int = 7) -> List[Tuple[str, int]]:
+        """Oxirgi `days` kun (bugun bilan) jami referrallar, eski kundan yangisiga."""
+        since = int(time.time()) - (days - 1) * 86400
+        first_day = local_day(since)
+        cur = self.conn.cursor()
+        cur.execute(
+            f"SELECT day, SUM(cnt) FROM referral_hourly WHERE season_id = {SEASON} AND day >= ? GROUP BY day",
+            (first_day,),
+        )
+        got = {d: int(c) for d, c in cur.fetchall()}
+        out = []
+        for i in range(days):
+            d = local_day(since + i * 86400)
+            out.append((d, got.get(d, 0)))
+        return out
+
+    def hourly_histogram(self, day: str) -> List[int]:
+        """Mahalliy kun bo'yicha 24 ta soatlik son."""
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT hour, cnt FROM referral_hourly WHERE season_id = {SEASON} AND day=?", (day,))
+        out = [0] * 24
+        for hour, cnt in cur.fetchall():
+            out[datetime.fromtimestamp(int(hour), TZ).hour] += int(cnt)
+        return out
+
     # ---------- flags ----------
     def flag_set(self, user_id: int, key: str) -> bool:
         cur = self.conn.cursor()
-        cur.execute("SELECT 1 FROM user_flags WHERE user_id=? AND key=?", (user_id, key))
+        cur.execute(
+            f"SELECT 1 FROM user_flags WHERE season_id = {SEASON} AND user_id=? AND key=?", (user_id, key)
+        )
         return cur.fetchone() is not None
 
     def set_flag(self, user_id: int, key: str) -> bool:
-        try:
-            self.conn.execute(
-                "INSERT INTO user_flags(user_id, key) VALUES(?, ?)",
-                (user_id, key)
-            )
-            self.conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
+        # OR IGNORE: IntegrityError sqlite3 ochgan yashirin tranzaksiyani ochiq qoldirardi —
+        # keyingi BEGIN IMMEDIATE "cannot start a transaction within a transaction" berardi
+        cur = self.conn.execute(
+            f"INSERT OR IGNORE INTO user_flags(season_id, user_id, key) VALUES({SEASON}, ?, ?)",
+            (user_id, key)
+        )
+        self._commit()
+        return cur.rowcount == 1
 
     def clear_flags(self, user_id: int):
-        self.conn.execute("DELETE FROM user_flags WHERE user_id=?", (user_id,))
-        self.conn.commit()
+        self.conn.execute(f"DELETE FROM user_flags WHERE season_id = {SEASON} AND user_id=?", (user_id,))
+        self._commit()
 
     def wipe_flags(self):
-        self.conn.execute("DELETE FROM user_flags")
-        self.conn.commit()
+        """Faqat joriy mavsum flaglari (referrallar saqlanadi)."""
+        self.conn.execute(f"DELETE FROM user_flags WHERE season_id = {SEASON}")
+        self._commit()
 
     # ---------- settings ----------
     def get_setting(self, key: str) -> Optional[str]:
+        if self.settings is not None:
+            return self.settings.raw(key)
         cur = self.conn.cursor()
         cur.execute("SELECT value FROM settings WHERE key=?", (key,))
         row = cur.fetchone()
@@ -148,9 +734,39 @@ class DB:
             "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
             (key, value),
         )
-        self.conn.commit()
+        # versiya shu tranzaksiyada oshadi — boshqa jarayonlar snapshot eskirganini biladi
+        self.conn.execute(
+            "INSERT INTO settings(key,value) VALUES(?, '1') "
+            "ON CONFLICT(key) DO UPDATE SET value=CAST(value AS INTEGER) + 1",
+            (VERSION_KEY,),
+        )
+        version = self.settings_version()
+        self._commit()
+        if self.settings is not None:
+            self._after_commit(lambda: self.settings.apply(key, value, version))
+
+    def settings_version(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT value FROM settings WHERE key=?", (VERSION_KEY,))
+        row = cur.fetchone()
+        return int(row[0]) if row else 0
+
+    def _load_settings(self):
+        cur = self.conn.cursor()
+        cur.execute("SELECT key, value FROM settings WHERE key<>?", (VERSION_KEY,))
+        rows = {k: v for k, v in cur.fetchall()}
+        self.settings.load(rows, self.settings_version())
+
+    def refresh_settings(self) -> bool:
+        """Boshqa jarayon settings'ni o'zgartirgan bo'lsa snapshot'ni qayta yuklaydi."""
+        if self.settings is None or self.settings_version() == self.settings.version:
+            return False
+        self._load_settings()
+        return True
 
     def get_target(self, default: int) -> int:
+        if self.settings is not None:
+            return self.settings.get("invite_target", default)
         v = self.get_setting("invite_target")
         if not v:
             return default
@@ -162,6 +778,167 @@ class DB:
     def set_target(self, n: int):
         self.set_setting("invite_target", str(int(n)))
 
+    # ---------- broadcasts ----------
+    def create_broadcast(self, admin_chat_id: int, text: Optional[str],
+                         from_chat_id: Optional[int], message_id: Optional[int], total: int) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO broadcasts(admin_chat_id, text, from_chat_id, message_id, total) "
+            "VALUES(?, ?, ?, ?, ?)",
+            (admin_chat_id, text, from_chat_id, message_id, total),
+        )
+        self._commit()
+        return int(cur.lastrowid)
+
+    def get_broadcast(self, bid: int) -> Optional[Dict]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT * FROM broadcasts WHERE id=?", (bid,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cur.description], row))
+
+    def broadcasts_by_status(self, status: str) -> List[int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT id FROM broadcasts WHERE status=? ORDER BY id", (status,))
+        return [int(r[0]) for r in cur.fetchall()]
+
+    def broadcast_checkpoint(self, bid: int, last_user_id: int, sent: int, failed: int):
+        self.conn.execute(
+            "UPDATE broadcasts SET last_user_id=?, sent=sent+?, failed=failed+?, "
+            "updated_at=strftime('%s','now') WHERE id=?",
+            (last_user_id, sent, failed, bid),
+        )
+        self._commit()
+
+    def set_broadcast_status(self, bid: int, status: str):
+        self.conn.execute(
+            "UPDATE broadcasts SET status=?, updated_at=strftime('%s','now') WHERE id=?",
+            (status, bid),
+        )
+        self._commit()
+
+    # ---------- rewards ----------
+    def enqueue_reward(self, user_id: int, target: int) -> Optional[int]:
+        """
+        win_sent flag + mukofot job bitta tranzaksiyada. Flag allaqachon bor bo'lsa None.
+        Idempotency key flag qatoriga bog'langan: reset'dan keyin qayta yutsa — yangi job.
+        """
+        try:
+            with self.transaction():
+                cur = self.conn.execute(
+                    f"INSERT INTO user_flags(season_id, user_id, key) VALUES({SEASON}, ?, 'win_sent')", (user_id,)
+                )
+                key = f"win:{user_id}:{cur.lastrowid}"
+                cur = self.conn.execute(
+                    "INSERT INTO reward_jobs(key, user_id, target) VALUES(?, ?, ?)",
+                    (key, user_id, target),
+                )
+            return int(cur.lastrowid)
+        except sqlite3.IntegrityError:
+            return None
+
+    def claim_reward_jobs(self, now: int, limit: int = 20, lease: int = 120) -> List[Dict]:
+        """
+        Vaqti kelgan joblarni olib, `lease` soniyaga band qiladi (status='sending').
+        Jarayon yiqilsa lease tugagach job yana olinadi.
+        """
+        with self.transaction():
+            cur = self.conn.execute("""
+                SELECT * FROM reward_jobs
+                WHERE status IN ('pending', 'sending') AND next_at <= ?
+                ORDER BY next_at, id
+                LIMIT ?
+            """, (now, limit))
+            cols = [c[0] for c in cur.description]
+            jobs = [dict(zip(cols, r)) for r in cur.fetchall()]
+            self.conn.executemany(
+                "UPDATE reward_jobs SET status='sending', attempts=attempts+1, next_at=?, "
+                "updated_at=? WHERE id=?",
+                ((now + lease, now, j["id"]) for j in jobs),
+            )
+        for j in jobs:
+            j["attempts"] += 1
+        return jobs
+
+    def claim_invite_link(self, job_id: int) -> Optional[str]:
+        """Pool'dan bitta bo'sh linkni jobga biriktiradi (retry'da o'sha link qaytadi)."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT link FROM invite_links WHERE job_id=?", (job_id,))
+        row = cur.fetchone()
+        if row:
+            return row[0]
+        cur.execute("""
+            UPDATE invite_links SET job_id=?, used_at=strftime('%s','now')
+            WHERE link = (SELECT link FROM invite_links WHERE job_id IS NULL ORDER BY created_at LIMIT 1)
+        """, (job_id,))
+        if cur.rowcount == 0:
+            self._commit()
+            return None
+        cur.execute("SELECT link FROM invite_links WHERE job_id=?", (job_id,))
+        link = cur.fetchone()[0]
+        self.conn.execute("UPDATE reward_jobs SET invite_link=? WHERE id=?", (link, job_id))
+        self._commit()
+        return link
+
+    def attach_invite_link(self, job_id: int, link: str):
+        """Pool bo'sh bo'lganda joy-joyida yaratilgan link."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO invite_links(link, job_id, used_at) VALUES(?, ?, strftime('%s','now'))",
+            (link, job_id),
+        )
+        self.conn.execute("UPDATE reward_jobs SET invite_link=? WHERE id=?", (link, job_id))
+        self._commit()
+
+    def add_invite_links(self, links: List[str]):
+        self.conn.executemany("INSERT OR IGNORE INTO invite_links(link) VALUES(?)", ((l,) for l in links))
+        self._commit()
+
+    def invite_pool_size(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM invite_links WHERE job_id IS NULL")
+        return int(cur.fetchone()[0])
+
+    def finish_reward(self, job_id: int):
+        self.conn.execute(
+            "UPDATE reward_jobs SET status='done', last_error=NULL, updated_at=strftime('%s','now') WHERE id=?",
+            (job_id,),
+        )
+        self._commit()
+
+    def fail_reward(self, job_id: int, error: str, retry_at: Optional[int] = None):
+        """retry_at=None — butunlay failed (admin /reward_retry bilan qaytaradi)."""
+        self.conn.execute(
+            "UPDATE reward_jobs SET status=?, next_at=COALESCE(?, next_at), last_error=?, "
+            "updated_at=strftime('%s','now') WHERE id=?",
+            ("pending" if retry_at is not None else "failed", retry_at, error[:500], job_id),
+        )
+        self._commit()
+
+    def retry_failed_rewards(self, job_id: Optional[int] = None) -> int:
+        sql = "UPDATE reward_jobs SET status='pending', attempts=0, next_at=0 WHERE status='failed'"
+        args: tuple = ()
+        if job_id is not None:
+            sql += " AND id=?"
+            args = (job_id,)
+        cur = self.conn.execute(sql, args)
+        self._commit()
+        return cur.rowcount
+
+    def reward_stats(self) -> Dict[str, int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT status, COUNT(*) FROM reward_jobs GROUP BY status")
+        return {s: int(c) for s, c in cur.fetchall()}
+
+    def rewards_by_status(self, statuses: Tuple[str, ...], limit: int = 10) -> List[Dict]:
+        cur = self.conn.cursor()
+        cur.execute(
+            f"SELECT * FROM reward_jobs WHERE status IN ({','.join('?' * len(statuses))}) "
+            "ORDER BY id DESC LIMIT ?",
+            (*statuses, limit),
+        )
+        cols = [c[0] for c in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
     # ---------- stats / ranking ----------
     def users_count(self) -> int:
         cur = self.conn.cursor()
@@ -170,26 +947,31 @@ class DB:
 
     def referrals_total(self) -> int:
         cur = self.conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM referrals")
+        cur.execute(f"SELECT COUNT(*) FROM referrals WHERE season_id = {SEASON}")
         return int(cur.fetchone()[0])
 
     def top_referrers(self, limit: int = 10) -> List[Tuple[int, int]]:
+        if self.board is not None:
+            return self.board.top(limit)
+        return self._top_referrers_sql(limit)
+
+    def _top_referrers_sql(self, limit: int) -> List[Tuple[int, int]]:
         cur = self.conn.cursor()
-        cur.execute("""
-            SELECT referrer_id, COUNT(*) AS c
-            FROM referrals
-            GROUP BY referrer_id
-            ORDER BY c DESC
+        cur.execute(f"""
+            SELECT referrer_id, cnt
+            FROM referral_counts
+            WHERE season_id = {SEASON} AND cnt > 0
+            ORDER BY cnt DESC, referrer_id ASC
             LIMIT ?
         """, (limit,))
         return [(int(r[0]), int(r[1])) for r in cur.fetchall()]
 
     def top_referrers_since(self, since_ts: int, limit: int = 10) -> List[Tuple[int, int]]:
         cur = self.conn.cursor()
-        cur.execute("""
+        cur.execute(f"""
             SELECT referrer_id, COUNT(*) AS c
             FROM referrals
-            WHERE created_at >= ?
+            WHERE season_id = {SEASON} AND created_at >= ?
             GROUP BY referrer_id
             ORDER BY c DESC
             LIMIT ?
@@ -198,40 +980,379 @@ class DB:
 
     def user_rank(self, user_id: int) -> int:
         """Umumiy ranking (1 dan boshlanadi). Agar referral yo'q bo'lsa ham rank qaytaradi."""
+        if self.board is not None:
+            return self.board.rank(user_id)
+        return self._user_rank_sql(user_id)
+
+    def _user_rank_sql(self, user_id: int) -> int:
         my_cnt = self.referrals_count(user_id)
         cur = self.conn.cursor()
-        cur.execute("""
-            SELECT 1 + COUNT(*) FROM (
-                SELECT referrer_id, COUNT(*) AS c
-                FROM referrals
-                GROUP BY referrer_id
-            ) t
-            WHERE t.c > ?
-        """, (my_cnt,))
+        cur.execute(
+            f"SELECT 1 + COUNT(*) FROM referral_counts WHERE season_id = {SEASON} AND cnt > ?", (my_cnt,)
+        )
+        return int(cur.fetchone()[0])
+
+    def users_at_count(self, cnt: int) -> int:
+        """Aynan `cnt` ta referrali bor userlar soni."""
+        if self.board is not None:
+            return self.board.users_at(cnt)
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM referral_counts WHERE season_id = {SEASON} AND cnt=?", (cnt,))
         return int(cur.fetchone()[0])
 
     def users_near_goal(self, target_minus_1: int, limit: int = 50) -> List[Tuple[int, int]]:
         """4/5 dagilar (ya'ni target-1)."""
         cur = self.conn.cursor()
-        cur.execute("""
-            SELECT r.referrer_id, COUNT(*) AS c
-            FROM referrals r
-            JOIN users u ON u.user_id = r.referrer_id
-            WHERE u.banned = 0
-            GROUP BY r.referrer_id
-            HAVING c = ?
-            ORDER BY r.referrer_id ASC
+        cur.execute(f"""
+            SELECT rc.referrer_id, rc.cnt
+            FROM referral_counts rc
+            JOIN users u ON u.user_id = rc.referrer_id
+            WHERE rc.season_id = {SEASON} AND rc.cnt = ? AND u.banned = 0
+            ORDER BY rc.referrer_id ASC
             LIMIT ?
         """, (target_minus_1, limit))
         return [(int(r[0]), int(r[1])) for r in cur.fetchall()]
 
-    # ---------- resets ----------
+    def referrers_at_least(self, min_cnt: int, after: Tuple[int, int] = (0, 0),
+                           limit: int = 500) -> List[Tuple[int, int, int, int, int]]:
+        """
+        Keyset bo'yicha (cnt, referrer_id) > after va cnt >= min_cnt — idx_referral_counts_cnt
+        bo'ylab bitta o'tish. (user_id, cnt, near_sent, win_sent, reachable); banlanganlar tashlanadi.
+        """
+        cur = self.conn.cursor()
+        cur.execute(f"""
+            SELECT rc.referrer_id, rc.cnt,
+                   EXISTS(SELECT 1 FROM user_flags f WHERE f.season_id = rc.season_id
+                          AND f.user_id = rc.referrer_id AND f.key = 'near_sent'),
+                   EXISTS(SELECT 1 FROM user_flags f WHERE f.season_id = rc.season_id
+                          AND f.user_id = rc.referrer_id AND f.key = 'win_sent'),
+                   COALESCE(u.reachable, 1)
+            FROM referral_counts rc
+            LEFT JOIN users u ON u.user_id = rc.referrer_id
+            WHERE rc.season_id = {SEASON} AND rc.cnt >= ? AND (rc.cnt, rc.referrer_id) > (?, ?)
+              AND COALESCE(u.banned, 0) = 0
+            ORDER BY rc.cnt, rc.referrer_id
+            LIMIT ?
+        """, (min_cnt, after[0], after[1], limit))
+        return [tuple(int(x) for x in r) for r in cur.fetchall()]
+
+    def referrers_at_least_count(self, min_cnt: int) -> int:
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM referral_counts WHERE season_id = {SEASON} AND cnt >= ?", (min_cnt,))
+        return int(cur.fetchone()[0])
+
+    # ---------- subscription audit ----------
+    def audit_state(self) -> Dict:
+        cur = self.conn.execute("SELECT * FROM sub_audit WHERE id=1")
+        cols = [c[0] for c in cur.description]
+        return dict(zip(cols, cur.fetchone()))
+
+    def audit_start_pass(self) -> Dict:
+        self.conn.execute("""
+            UPDATE sub_audit SET pass=pass+1, phase='priority', position=0, checked=0, left_cnt=0,
+                   started_at=strftime('%s','now'), finished_at=NULL, updated_at=strftime('%s','now')
+            WHERE id=1
+        """)
+        self._commit()
+        return self.audit_state()
+
+    def audit_priority_users(self, target: int, top: int = 50, limit: int = 2000) -> List[int]:
+        """
+        Audit birinchi navbatda: TOP referrerlar va targetga yaqinlar (target-2 .. target-1),
+        o'zlari va ular taklif qilganlar. Tartib barqaror — `position` shu ro'yxatdagi indeks.
+        """
+        cur = self.conn.cursor()
+        cur.execute(f"""
+            SELECT referrer_id FROM (
+                SELECT referrer_id, 0 AS grp, -cnt AS ord FROM (
+                    SELECT referrer_id, cnt FROM referral_counts WHERE season_id = {SEASON}
+                    ORDER BY cnt DESC, referrer_id LIMIT ?
+                )
+                UNION ALL
+                SELECT referrer_id, 1, referrer_id FROM referral_counts
+                WHERE season_id = {SEASON} AND cnt BETWEEN ? AND ?
+            )
+            ORDER BY grp, ord
+        """, (top, max(1, target - 2), max(1, target - 1)))
+        out: List[int] = []
+        seen = set()
+        for (rid,) in cur.fetchall():
+            if rid in seen:
+                continue
+            seen.add(rid)
+            out.append(int(rid))
+            inv = self.conn.execute(
+                f"SELECT invited_user_id FROM referrals WHERE season_id = {SEASON} AND referrer_id=? "
+                "ORDER BY invited_user_id LIMIT ?",
+                (rid, limit),
+            )
+            for (uid,) in inv.fetchall():
+                if uid not in seen:
+                    seen.add(uid)
+                    out.append(int(uid))
+            if len(out) >= limit:
+                break
+        return out[:limit]
+
+    def joined_users_after(self, after_id: int, limit: int = 500) -> List[int]:
+        """Keyset: joined_ok=1 userlar, user_id > after_id."""
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT user_id FROM users WHERE user_id > ? AND joined_ok = 1 ORDER BY user_id LIMIT ?",
+            (after_id, limit),
+        )
+        return [int(r[0]) for r in cur.fetchall()]
+
+    def audit_checkpoint(self, phase: str, position: int, checked: int, left: List[int],
+                         back: List[int], flag_referrals: bool = False, finished: bool = False):
+        """
+        Bitta batch natijasi + progress bitta tranzaksiyada: `left` — kanaldan chiqqanlar
+        (joined_ok=0), `back` — qaytganlar (joined_ok=1). flag_referrals: joriy mavsum
+        referrals.left_at belgilanadi/tozalanadi (hisob o'zgarmaydi).
+        """
+        now = int(time.time())
+        with self.transaction():
+            if left:
+                self.conn.executemany(
+                    "UPDATE users SET joined_ok=0 WHERE user_id=? AND joined_ok=1", ((u,) for u in left)
+                )
+            if back:
+                self.conn.executemany(
+                    "UPDATE users SET joined_ok=1 WHERE user_id=? AND joined_ok=0", ((u,) for u in back)
+                )
+            if flag_referrals:
+                self.conn.executemany(
+                    f"UPDATE referrals SET left_at=? WHERE season_id = {SEASON} AND invited_user_id=? "
+                    "AND left_at IS NULL",
+                    ((now, u) for u in left),
+                )
+                self.conn.executemany(
+                    f"UPDATE referrals SET left_at=NULL WHERE season_id = {SEASON} AND invited_user_id=? "
+                    "AND left_at IS NOT NULL",
+                    ((u,) for u in back),
+                )
+            self.conn.execute(
+                "UPDATE sub_audit SET phase=?, position=?, checked=checked+?, left_cnt=left_cnt+?, "
+                "finished_at=CASE WHEN ? THEN ? ELSE finished_at END, updated_at=? WHERE id=1",
+                ("idle" if finished else phase, position, checked, len(left), int(finished), now, now),
+            )
+
+    def referrals_left_count(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM referrals WHERE season_id = {SEASON} AND left_at IS NOT NULL")
+        return int(cur.fetchone()[0])
+
+    # ---------- resets / seasons ----------
     def reset_user_progress(self, user_id: int):
-        self.conn.execute("DELETE FROM referrals WHERE referrer_id=?", (user_id,))
-        self.clear_flags(user_id)
-        self.conn.commit()
+        season = self.current_season()
+        # soatlik jami sonlardan shu userning ulushini ayiramiz
+        self.conn.execute("""
+            UPDATE referral_hourly SET cnt = cnt - (
+                SELECT COUNT(*) FROM referrals r
+                WHERE r.season_id = ? AND r.referrer_id = ?
+                  AND r.created_at / 3600 * 3600 = referral_hourly.hour
+            )
+            WHERE season_id = ? AND hour IN (
+                SELECT DISTINCT created_at / 3600 * 3600 FROM referrals
+                WHERE season_id = ? AND referrer_id = ?
+            )
+        """, (season, user_id, season, season, user_id))
+        self.conn.execute("DELETE FROM referrals WHERE season_id=? AND referrer_id=?", (season, user_id))
+        self.conn.execute("DELETE FROM referral_counts WHERE season_id=? AND referrer_id=?", (season, user_id))
+        self.conn.execute("DELETE FROM referral_daily WHERE season_id=? AND referrer_id=?", (season, user_id))
+        self.conn.execute("DELETE FROM user_flags WHERE season_id=? AND user_id=?", (season, user_id))
+        self._commit()
+        self._after_commit(lambda: self._progress_reset(user_id))
+
+    def _progress_reset(self, user_id: int):
+        if self.board is not None:
+            self.board.remove(user_id)
+        if self.graph is not None:
+            self.graph.detach_children(user_id)
+        self._emit("reset", user_id)
+
+    def current_season(self) -> int:
+        cur = self.conn.cursor()
+        cur.execute("SELECT MAX(id) FROM seasons")
+        return int(cur.fetchone()[0])
+
+    def start_season(self) -> int:
+        """Yangi mavsum: bitta INSERT. Eski ma'lumot joyida qoladi (prune_seasons o'chiradi)."""
+        cur = self.conn.execute("INSERT INTO seasons DEFAULT VALUES")
+        self._commit()
+        self._after_commit(self._season_started)
+        return int(cur.lastrowid)
+
+    def _season_started(self):
+        if self.board is not None:
+            self.board.clear()
+        if self.graph is not None:
+            self.graph.clear()
+        self._emit("wipe")
 
     def wipe_all_referrals(self):
-        self.conn.execute("DELETE FROM referrals")
-        self.wipe_flags()
-        self.conn.commit()
\ No newline at end of file
+        """ "🧹 Hammasini 0" — endi mass DELETE emas, yangi mavsum."""
+        self.start_season()
+
+    def seasons_info(self) -> List[Tuple[int, int, Optional[int]]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT id, started_at, pruned_at FROM seasons ORDER BY id DESC")
+        return [(int(a), int(b or 0), c) for a, b, c in cur.fetchall()]
+
+    def prune_seasons(self, keep: int = 2, batch: int = 2000) -> int:
+        """
+        Oxirgi `keep` mavsumdan eskilarini o'chiradi — har chaqiruvda eng ko'pi `batch` qator
+        (qisqa tranzaksiya, lock uzoq ushlanmaydi). O'chirilgan qatorlar soni; 0 — ish qolmadi.
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT id FROM seasons WHERE pruned_at IS NULL AND id <= (SELECT MAX(id) FROM seasons) - ? "
+            "ORDER BY id LIMIT 1",
+            (max(1, keep),),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return 0
+        season = int(row[0])
+        deleted = 0
+        for table in ("referrals", "user_flags", "referral_daily", "referral_hourly", "referral_counts"):
+            c = self.conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} WHERE season_id=? LIMIT ?)",
+                (season, batch - deleted),
+            )
+            deleted += c.rowcount
+            if deleted >= batch:
+                break
+        if deleted == 0:
+            self.conn.execute("UPDATE seasons SET pruned_at=strftime('%s','now') WHERE id=?", (season,))
+            deleted = 1
+        self._commit()
+        return deleted
+
+    # ---------- export / import ----------
+    def export_rows(self, name: str, chunk: int = 5000) -> Iterator[tuple]:
+        """Jadvalni fetchmany bilan oqim qilib beradi — xotira jadval hajmiga bog'liq emas."""
+        _, select, _ = DATA_TABLES[name]
+        cur = self.conn.cursor()
+        cur.execute(select)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                return
+            yield from rows
+
+    def import_rows(self, name: str, rows: Iterable[tuple], batch: int = 5000,
+                    tx_rows: int = 100_000) -> int:
+        """
+        executemany `batch` qatordan, har `tx_rows` qatorda commit. Yangi qo'shilganlar sonini
+        qaytaradi. referrals/flags import qilinsa hosila jadvallar va reyting qayta quriladi.
+        Tartib: seasons -> users -> referrals -> flags. seasons fayli bo'lmasa ham, qatorlardagi
+        manzil bazada yo'q season_id lar `seasons` ga qo'shiladi (aks holda ular yetim qolardi).
+        """
+        _, _, insert = DATA_TABLES[name]
+        if insert is None:
+            raise ValueError(f"{name} import qilinmaydi")
+        before = self.conn.total_changes
+        buf: List[tuple] = []
+        in_tx = 0
+        try:
+            for row in rows:
+                buf.append(row)
+                if len(buf) >= batch:
+                    self.conn.executemany(insert, buf)
+                    in_tx += len(buf)
+                    buf.clear()
+                    if in_tx >= tx_rows:
+                        self._commit()
+                        in_tx = 0
+            if buf:
+                self.conn.executemany(insert, buf)
+            self._commit()
+        except Exception:
+            if not self._tx_depth:
+                self.conn.rollback()
+            raise
+        inserted = self.conn.total_changes - before
+        if name in ("referrals", "flags") and inserted:
+            table = "referrals" if name == "referrals" else "user_flags"
+            self.conn.execute(f"""
+                INSERT OR IGNORE INTO seasons(id)
+                SELECT DISTINCT season_id FROM {table} WHERE season_id NOT IN (SELECT id FROM seasons)
+            """)
+            self._commit()
+        if name in ("seasons", "referrals", "flags") and inserted:
+            self.rebuild_aggregates()
+        return inserted
+
+    def rebuild_aggregates(self):
+        """referral_counts, kunlik/soatlik rollup va xotiradagi reytingni referrals'dan qayta quradi."""
+        with self.transaction():
+            self.conn.execute("DELETE FROM referral_counts")
+            self.conn.execute("""
+                INSERT INTO referral_counts(season_id, referrer_id, cnt)
+                SELECT season_id, referrer_id, COUNT(*) FROM referrals
+                WHERE referrer_id IS NOT NULL
+                GROUP BY season_id, referrer_id
+            """)
+            _backfill_season_rollups(self.conn)
+            self._after_commit(self._aggregates_rebuilt)
+
+    def _aggregates_rebuilt(self):
+        if self.board is not None:
+            self.board.clear()
+            for uid, cnt in self._season_counts():
+                self.board.set(uid, cnt)
+        if self.graph is not None:
+            self.graph = ReferralGraph.from_edges(self.referral_edges())
+        self._emit("import")
+
+    # ---------- consistency ----------
+    def leaderboard_check(self, top_n: int = 10, sample: int = 200) -> List[str]:
+        """
+        Xotiradagi reytingni SQL bilan solishtiradi (referrals jadvalidan qayta sanab).
+        Farqlar ro'yxatini qaytaradi; bo'sh ro'yxat — hammasi mos.
+        """
+        problems: List[str] = []
+        season = self.current_season()
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT r.referrer_id, COUNT(*), rc.cnt
+            FROM referrals r
+            LEFT JOIN referral_counts rc ON rc.season_id = r.season_id AND rc.referrer_id = r.referrer_id
+            WHERE r.season_id = ?
+            GROUP BY r.referrer_id
+        """, (season,))
+        truth: Dict[int, int] = {}
+        for uid, real, stored in cur.fetchall():
+            truth[int(uid)] = int(real)
+            if stored is None or int(stored) != int(real):
+                problems.append(f"referral_counts[{uid}]={stored}, referrals={real}")
+        cur.execute("SELECT COUNT(*) FROM referral_counts WHERE season_id = ? AND cnt > 0", (season,))
+        if int(cur.fetchone()[0]) != len(truth):
+            problems.append("referral_counts ortiqcha qatorlar bor")
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM referrals WHERE season_id = ?),
+                   (SELECT COALESCE(SUM(cnt), 0) FROM referral_daily WHERE season_id = ?),
+                   (SELECT COALESCE(SUM(cnt), 0) FROM referral_hourly WHERE season_id = ?)
+        """, (season, season, season))
+        total, daily, hourly = cur.fetchone()
+        if not (total == daily == hourly):
+            problems.append(f"rollup: referrals={total}, daily={daily}, hourly={hourly}")
+        if self.board is None:
+            return problems
+
+        for uid, real in truth.items():
+            if self.board.count(uid) != real:
+                problems.append(f"board[{uid}]={self.board.count(uid)}, referrals={real}")
+        if len(self.board) != len(truth):
+            problems.append(f"board size={len(self.board)}, referrals={len(truth)}")
+
+        sql_top = self._top_referrers_sql(top_n)
+        if self.board.top(top_n) != sql_top:
+            problems.append(f"top{top_n}: board={self.board.top(top_n)}, sql={sql_top}")
+        for uid in list(truth)[:sample]:
+            a, b = self.board.rank(uid), self._user_rank_sql(uid)
+            if a != b:
+                problems.append(f"rank[{uid}]: board={a}, sql={b}")
+        return problems
\ No newline at end of file
@@ -0,0 +1,215 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+
+class Fenwick:
+    """Referral soni bo'yicha histogram: i-katakda cnt == i bo'lgan userlar soni."""
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def _grow(self, need: int):
+        size = self.size
+        while size < need:
+            size *= 2
+        old = [self.point(i) for i in range(1, self.size + 1)]
+        self.size = size
+        self.tree = [0] * (size + 1)
+        for i, v in enumerate(old, start=1):
+            if v:
+                self.add(i, v)
+
+    def add(self, i: int, delta: int):
+        if i > self.size:
+            self._grow(i)
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """cnt <= i bo'lganlar soni."""
+        i = min(i, self.size)
+        s = 0
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
+        return s
+
+    def lower_bound(self, k: int) -> int:
+        """prefix(i) >= k bo'ladigan eng kichik i (k >= 1)."""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos + 1
+
+    def point(self, i: int) -> int:
+        return self.prefix(i) - self.prefix(i - 1)
+
+
+class SortedIds:
+    """
+    Bir xil countdagi user_id'lar o'sish tartibida: `B` gacha elementli bo'laklar ro'yxati.
+    add/discard — O(log n + B), eng kichik k tasi — O(k) (bo'laklarni to'liq aylanmaymiz).
+    """
+
+    B = 512
+
+    def __init__(self, ids: Iterable[int] = ()):
+        ids = sorted(ids)
+        self._parts: List[List[int]] = [ids[i:i + self.B] for i in range(0, len(ids), self.B)]
+        self._maxes: List[int] = [p[-1] for p in self._parts]
+        self._len = len(ids)
+
+    def add(self, uid: int):
+        if not self._parts:
+            self._parts.append([uid])
+            self._maxes.append(uid)
+            self._len = 1
+            return
+        i = min(bisect_left(self._maxes, uid), len(self._parts) - 1)
+        p = self._parts[i]
+        insort(p, uid)
+        self._maxes[i] = p[-1]
+        if len(p) > 2 * self.B:
+            self._parts[i:i + 1] = [p[:self.B], p[self.B:]]
+            self._maxes[i:i + 1] = [p[self.B - 1], p[-1]]
+        self._len += 1
+
+    def discard(self, uid: int):
+        i = bisect_left(self._maxes, uid)
+        if i == len(self._parts):
+            return
+        p = self._parts[i]
+        j = bisect_left(p, uid)
+        if j == len(p) or p[j] != uid:
+            return
+        del p[j]
+        self._len -= 1
+        if p:
+            self._maxes[i] = p[-1]
+        else:
+            del self._parts[i]
+            del self._maxes[i]
+
+    def first(self, k: int) -> List[int]:
+        out: List[int] = []
+        for p in self._parts:
+            if len(out) >= k:
+                break
+            out.extend(p[:k - len(out)])
+        return out
+
+    def __len__(self) -> int:
+        return self._len
+
+
+class Leaderboard:
+    """
+    Xotiradagi reyting indeksi (referral_counts asosida, startda quriladi).
+    - rank / "k ta referrali borlar" — O(log n)
+    - top(limit) — eng yuqori countlardan boshlab, tenglikda user_id o'sish tartibida;
+      har count bo'yicha userlar tartiblangan (SortedIds) — tengliklar soniga bog'liq emas
+    Writer thread yangilaydi, loop o'qiydi — shuning uchun lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.counts: Dict[int, int] = {}
+            self.buckets: Dict[int, SortedIds] = {}
+            self.fw = Fenwick()
+            self.total = 0
+
+    @classmethod
+    def from_counts(cls, rows: Iterable[Tuple[int, int]]) -> "Leaderboard":
+        lb = cls()
+        groups: Dict[int, List[int]] = {}
+        for uid, cnt in rows:
+            uid, cnt = int(uid), int(cnt)
+            if cnt > 0 and uid not in lb.counts:
+                lb.counts[uid] = cnt
+                groups.setdefault(cnt, []).append(uid)
+        for cnt, ids in groups.items():
+            lb.buckets[cnt] = SortedIds(ids)
+            lb.fw.add(cnt, len(ids))
+            lb.total += len(ids)
+        return lb
+
+    # ---------- yozish ----------
+    def _unlink(self, uid: int):
+        old = self.counts.pop(uid, 0)
+        if old <= 0:
+            return
+        b = self.buckets[old]
+        b.discard(uid)
+        if not b:
+            del self.buckets[old]
+        self.fw.add(old, -1)
+        self.total -= 1
+
+    def _link(self, uid: int, cnt: int):
+        if cnt <= 0:
+            return
+        self.counts[uid] = cnt
+        b = self.buckets.get(cnt)
+        if b is None:
+            b = self.buckets[cnt] = SortedIds()
+        b.add(uid)
+        self.fw.add(cnt, 1)
+        self.total += 1
+
+    def set(self, uid: int, cnt: int):
+        with self._lock:
+            self._unlink(uid)
+            self._link(uid, cnt)
+
+    def incr(self, uid: int, delta: int = 1):
+        with self._lock:
+            cnt = self.counts.get(uid, 0) + delta
+            self._unlink(uid)
+            self._link(uid, cnt)
+
+    def remove(self, uid: int):
+        with self._lock:
+            self._unlink(uid)
+
+    # ---------- o'qish ----------
+    def count(self, uid: int) -> int:
+        return self.counts.get(uid, 0)
+
+    def rank(self, uid: int) -> int:
+        """1 + (mendan ko'p referrali borlar soni)."""
+        with self._lock:
+            my = self.counts.get(uid, 0)
+            return 1 + self.total - self.fw.prefix(my)
+
+    def users_at(self, cnt: int) -> int:
+        with self._lock:
+            return len(self.buckets.get(cnt, ()))
+
+    def top(self, limit: int = 10) -> List[Tuple[int, int]]:
+        out: List[Tuple[int, int]] = []
+        with self._lock:
+            # left = cnt <= c bo'lganlar soni; har qadamda keyingi bo'sh bo'lmagan
+            # countni Fenwick orqali topamiz (O(log n)), bo'sh countlarni aylanmaymiz
+            left = self.total
+            while left > 0 and len(out) < limit:
+                c = self.fw.lower_bound(left)
+                b = self.buckets[c]
+                need = limit - len(out)
+                out.extend((uid, c) for uid in b.first(need))
+                left -= len(b)
+        return out
+
+    def __len__(self) -> int:
+        return self.total
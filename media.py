@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from adb import AsyncDB
+
+log = logging.getLogger(__name__)
+
+
+class MediaRegistry:
+    """
+    Lokal fayl -> Telegram file_id. Fayl bir marta yuklanadi, file_id
+    `settings` jadvalida kontent hash bo'yicha saqlanadi (fayl o'zgarsa — yangi hash,
+    yangi upload). Telegram file_id ni rad etsa, qayta yuklanadi.
+    """
+
+    def __init__(self, adb: AsyncDB):
+        self.adb = adb
+        self._hashes: Dict[str, Tuple[float, str]] = {}
+        self._file_ids: Dict[str, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.uploads = 0
+
+    def _content_hash(self, path: str) -> str:
+        mtime = os.path.getmtime(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self._hashes[path] = (mtime, digest)
+        return digest
+
+    async def _get_file_id(self, key: str) -> Optional[str]:
+        fid = self._file_ids.get(key)
+        if fid is None:
+            fid = await self.adb.get_setting(key)
+            if fid:
+                self._file_ids[key] = fid
+        return fid
+
+    async def _remember(self, key: str, file_id: str):
+        self._file_ids[key] = file_id
+        await self.adb.set_setting(key, file_id)
+
+    async def _forget(self, key: str):
+        self._file_ids.pop(key, None)
+        await self.adb.set_setting(key, "")
+
+    async def send_photo(self, bot: Bot, chat_id: int, path: str, **kwargs) -> Message:
+        key = f"media:photo:{self._content_hash(path)}"
+
+        fid = await self._get_file_id(key)
+        if fid:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=fid, **kwargs)
+            except TelegramBadRequest as e:
+                # boshqa xatolar (chat topilmadi va h.k.) upload bilan tuzalmaydi
+                if "file" not in (e.message or "").lower():
+                    raise
+                log.warning("file_id rad etildi (%s), qayta yuklanadi: %s", path, e.message)
+                await self._forget(key)
+
+        # bir vaqtda kelgan birinchi so'rovlar faylni bir martadan ko'p yuklamasin
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            fid = await self._get_file_id(key)
+            if fid:
+                return await bot.send_photo(chat_id=chat_id, photo=fid, **kwargs)
+            msg = await bot.send_photo(chat_id=chat_id, photo=FSInputFile(path), **kwargs)
+            self.uploads += 1
+            if msg.photo:
+                await self._remember(key, msg.photo[-1].file_id)
+            return msg
@@ -0,0 +1,222 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# soniyalarda: 1ms .. 10s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(kw: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, v in sorted(self._values.items()):
+            out.append(f"{self.name}{_fmt_labels(labels)} {v}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [bucket counts..., +Inf], sum, count
+        self._data: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            d = self._data.get(key)
+            if d is None:
+                d = self._data[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            d[0][i] += 1
+            d[1] += value
+            d[2] += 1
+
+    def quantile(self, q: float, labels: Labels) -> float:
+        """Bucket chegarasi bo'yicha taxminiy kvantil (soniya)."""
+        d = self._data.get(labels)
+        if not d or not d[2]:
+            return 0.0
+        need = q * d[2]
+        acc = 0
+        for i, c in enumerate(d[0]):
+            acc += c
+            if acc >= need:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def summary(self) -> List[Tuple[Dict[str, str], int, float, float]]:
+        """[(labels, count, avg_s, p95_s)] — count bo'yicha kamayish tartibida."""
+        with self._lock:
+            items = list(self._data.items())
+        out = [(dict(k), d[2], d[1] / d[2], self.quantile(0.95, k)) for k, d in items if d[2]]
+        out.sort(key=lambda x: x[1], reverse=True)
+        return out
+
+    def expose(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._data.items())
+        for labels, (counts, total, n) in items:
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                le = _fmt_labels(labels, 'le="%s"' % b)
+                out.append(f"{self.name}_bucket{le} {acc}")
+            le = _fmt_labels(labels, 'le="+Inf"')
+            out.append(f"{self.name}_bucket{le} {n}")
+            out.append(f"{self.name}_sum{_fmt_labels(labels)} {total}")
+            out.append(f"{self.name}_count{_fmt_labels(labels)} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        # scrape paytida qiymat beradigan gauge'lar: name -> (help, fn)
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+    def counter(self, name: str, help: str) -> Counter:
+        m = Counter(name, help)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name: str, help: str) -> Histogram:
+        m = Histogram(name, help)
+        self._metrics.append(m)
+        return m
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]):
+        self._gauges[name] = (help, fn)
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.expose())
+        for name, (help, fn) in self._gauges.items():
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+handler_seconds = REGISTRY.histogram("bot_handler_seconds", "Handler bajarilish vaqti")
+handler_errors = REGISTRY.counter("bot_handler_errors_total", "Handlerda ko'tarilgan xatolar")
+db_seconds = REGISTRY.histogram("bot_db_seconds", "db.DB metodlari vaqti")
+db_errors = REGISTRY.counter("bot_db_errors_total", "db.DB metodlari xatolari")
+api_seconds = REGISTRY.histogram("bot_api_seconds", "Bot API so'rovlari vaqti")
+api_errors = REGISTRY.counter("bot_api_errors_total", "Bot API xatolari")
+
+
+def timed_db(name: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+    """AsyncDB ichida: thread'da bajariladigan DB chaqiruvini o'lchaydi."""
+    def run():
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        except Exception as e:
+            db_errors.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            db_seconds.observe(time.perf_counter() - t0, method=name)
+    return run
+
+
+class HandlerTimingMiddleware:
+    """Dispatcher inner middleware: qaysi handler qancha vaqt olganini yozadi."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        h = data.get("handler")
+        name = getattr(getattr(h, "callback", None), "__name__", "unknown")
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            handler_errors.inc(handler=name, error=type(e).__name__)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - t0, handler=name)
+
+
+class ApiTimingMiddleware:
+    """bot.session.middleware(...): Bot API metodlari bo'yicha latency va xatolar."""
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, "__api_method__", type(method).__name__)
+        t0 = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            api_errors.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - t0, method=name)
+
+
+def summary_text(limit: int = 8) -> str:
+    def block(title: str, hist: Histogram, key: str) -> List[str]:
+        rows = hist.summary()[:limit]
+        if not rows:
+            return [f"{title} —"]
+        out = [title]
+        for labels, n, avg, p95 in rows:
+            out.append(f"• {labels.get(key, '?')}: {n} ta, o‘rt {avg * 1000:.1f} ms, p95 ≤ {p95 * 1000:.0f} ms")
+        return out
+
+    lines = block("⚙️ Handlerlar:", handler_seconds, "handler")
+    lines += [""] + block("🗄 DB:", db_seconds, "method")
+    lines += [""] + block("🌐 Bot API:", api_seconds, "method")
+    return "\n".join(lines)
+
+
+async def start_http(host: str, port: int):
+    """Polling rejimi va WORKERS > 1 worker'lari uchun /metrics'li alohida kichik aiohttp server."""
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def metrics_handler(request):
+    from aiohttp import web
+
+    return web.Response(text=REGISTRY.expose(), content_type="text/plain", charset="utf-8")
@@ -0,0 +1,287 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+
+class ReferralGraph:
+    """
+    Referral daraxti xotirada, ixcham int massivlarda (CSR):
+    - `ids` — tartiblangan user_id'lar (dict emas: 1M user ~ 8 MB), qidiruv bisect bilan
+    - `offsets` / `children` — har tugun bolalari ketma-ket; `parent`, `size` (o'zi bilan
+      birga subtree), `depth` — tugun indeksi bo'yicha
+    Qurilgandan keyingi yangi tugun/qirralar `_extra_ids` (teskarisi `_extra_uids`) va
+    `_extra_children` ga tushadi, `rebuild_every` dan oshsa CSR qayta yig'iladi. O'chirilgan
+    qirra CSR'da qoladi, lekin parent[c] != i bo'lgani uchun o'tkazib yuboriladi.
+    Qirralar — faqat joriy mavsum referrals (tasdiqlangan takliflar; users.referrer_id emas):
+    yangi mavsumda daraxt bo'sh boshlanadi. Sikl bo'lsa (A->B, B->A kabi) qirra kesiladi va
+    `cut` da sanaladi. Writer thread yozadi, loop o'qiydi — lock.
+    """
+
+    def __init__(self, rebuild_every: int = 50_000):
+        self.rebuild_every = rebuild_every
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = array("q")
+        self.offsets = array("i", [0])
+        self.children = array("i")
+        self.parent = array("i")
+        self.size = array("i")
+        self.depth = array("i")
+        self._extra_ids: Dict[int, int] = {}
+        self._extra_uids: Dict[int, int] = {}
+        self._extra_children: Dict[int, List[int]] = {}
+        self._pending = 0
+        self.edges = 0
+        self.cut = 0
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[int, int]], rebuild_every: int = 50_000) -> "ReferralGraph":
+        g = cls(rebuild_every)
+        g._build(list(edges))
+        return g
+
+    # ---------- qurish ----------
+    def _build(self, edges: List[Tuple[int, int]]):
+        ids = array("q", sorted({int(x) for e in edges for x in e}))
+        parent = array("i", [-1]) * len(ids)
+        for r, u in edges:
+            iu = bisect_left(ids, int(u))
+            if parent[iu] == -1:
+                parent[iu] = bisect_left(ids, int(r))
+        self._layout(ids, parent)
+
+    def _layout(self, ids: "array[int]", parent: "array[int]"):
+        """parent massividan CSR, depth va size ni hisoblaydi (sikllar kesiladi)."""
+        n = len(ids)
+        counts = array("i", [0]) * (n + 1)
+        for p in parent:
+            if p >= 0:
+                counts[p + 1] += 1
+        offsets = array("i", [0]) * (n + 1)
+        for i in range(n):
+            offsets[i + 1] = offsets[i] + counts[i + 1]
+        fill = array("i", offsets[:n])
+        children = array("i", [0]) * offsets[n]
+        for c, p in enumerate(parent):
+            if p >= 0:
+                children[fill[p]] = c
+                fill[p] += 1
+
+        depth = array("i", [-1]) * n
+        order = array("i")
+        cut = 0
+
+        def walk(root: int):
+            depth[root] = 0
+            start = len(order)
+            order.append(root)
+            k = start
+            while k < len(order):
+                v = order[k]
+                for c in children[offsets[v]:offsets[v + 1]]:
+                    if depth[c] == -1:
+                        depth[c] = depth[v] + 1
+                        order.append(c)
+                k += 1
+
+        for v in range(n):
+            if parent[v] == -1:
+                walk(v)
+        # ildizdan yetib bo'lmaganlar — siklda: qirrani kesib, ildiz qilamiz
+        for v in range(n):
+            if depth[v] == -1:
+                parent[v] = -1
+                cut += 1
+                walk(v)
+
+        size = array("i", [1]) * n
+        for v in reversed(order):
+            p = parent[v]
+            if p >= 0:
+                size[p] += size[v]
+
+        self.ids, self.offsets, self.children = ids, offsets, children
+        self.parent, self.size, self.depth = parent, size, depth
+        self._extra_ids, self._extra_uids, self._extra_children = {}, {}, {}
+        self._pending = 0
+        self.edges = sum(1 for p in parent if p >= 0)
+        self.cut += cut
+
+    def _compact(self):
+        # yangi tugunlar tartiblanmagan — ids ni qayta saralab, parent'ni qayta indekslaymiz
+        n = len(self.parent)
+        all_ids = list(self.ids) + sorted(self._extra_ids, key=self._extra_ids.get)
+        order = sorted(range(n), key=all_ids.__getitem__)
+        new_index = array("i", [0]) * n
+        for new, old in enumerate(order):
+            new_index[old] = new
+        parent = array("i", [-1]) * n
+        for old in range(n):
+            p = self.parent[old]
+            if p >= 0:
+                parent[new_index[old]] = new_index[p]
+        cut = self.cut
+        self._layout(array("q", (all_ids[i] for i in order)), parent)
+        self.cut = cut
+
+    # ---------- indekslar ----------
+    def _find(self, uid: int) -> int:
+        i = bisect_left(self.ids, uid)
+        if i < len(self.ids) and self.ids[i] == uid:
+            return i
+        return self._extra_ids.get(uid, -1)
+
+    def _node(self, uid: int) -> int:
+        i = self._find(uid)
+        if i >= 0:
+            return i
+        i = len(self.parent)
+        self._extra_ids[uid] = i
+        self._extra_uids[i] = uid
+        self.parent.append(-1)
+        self.size.append(1)
+        self.depth.append(0)
+        return i
+
+    def _uid(self, i: int) -> int:
+        if i < len(self.ids):
+            return self.ids[i]
+        return self._extra_uids[i]
+
+    def _kids(self, i: int) -> List[int]:
+        out = []
+        if i < len(self.offsets) - 1:
+            out = [c for c in self.children[self.offsets[i]:self.offsets[i + 1]] if self.parent[c] == i]
+        out += [c for c in self._extra_children.get(i, ()) if self.parent[c] == i]
+        return out
+
+    def _subtree(self, i: int) -> List[int]:
+        out, k = [i], 0
+        while k < len(out):
+            out.extend(self._kids(out[k]))
+            k += 1
+        return out
+
+    # ---------- yozish ----------
+    def add(self, referrer_id: int, invited_id: int) -> bool:
+        """Yangi qirra. False — invited allaqachon bog'langan yoki sikl hosil bo'ladi."""
+        with self._lock:
+            r, u = self._node(referrer_id), self._node(invited_id)
+            if self.parent[u] != -1 or r == u:
+                return False
+            a = r
+            while a != -1:
+                if a == u:
+                    self.cut += 1
+                    return False
+                a = self.parent[a]
+            self.parent[u] = r
+            self._extra_children.setdefault(r, []).append(u)
+            self.edges += 1
+            delta = self.size[u]
+            a = r
+            while a != -1:
+                self.size[a] += delta
+                a = self.parent[a]
+            shift = self.depth[r] + 1 - self.depth[u]
+            if shift:
+                for v in self._subtree(u):
+                    self.depth[v] += shift
+            self._pending += 1
+            if self._pending >= self.rebuild_every:
+                self._compact()
+            return True
+
+    def detach_children(self, referrer_id: int):
+        """User reset: uning to'g'ridan-to'g'ri takliflari daraxtdan uziladi."""
+        with self._lock:
+            r = self._find(referrer_id)
+            if r < 0:
+                return
+            for c in self._kids(r):
+                self.parent[c] = -1
+                self.edges -= 1
+                a = r
+                while a != -1:
+                    self.size[a] -= self.size[c]
+                    a = self.parent[a]
+                shift = self.depth[c]
+                for v in self._subtree(c):
+                    self.depth[v] -= shift
+            self._extra_children.pop(r, None)
+
+    # ---------- o'qish ----------
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def descendants(self, uid: int) -> int:
+        """Barcha darajadagi takliflar soni (o'zi hisobga kirmaydi)."""
+        with self._lock:
+            i = self._find(uid)
+            return self.size[i] - 1 if i >= 0 else 0
+
+    def direct(self, uid: int) -> int:
+        with self._lock:
+            i = self._find(uid)
+            return len(self._kids(i)) if i >= 0 else 0
+
+    def depth_of(self, uid: int) -> int:
+        """Ildizgacha masofa (ildiz — 0)."""
+        with self._lock:
+            i = self._find(uid)
+            return self.depth[i] if i >= 0 else 0
+
+    def chain(self, uid: int, limit: int = 50) -> List[int]:
+        """uid dan yuqoriga: [uid, referrer, referrer'ning referreri, ...]."""
+        with self._lock:
+            i = self._find(uid)
+            out = [uid]
+            while i >= 0 and self.parent[i] >= 0 and len(out) < limit:
+                i = self.parent[i]
+                out.append(self._uid(i))
+            return out
+
+    def height(self, uid: int) -> int:
+        """Pastga eng uzun zanjir uzunligi."""
+        with self._lock:
+            i = self._find(uid)
+            if i < 0:
+                return 0
+            base = self.depth[i]
+            return max(self.depth[v] for v in self._subtree(i)) - base
+
+    def top_subtrees(self, k: int = 10, roots_only: bool = False) -> List[Tuple[int, int]]:
+        """[(user_id, descendants)] — eng katta subtree'lar."""
+        with self._lock:
+            n = len(self.parent)
+            cand = (i for i in range(n) if not roots_only or self.parent[i] == -1)
+            best = heapq.nlargest(k, cand, key=self.size.__getitem__)
+            return [(self._uid(i), self.size[i] - 1) for i in best if self.size[i] > 1]
+
+    def top_children(self, uid: int, k: int = 5) -> List[Tuple[int, int]]:
+        with self._lock:
+            i = self._find(uid)
+            if i < 0:
+                return []
+            best = heapq.nlargest(k, self._kids(i), key=self.size.__getitem__)
+            return [(self._uid(c), self.size[c] - 1) for c in best]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            n = len(self.parent)
+            return {
+                "nodes": n,
+                "edges": self.edges,
+                "roots": sum(1 for p in self.parent if p == -1),
+                "max_depth": max(self.depth) if n else 0,
+                "cut": self.cut,
+                "pending": self._pending,
+            }
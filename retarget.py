@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from adb import AsyncDB
+from broadcast import _fmt_eta
+from rewards import RewardQueue
+from sender import INTERACTIVE
+
+log = logging.getLogger(__name__)
+
+NearNotify = Callable[[Bot, int, int, int], Awaitable[None]]
+
+
+class TargetSweep:
+    """
+    Target o'zgarganda: referral_counts (cnt, referrer_id) bo'yicha keyset bilan bir marta
+    o'tib, cnt >= target-1 bo'lganlarga "deyarli" xabari va cnt >= target bo'lganlarga
+    mukofot beradi. Xabarlar Sender (PROGRESS) va RewardQueue orqali — limitlar o'sha yerda.
+    Flaglar (near_sent / win_sent) hurmat qilinadi: allaqachon olganlar takrorlanmaydi.
+    Botni bloklaganlarga "deyarli" yuborilmaydi (mukofot navbatga qo'yiladi — qaytganda beriladi).
+    Yangi /set_target kelsa oldingi sweep bekor qilinadi.
+    """
+
+    def __init__(self, adb: AsyncDB, rewards: RewardQueue, near_notify: NearNotify,
+                 chunk: int = 200, report_every: float = 5):
+        self.adb = adb
+        self.rewards = rewards
+        # admin progress xabari ham shu Sender limitlari ichida
+        self.sender = rewards.sender
+        self.near_notify = near_notify
+        self.chunk = chunk
+        self.report_every = report_every
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, bot: Bot, admin_chat_id: int, target: int):
+        await self.stop()
+        self._task = asyncio.create_task(self._run(bot, admin_chat_id, target))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _near(self, bot: Bot, uid: int, cnt: int, target: int) -> bool:
+        if not await self.adb.set_flag(uid, "near_sent"):
+            return False
+        try:
+            await self.near_notify(bot, uid, cnt, target)
+        except Exception as e:
+            log.info("near notice %s: %r", uid, e)
+        return True
+
+    async def _report(self, bot: Bot, chat_id: int, msg, text: str):
+        try:
+            if msg is None:
+                return await self.sender.send_message(bot, chat_id, text, lane=INTERACTIVE)
+            await self.sender.submit(
+                msg.chat.id,
+                lambda: bot.edit_message_text(text, chat_id=msg.chat.id, message_id=msg.message_id),
+                lane=INTERACTIVE,
+            )
+        except TelegramBadRequest:
+            pass
+        except Exception as e:
+            # progress — qo'shimcha: admin botni bloklagan bo'lsa ham sweep davom etadi
+            log.warning("retarget progress: %r", e)
+        return msg
+
+    async def _run(self, bot: Bot, admin_chat_id: int, target: int):
+        total = await self.adb.referrers_at_least_count(max(1, target - 1))
+        started = time.monotonic()
+        seen = near = won = 0
+
+        def text(final: str = "") -> str:
+            elapsed = max(1e-6, time.monotonic() - started)
+            rate = seen / elapsed
+            eta = _fmt_eta((total - seen) / rate) if rate > 0 and total > seen else "—"
+            return (
+                f"🎯 Target {target}: qayta baholash{final}\n"
+                f"👀 {seen}/{total}   🔥 {near}   🏁 {won}\n"
+                f"⏳ ETA {eta}"
+            )
+
+        msg = await self._report(bot, admin_chat_id, None, text())
+        last_report = time.monotonic()
+        after = (0, 0)
+        try:
+            while True:
+                rows = await self.adb.referrers_at_least(max(1, target - 1), after, self.chunk)
+                if not rows:
+                    break
+                kinds, tasks = [], []
+                for uid, cnt, near_sent, win_sent, reachable in rows:
+                    if cnt >= target:
+                        if not win_sent:
+                            kinds.append("won")
+                            tasks.append(self.rewards.enqueue(uid, target))
+                    elif not near_sent and reachable:
+                        kinds.append("near")
+                        tasks.append(self._near(bot, uid, cnt, target))
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                for kind, r in zip(kinds, results):
+                    if isinstance(r, BaseException):
+                        log.warning("retarget %s: %r", kind, r)
+                    elif r and kind == "won":
+                        won += 1
+                    elif r:
+                        near += 1
+                seen += len(rows)
+                after = (rows[-1][1], rows[-1][0])
+
+                if time.monotonic() - last_report >= self.report_every:
+                    await self._report(bot, admin_chat_id, msg, text())
+                    last_report = time.monotonic()
+        except asyncio.CancelledError:
+            await self._report(bot, admin_chat_id, msg, text(" — bekor qilindi"))
+            raise
+        await self._report(bot, admin_chat_id, msg, text(" — tugadi"))
+        log.info("retarget %s: seen=%s near=%s won=%s", target, seen, near, won)
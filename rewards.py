@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from adb import AsyncDB
+from sender import Sender, REWARD, BULK
+
+log = logging.getLogger(__name__)
+
+
+class RewardQueue:
+    """
+    G'oliblarga yopiq kanal havolasini yuborish — SQLite'dagi `reward_jobs` navbati orqali.
+    - job win_sent flag bilan bitta tranzaksiyada yoziladi: crash bo'lsa ham mukofot yo'qolmaydi
+    - link oldindan to'ldirilgan `invite_links` pool'idan olinadi (API so'rovisiz);
+      pool bo'sh bo'lsa joyida yaratiladi. Job'ga biriktirilgan link retry'da qayta ishlatiladi
+    - xato bo'lsa eksponensial backoff, `max_attempts` dan keyin 'failed' (admin qayta qo'yadi)
+    Yuborish "kamida bir marta": xabar ketib, 'done' yozilmasdan jarayon yiqilsa takrorlanishi mumkin.
+    Botni bloklagan userning jobi link sarflamasdan 'failed' bo'ladi; /start bilan qaytsa qayta navbatga.
+    """
+
+    def __init__(self, adb: AsyncDB, sender: Sender, channel_id: int,
+                 pool_min: int = 10, pool_max: int = 30, workers: int = 2,
+                 max_attempts: int = 6, poll_every: float = 5):
+        self.adb = adb
+        self.sender = sender
+        self.channel_id = channel_id
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_every = poll_every
+        self._wake = asyncio.Event()
+        self._refill_wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+
+    def start(self, bot: Bot):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._dispatch(bot)))
+        self._tasks.append(asyncio.create_task(self._refill(bot)))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def wake(self):
+        self._wake.set()
+
+    async def enqueue(self, user_id: int, target: int) -> bool:
+        """False — bu user uchun mukofot allaqachon navbatda/berilgan."""
+        job_id = await self.adb.enqueue_reward(user_id, target)
+        if job_id is None:
+            return False
+        # boshqa jarayonda bo'lsa ham poll_every ichida olinadi
+        self._wake.set()
+        return True
+
+    # ---------- pool ----------
+    async def _create_link(self, bot: Bot, name: str, lane: int = BULK) -> str:
+        # pool to'ldirish — BULK; g'olib kutayotgan bo'lsa (pool bo'sh) — REWARD
+        invite = await self.sender.submit(
+            self.channel_id,
+            lambda: bot.create_chat_invite_link(chat_id=self.channel_id, member_limit=1, name=name),
+            lane=lane,
+        )
+        return invite.invite_link
+
+    async def _refill(self, bot: Bot):
+        while True:
+            try:
+                size = await self.adb.invite_pool_size()
+                if size < self.pool_min:
+                    links = []
+                    try:
+                        for i in range(self.pool_max - size):
+                            links.append(await self._create_link(bot, f"pool_{int(time.time())}_{i}"))
+                    finally:
+                        # xato/bekor qilinsa ham yaratilganlari saqlanadi — Telegram'da "yetim" link qolmasin
+                        if links:
+                            await self.adb.add_invite_links(links)
+                            log.info("invite pool: +%s (%s)", len(links), size + len(links))
+            except asyncio.CancelledError:
+                raise
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # bot kanalda admin emas va h.k. — keyinroq yana urinamiz
+                log.warning("invite pool to'ldirilmadi: %s", e)
+            except Exception:
+                log.exception("invite pool xatosi")
+            try:
+                await asyncio.wait_for(self._refill_wake.wait(), 60)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_wake.clear()
+
+    # ---------- jobs ----------
+    async def _dispatch(self, bot: Bot):
+        while True:
+            try:
+                jobs = await self.adb.claim_reward_jobs(int(time.time()), self.workers * 5)
+                if jobs:
+                    sem = asyncio.Semaphore(self.workers)
+
+                    async def one(job: Dict):
+                        async with sem:
+                            await self._process(bot, job)
+
+                    await asyncio.gather(*(one(j) for j in jobs))
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("reward dispatch xatosi")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_every)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _backoff(self, attempts: int) -> int:
+        return int(time.time()) + min(3600, 10 * 2 ** (attempts - 1))
+
+    async def _process(self, bot: Bot, job: Dict):
+        jid, uid = job["id"], job["user_id"]
+        if not await self.adb.is_reachable(uid):
+            self.failed += 1
+            await self.adb.fail_reward(jid, "unreachable")
+            return
+        try:
+            link = job["invite_link"] or await self.adb.claim_invite_link(jid)
+            if link is None:
+                link = await self._create_link(bot, f"reward_{uid}", lane=REWARD)
+                await self.adb.attach_invite_link(jid, link)
+            self._refill_wake.set()
+        except Exception as e:
+            await self._retry(job, f"link: {e!r}")
+            return
+
+        try:
+            await self.sender.send_message(
+                bot,
+                uid,
+                "🏁 G‘ALABA! 🎉\n\n"
+                f"Siz {job['target']} ta odamni taklif qildingiz.\n"
+                f"🔐 Yopiq kanalga 1 martalik kirish havolasi:\n{link}",
+                lane=REWARD,
+            )
+        except TelegramForbiddenError as e:
+            # user botni bloklagan — retry foydasiz
+            self.failed += 1
+            await self.adb.fail_reward(jid, f"send: {e!r}")
+            return
+        except Exception as e:
+            await self._retry(job, f"send: {e!r}")
+            return
+        self.sent += 1
+        await self.adb.finish_reward(jid)
+
+    async def _retry(self, job: Dict, error: str):
+        log.warning("reward #%s (user %s) urinish %s: %s", job["id"], job["user_id"], job["attempts"], error)
+        if job["attempts"] >= self.max_attempts:
+            self.failed += 1
+            await self.adb.fail_reward(job["id"], error)
+        else:
+            await self.adb.fail_reward(job["id"], error, retry_at=self._backoff(job["attempts"]))
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "failed": self.failed}
@@ -0,0 +1,334 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+log = logging.getLogger(__name__)
+
+# navbat yo'laklari: kichik raqam — yuqori ustuvorlik
+REWARD = 0
+INTERACTIVE = 1
+PROGRESS = 2
+BULK = 3
+LANE_NAMES = {REWARD: "reward", INTERACTIVE: "interactive", PROGRESS: "progress", BULK: "bulk"}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Bitta token uchun qancha kutish kerak (0 — hozir mumkin)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+@dataclass
+class _Job:
+    chat_id: int
+    factory: Callable[[], Awaitable[Any]]
+    lane: int
+    fut: Optional[asyncio.Future]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    retries: int = 0
+    released: bool = False
+
+
+class _ChatState:
+    """Chat bucket'i va hali yuborib bo'lmaydigan xabarlar (lane, seq) bo'yicha heap'da."""
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst=burst)
+        self.backlog: List[tuple] = []
+        self.scheduled = False
+
+
+class _LaneStats:
+    def __init__(self):
+        self.depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        done = self.sent + self.failed
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "wait_avg_ms": round(self.wait_total / done * 1000, 1) if done else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class Sender:
+    """
+    Barcha chiquvchi xabarlar uchun yagona navbat.
+    - global token bucket (~30 msg/s) va har chat uchun bucket (~1 msg/s)
+    - TelegramRetryAfter: chat va global bucket `retry_after` soniya bloklanadi (flood-wait
+      butun botga tegishli), xabar qayta navbatga
+    - yo'laklar: REWARD > INTERACTIVE > PROGRESS > BULK
+    Chat hali tayyor bo'lmasa, worker kutmaydi — xabar chat backlog'iga tushadi va
+    token paydo bo'lganda navbatga qaytadi, shunda boshqa chatlar to'xtab qolmaydi.
+    TelegramForbiddenError (bot bloklangan): `on_forbidden(chat_id)` chaqiriladi, chat
+    eslab qolinadi — navbatdagi keyingi xabarlari API'siz xato beradi. Manba — DB dagi
+    `reachable`: yozuv `forbidden_recheck` soniyadan eski bo'lsa `recheck(chat_id)` so'raladi,
+    user qaytgan bo'lsa (boshqa worker /start ni qabul qilgan bo'lsa ham) xabar yuboriladi.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 28,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        workers: int = 8,
+        max_retries: int = 5,
+        on_forbidden: Optional[Callable[[int], Any]] = None,
+        forbidden_size: int = 50_000,
+        recheck: Optional[Callable[[int], Awaitable[bool]]] = None,
+        forbidden_recheck: float = 2.0,
+    ):
+        self.global_bucket = TokenBucket(global_rate, burst=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self._chats: Dict[int, _ChatState] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        self.lanes = {lane: _LaneStats() for lane in LANE_NAMES}
+        self.retry_after_hits = 0
+        # worker navbatdan olgan, hali tugatmagan xabarlar (stop() ularni ham kutadi)
+        self.inflight = 0
+        self.on_forbidden = on_forbidden
+        self.forbidden_size = forbidden_size
+        self.recheck = recheck
+        self.forbidden_recheck = forbidden_recheck
+        # chat_id -> [oxirgi 403, oxirgi tekshiruv vaqti]; dict tartibi bo'yicha eng eskisi chiqariladi
+        self._forbidden: Dict[int, list] = {}
+        self.forbidden_skips = 0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10):
+        if self._queue is not None:
+            deadline = time.monotonic() + drain_timeout
+            while (self.depth() or self.inflight) and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---------- API ----------
+    async def submit(
+        self,
+        chat_id: int,
+        factory: Callable[[], Awaitable[Any]],
+        lane: int = INTERACTIVE,
+        wait: bool = True,
+    ) -> Any:
+        """
+        `factory()` ni navbat orqali bajaradi. wait=False — natijani kutmaydi
+        (xatolar logga yoziladi).
+        """
+        if self._queue is None:
+            # sender ishga tushmagan (skriptlar, testlar) — to'g'ridan-to'g'ri
+            return await factory()
+        fut = asyncio.get_running_loop().create_future() if wait else None
+        self._put(_Job(chat_id, factory, lane, fut))
+        if fut is None:
+            return None
+        return await fut
+
+    async def send_message(self, bot: Bot, chat_id: int, text: str, lane: int = INTERACTIVE,
+                           wait: bool = True, **kwargs) -> Any:
+        return await self.submit(
+            chat_id, lambda: bot.send_message(chat_id, text, **kwargs), lane=lane, wait=wait
+        )
+
+    def forget_forbidden(self, chat_id: int):
+        """User botni qayta ishga tushirdi — xabarlar yana yuboriladi."""
+        self._forbidden.pop(chat_id, None)
+
+    def depth(self) -> int:
+        return sum(s.depth for s in self.lanes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth(),
+            "inflight": self.inflight,
+            "chats_tracked": len(self._chats),
+            "retry_after": self.retry_after_hits,
+            "forbidden": len(self._forbidden),
+            "forbidden_skips": self.forbidden_skips,
+            "lanes": {LANE_NAMES[k]: v.as_dict() for k, v in self.lanes.items()},
+        }
+
+    # ---------- ichki ----------
+    async def _blocked(self, chat_id: int) -> Optional[TelegramForbiddenError]:
+        """Eslab qolingan 403 (chat hali bloklagan bo'lsa) yoki None."""
+        entry = self._forbidden.get(chat_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if self.recheck is None or now - entry[1] < self.forbidden_recheck:
+            return entry[0]
+        try:
+            ok = await self.recheck(chat_id)
+        except Exception:
+            log.exception("reachable tekshiruvi xatosi (chat %s)", chat_id)
+            return entry[0]
+        if ok:
+            self._forbidden.pop(chat_id, None)
+            return None
+        entry[1] = now
+        return entry[0]
+
+    def _put(self, job: _Job):
+        self.lanes[job.lane].depth += 1
+        self._queue.put_nowait((job.lane, next(self._seq), job))
+
+    def _chat(self, chat_id: int, now: float) -> _ChatState:
+        st = self._chats.get(chat_id)
+        if st is None:
+            if len(self._chats) > 10_000:
+                self._chats = {
+                    k: v for k, v in self._chats.items() if v.backlog or not v.bucket.idle(now)
+                }
+            st = self._chats[chat_id] = _ChatState(self.chat_rate, self.chat_burst)
+        return st
+
+    def _defer(self, st: _ChatState, job: _Job, seq: int, delay: float):
+        # chat ichidagi tartib buzilmasin: keyingi xabarlar ham backlog'ga tushadi
+        self.lanes[job.lane].depth += 1
+        heapq.heappush(st.backlog, (job.lane, seq, job))
+        self._schedule(st, job.chat_id, delay)
+
+    def _schedule(self, st: _ChatState, chat_id: int, delay: float):
+        if st.scheduled or not st.backlog:
+            return
+        st.scheduled = True
+        asyncio.get_running_loop().call_later(max(0.0, delay), self._release, chat_id)
+
+    def _release(self, chat_id: int):
+        st = self._chats.get(chat_id)
+        if st is None:
+            return
+        st.scheduled = False
+        if st.backlog:
+            lane, seq, job = heapq.heappop(st.backlog)
+            job.released = True
+            self._queue.put_nowait((lane, seq, job))
+
+    def _finish(self, job: _Job, result: Any = None, exc: Optional[BaseException] = None):
+        st = self.lanes[job.lane]
+        waited = time.monotonic() - job.enqueued_at
+        st.wait_total += waited
+        st.wait_max = max(st.wait_max, waited)
+        if exc is None:
+            st.sent += 1
+            if job.fut is not None and not job.fut.done():
+                job.fut.set_result(result)
+            return
+        st.failed += 1
+        if isinstance(exc, TelegramForbiddenError) and job.chat_id not in self._forbidden:
+            self._forbidden[job.chat_id] = [exc, time.monotonic()]
+            if len(self._forbidden) > self.forbidden_size:
+                del self._forbidden[next(iter(self._forbidden))]
+            if self.on_forbidden is not None:
+                self.on_forbidden(job.chat_id)
+        if job.fut is not None and not job.fut.done():
+            job.fut.set_exception(exc)
+        else:
+            log.warning("send to %s failed: %r", job.chat_id, exc)
+
+    async def _worker(self):
+        while True:
+            _, seq, job = await self._queue.get()
+            self.lanes[job.lane].depth -= 1
+            self.inflight += 1
+            try:
+                await self._process(job, seq)
+            finally:
+                self.inflight -= 1
+
+    async def _process(self, job: _Job, seq: int):
+        released, job.released = job.released, False
+
+        blocked = await self._blocked(job.chat_id)
+        if blocked is not None:
+            self.forbidden_skips += 1
+            self._finish(job, exc=blocked)
+            st = self._chats.get(job.chat_id)
+            if st is not None:
+                self._schedule(st, job.chat_id, 0)
+            return
+
+        now = time.monotonic()
+        chat = self._chat(job.chat_id, now)
+        wait = chat.bucket.delay(now)
+        if wait > 0 or (chat.backlog and not released):
+            self._defer(chat, job, seq, wait)
+            return
+        gwait = self.global_bucket.delay(now)
+        if gwait > 0:
+            await asyncio.sleep(gwait)
+        self.global_bucket.take()
+        chat.bucket.take()
+
+        try:
+            result = await job.factory()
+        except TelegramRetryAfter as e:
+            self.retry_after_hits += 1
+            # flood-wait butun botga: boshqa chatlarga ham shu vaqt yubormaymiz
+            chat.bucket.block(e.retry_after)
+            self.global_bucket.block(e.retry_after)
+            job.retries += 1
+            if job.retries > self.max_retries:
+                self._finish(job, exc=e)
+            else:
+                log.info("retry_after %ss for chat %s", e.retry_after, job.chat_id)
+                self._defer(chat, job, seq, e.retry_after)
+        except asyncio.CancelledError:
+            if job.fut is not None and not job.fut.done():
+                job.fut.cancel()
+            raise
+        except Exception as e:
+            self._finish(job, exc=e)
+        else:
+            self._finish(job, result=result)
+        self._schedule(chat, job.chat_id, chat.bucket.delay(time.monotonic()))
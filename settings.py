@@ -0,0 +1,84 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# settings jadvalidagi maxsus qator: har set_setting da +1
+VERSION_KEY = "__version__"
+
+Listener = Callable[[str, Any, Any], None]
+
+
+@dataclass
+class SettingSpec:
+    key: str
+    type: Callable[[str], Any]
+    default: Any = None
+
+
+class SettingsRegistry:
+    """
+    `settings` jadvalining xotiradagi nusxasi. Bir marta yuklanadi, DB.set_setting
+    orqali write-through yangilanadi. `version` — DB dagi __version__ qatori;
+    boshqa jarayon o'zgartirganini shu bilan arzon aniqlash mumkin.
+    Listenerlar o'zgarish qo'llangan thread'da chaqiriladi (odatda db-writer).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._specs: Dict[str, SettingSpec] = {}
+        self._raw: Dict[str, str] = {}
+        self._listeners: Dict[Optional[str], List[Listener]] = {}
+        self.version = 0
+
+    def define(self, key: str, type_: Callable[[str], Any], default: Any = None):
+        self._specs[key] = SettingSpec(key, type_, default)
+
+    def subscribe(self, fn: Listener, key: Optional[str] = None):
+        """key=None — barcha o'zgarishlar."""
+        self._listeners.setdefault(key, []).append(fn)
+
+    def _parse(self, key: str, raw: Optional[str], default: Any = None) -> Any:
+        spec = self._specs.get(key)
+        if spec is None:
+            return raw if raw is not None else default
+        if raw is None or raw == "":
+            return spec.default if default is None else default
+        try:
+            return spec.type(raw)
+        except (TypeError, ValueError):
+            return spec.default if default is None else default
+
+    def raw(self, key: str) -> Optional[str]:
+        return self._raw.get(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._parse(key, self._raw.get(key), default)
+
+    def load(self, rows: Dict[str, str], version: int):
+        """To'liq snapshot (startda yoki eskirganda). O'zgargan kalitlar uchun listenerlar."""
+        with self._lock:
+            old = self._raw
+            self._raw = dict(rows)
+            self.version = version
+        for key in set(old) | set(rows):
+            if old.get(key) != rows.get(key):
+                self._notify(key, old.get(key), rows.get(key))
+
+    def apply(self, key: str, value: str, version: int):
+        with self._lock:
+            old = self._raw.get(key)
+            self._raw[key] = value
+            self.version = version
+        if old != value:
+            self._notify(key, old, value)
+
+    def _notify(self, key: str, old_raw: Optional[str], new_raw: Optional[str]):
+        old, new = self._parse(key, old_raw), self._parse(key, new_raw)
+        for fn in self._listeners.get(key, []) + self._listeners.get(None, []):
+            try:
+                fn(key, old, new)
+            except Exception:
+                log.exception("settings listener xatosi (%s)", key)
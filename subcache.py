@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+Key = Tuple[str, int]
+
+
+class SubscriptionCache:
+    """
+    (kanal, user_id) -> obuna holati. LRU + TTL:
+    - ijobiy natija `ttl` soniya, salbiy natija `neg_ttl` soniya saqlanadi
+    - bir user uchun bir vaqtdagi tekshiruvlar bitta API chaqiruvni kutadi
+    - chat_member update kelganda `put`/`invalidate` bilan yangilanadi
+    - trust_negative=False (user o'zi "tekshirish" bosganda): keshdagi "obuna emas" e'tiborga
+      olinmaydi — bot kanalda admin bo'lmasa chat_member kelmaydi va javob eskirgan bo'lishi mumkin
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = 300, neg_ttl: float = 5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.neg_ttl = neg_ttl
+        self._data: "OrderedDict[Key, Tuple[bool, float]]" = OrderedDict()
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self._stale: Set[Key] = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def _lookup(self, key: Key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, channel: str, user_id: int, value: bool):
+        key = (channel, user_id)
+        if key in self._inflight:
+            # hozirgi API javobi eskirgan bo'lishi mumkin — uni keshga yozmaymiz
+            self._stale.add(key)
+        ttl = self.ttl if value else self.neg_ttl
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, channel: str, user_id: int):
+        key = (channel, user_id)
+        self.invalidations += 1
+        if key in self._inflight:
+            self._stale.add(key)
+        self._data.pop(key, None)
+
+    async def get(self, channel: str, user_id: int, fetch: Callable[[], Awaitable[bool]],
+                  trust_negative: bool = True) -> bool:
+        key = (channel, user_id)
+        value = self._lookup(key)
+        if value is not None and (value or trust_negative):
+            self.hits += 1
+            return value
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # kutayotganlar bo'lmasa "exception never retrieved" chiqmasin
+            fut.exception()
+            raise
+        else:
+            fut.set_result(value)
+            if key not in self._stale:
+                self.put(channel, user_id, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            self._stale.discard(key)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.coalesced) / total, 3) if total else 0.0,
+        }
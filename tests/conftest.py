@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testlar repo ildizidagi flat modullarni import qiladi (db, adb, leaderboard, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
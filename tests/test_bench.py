@@ -0,0 +1,14 @@
+import json
+
+import bench
+
+
+def test_every_public_method_has_a_case(tmp_path):
+    out = tmp_path / "bench.json"
+    rc = bench.main([
+        "--sizes", "500", "--repeat", "2", "--no-sql",
+        "--dir", str(tmp_path), "--out", str(out),
+    ])
+    assert rc == 0
+    methods = {r["method"].split("(")[0] for r in json.loads(out.read_text())["results"]}
+    assert bench.uncovered(methods) == []
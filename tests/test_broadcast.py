@@ -0,0 +1,45 @@
+import asyncio
+
+from aiogram.exceptions import TelegramForbiddenError
+
+from adb import AsyncDB
+from broadcast import Broadcaster
+from db import DB
+from sender import Sender
+
+ADMIN = 999
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == ADMIN:
+            raise TelegramForbiddenError(None, "Forbidden: bot was blocked by the user")
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, *args, **kwargs):
+        raise AssertionError("status xabari yo'q — tahrirlanmasligi kerak")
+
+
+def test_broadcast_survives_failing_progress_reports(tmp_path):
+    db = DB(str(tmp_path / "bot.db"))
+    adb = AsyncDB(db, readers=1)
+    bot = FakeBot()
+
+    async def run():
+        for uid in range(1, 8):
+            await adb.ensure_user(uid)
+        b = Broadcaster(adb, Sender(), chunk=3, report_every=0)
+        bid = await b.start(bot, ADMIN, text="salom")
+        await asyncio.gather(*b._tasks.values())
+        return await adb.get_broadcast(bid)
+
+    try:
+        result = asyncio.run(run())
+        assert bot.sent == list(range(1, 8))
+        assert result["status"] == "done" and result["sent"] == 7
+    finally:
+        adb.close()
+        db.close()
@@ -0,0 +1,76 @@
+from dataio import DATA_TABLES, export_file, import_file
+from db import DB
+
+
+def _seed(path: str) -> DB:
+    db = DB(path)
+    db.ensure_user(1)
+    for uid in (10, 11):
+        db.ensure_user(uid, 1)
+        db.add_referral_if_unique(1, uid)
+    db.start_season()
+    db.start_season()
+    for uid in (20, 21, 22):
+        db.ensure_user(uid, 2)
+        db.add_referral_if_unique(2, uid)
+    db.add_referral_if_unique(1, 23)
+    db.set_flag(2, "near_sent")
+    db.set_flag(2, "win_sent")
+    return db
+
+
+def test_export_import_across_season_reset(tmp_path):
+    src = _seed(str(tmp_path / "src.db"))
+    assert src.current_season() == 3
+    files = []
+    for name in DATA_TABLES:
+        if DATA_TABLES[name][2] is not None:
+            path, _ = export_file(src.path, name, "jsonl", str(tmp_path))
+            files.append(path)
+    expected_top = src.top_referrers(10)
+
+    dst = DB(str(tmp_path / "dst.db"))
+    for path in files:
+        import_file(dst, path)
+
+    assert dst.current_season() == 3
+    assert dst.referrals_count(2) == 3
+    assert dst.referrals_count(1) == 1
+    assert dst.top_referrers(10) == expected_top
+    assert dst.flag_set(2, "win_sent") and dst.flag_set(2, "near_sent")
+    src.close()
+    dst.close()
+
+
+def test_import_without_seasons_file_creates_missing_seasons(tmp_path):
+    src = _seed(str(tmp_path / "src.db"))
+    path, n = export_file(src.path, "referrals", "csv", str(tmp_path))
+    assert n == 6
+
+    dst = DB(str(tmp_path / "dst.db"))
+    import_file(dst, path)
+    assert dst.current_season() == 3
+    assert dst.referrals_count(2) == 3
+    # eski mavsum qatorlari yetim emas — prune ularni o'chira oladi
+    while dst.prune_seasons(keep=1):
+        pass
+    assert dst.conn.execute("SELECT COUNT(*) FROM referrals").fetchone()[0] == 4
+    src.close()
+    dst.close()
+
+
+def test_csv_import_with_empty_created_at(tmp_path):
+    path = tmp_path / "referrals.csv"
+    path.write_text(
+        "referrer_id,invited_user_id,created_at,season_id\n"
+        "1,10,,\n"
+        "1,11,1767225600,1\n",
+        encoding="utf-8",
+    )
+    dst = DB(str(tmp_path / "dst.db"))
+    name, n = import_file(dst, str(path))
+    assert (name, n) == ("referrals", 2)
+    assert dst.referrals_count(1) == 2
+    assert dst.conn.execute("SELECT COUNT(*) FROM referrals WHERE created_at IS NULL").fetchone()[0] == 0
+    assert sum(c for _, c in dst.daily_totals(3650)) == 2
+    dst.close()
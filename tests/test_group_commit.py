@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+import threading
+
+from adb import AsyncDB
+from db import DB
+
+
+def test_failed_begin_resolves_every_waiter(tmp_path):
+    path = str(tmp_path / "bot.db")
+    db = DB(path)
+    db.conn.execute("PRAGMA busy_timeout=100")
+    adb = AsyncDB(db, readers=1, group_commit=0.05)
+
+    # boshqa ulanish yozish lock'ini ushlab turadi — BEGIN IMMEDIATE "database is locked"
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def run():
+        calls = [adb.ensure_user(uid) for uid in range(1, 6)]
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 5)
+
+    try:
+        results = asyncio.run(run())
+        assert len(results) == 5
+        assert all(isinstance(r, sqlite3.OperationalError) for r in results)
+
+        other.rollback()
+        asyncio.run(adb.ensure_user(7))
+        assert db.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+    finally:
+        other.close()
+        adb.close()
+        db.close()
+
+
+def test_batch_commits_and_isolates_errors(tmp_path):
+    db = DB(str(tmp_path / "bot.db"))
+    adb = AsyncDB(db, readers=1, group_commit=0.01)
+
+    def boom(_db):
+        raise ValueError("x")
+
+    async def run():
+        ok = [adb.ensure_user(uid) for uid in range(1, 21)]
+        return await asyncio.gather(*ok, adb.transaction(boom), return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+        assert isinstance(results[-1], ValueError)
+        assert all(r is None or not isinstance(r, Exception) for r in results[:-1])
+        assert db.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 20
+        assert adb.group.ops == 21
+    finally:
+        adb.close()
+        db.close()
+
+
+def test_close_inside_open_batch_window(tmp_path):
+    db = DB(str(tmp_path / "bot.db"))
+    adb = AsyncDB(db, readers=1, group_commit=0.5)
+    closer = threading.Thread(target=adb.close, daemon=True)
+
+    async def run():
+        task = asyncio.ensure_future(adb.ensure_user(1))
+        await asyncio.sleep(0.05)
+        # batch oynasi hali ochiq — yopish signali shu batch'ga "carry" bo'lib tushadi
+        closer.start()
+        await asyncio.wait_for(task, 5)
+
+    try:
+        asyncio.run(run())
+        closer.join(5)
+        assert not closer.is_alive()
+        assert db.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+    finally:
+        db.close()
+
+
+def test_duplicate_flag_leaves_no_open_transaction(tmp_path):
+    db = DB(str(tmp_path / "bot.db"))
+    try:
+        assert db.set_flag(1, "near_sent")
+        assert not db.set_flag(1, "near_sent")
+        assert not db.conn.in_transaction
+        # BEGIN IMMEDIATE ishlatadigan yozuvlar ishlashda davom etadi
+        assert db.add_referral_if_unique(1, 2)
+        assert db.enqueue_reward(1, 5) is not None
+    finally:
+        db.close()
@@ -0,0 +1,69 @@
+import random
+
+from leaderboard import Leaderboard, SortedIds
+
+
+def _brute_top(counts, limit):
+    rows = sorted(((c, u) for u, c in counts.items() if c > 0), key=lambda r: (-r[0], r[1]))
+    return [(u, c) for c, u in rows[:limit]]
+
+
+def _brute_rank(counts, uid):
+    my = counts.get(uid, 0)
+    return 1 + sum(1 for c in counts.values() if c > my)
+
+
+def test_rank_and_top_match_brute_force():
+    rnd = random.Random(7)
+    lb = Leaderboard()
+    counts = {}
+    for _ in range(5000):
+        uid = rnd.randrange(300)
+        op = rnd.random()
+        if op < 0.7:
+            lb.incr(uid)
+            counts[uid] = counts.get(uid, 0) + 1
+        elif op < 0.85:
+            cnt = rnd.randrange(0, 200)
+            lb.set(uid, cnt)
+            counts[uid] = cnt
+        else:
+            lb.remove(uid)
+            counts.pop(uid, None)
+    assert len(lb) == sum(1 for c in counts.values() if c > 0)
+    for limit in (1, 10, 50, 1000):
+        assert lb.top(limit) == _brute_top(counts, limit)
+    for uid in range(310):
+        assert lb.rank(uid) == _brute_rank(counts, uid)
+    for cnt in range(0, 60):
+        assert lb.users_at(cnt) == sum(1 for c in counts.values() if c == cnt and c > 0)
+
+
+def test_from_counts_and_ties():
+    rnd = random.Random(3)
+    rows = [(uid, rnd.choice((1, 1, 1, 2, 5))) for uid in rnd.sample(range(100_000), 5000)]
+    lb = Leaderboard.from_counts(rows)
+    counts = dict(rows)
+    assert lb.top(20) == _brute_top(counts, 20)
+    assert lb.top(4000) == _brute_top(counts, 4000)
+    lb.incr(rows[0][0], 10)
+    counts[rows[0][0]] += 10
+    assert lb.top(3) == _brute_top(counts, 3)
+
+
+def test_sorted_ids_split_and_discard():
+    rnd = random.Random(1)
+    s = SortedIds()
+    ref = set()
+    for _ in range(20_000):
+        uid = rnd.randrange(5000)
+        if rnd.random() < 0.6:
+            if uid not in ref:
+                s.add(uid)
+                ref.add(uid)
+        else:
+            s.discard(uid)
+            ref.discard(uid)
+    assert len(s) == len(ref)
+    assert s.first(len(ref) + 5) == sorted(ref)
+    assert s.first(7) == sorted(ref)[:7]
@@ -0,0 +1,75 @@
+import sqlite3
+
+from db import DB, MIGRATIONS
+
+# Migratsiyalargacha bo'lgan (user_version = 0) sxema
+BASELINE = """
+CREATE TABLE users(
+    user_id INTEGER PRIMARY KEY,
+    referrer_id INTEGER,
+    joined_ok INTEGER DEFAULT 0,
+    banned INTEGER DEFAULT 0
+);
+CREATE TABLE referrals(
+    referrer_id INTEGER,
+    invited_user_id INTEGER UNIQUE,
+    created_at INTEGER DEFAULT (strftime('%s','now'))
+);
+CREATE TABLE user_flags(
+    user_id INTEGER,
+    key TEXT,
+    created_at INTEGER DEFAULT (strftime('%s','now')),
+    UNIQUE(user_id, key)
+);
+CREATE TABLE settings(
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _baseline(path: str):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE)
+    conn.executemany("INSERT INTO users(user_id, referrer_id, joined_ok) VALUES(?, ?, 1)",
+                     [(1, None), (2, None)] + [(u, 1 if u < 20 else 2) for u in range(10, 25)])
+    conn.executemany("INSERT INTO referrals(referrer_id, invited_user_id, created_at) VALUES(?, ?, ?)",
+                     [(1 if u < 20 else 2, u, 1_700_000_000 + u * 4000) for u in range(10, 25)])
+    conn.executemany("INSERT INTO user_flags(user_id, key) VALUES(?, ?)", [(1, "win_sent"), (2, "near_sent")])
+    conn.execute("INSERT INTO settings(key, value) VALUES('target', '7')")
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_baseline_to_latest(tmp_path):
+    path = str(tmp_path / "bot.db")
+    _baseline(path)
+
+    db = DB(path)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert db.current_season() == 1
+        assert db.referrals_count(1) == 10
+        assert db.referrals_count(2) == 5
+        assert db.top_referrers(2) == [(1, 10), (2, 5)]
+        assert db.user_rank(2) == 2
+        assert db.flag_set(1, "win_sent") and db.flag_set(2, "near_sent")
+        assert db.get_setting("target") == "7"
+        assert db.leaderboard_check() == []
+
+        # yangi sxemada yozish ishlaydi, takroriy referral qabul qilinmaydi
+        db.ensure_user(30, 2)
+        assert db.add_referral_if_unique(2, 30)
+        assert not db.add_referral_if_unique(1, 30)
+        assert db.referrals_count(2) == 6
+    finally:
+        db.close()
+
+    # qayta ochish — migratsiyalar ikkinchi marta bajarilmaydi
+    db = DB(path)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+        assert db.referrals_count(2) == 6
+        assert db.leaderboard_check() == []
+    finally:
+        db.close()
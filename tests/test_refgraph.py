@@ -0,0 +1,29 @@
+import random
+
+from refgraph import ReferralGraph
+
+
+def test_incremental_adds_match_full_build():
+    rnd = random.Random(5)
+    edges = []
+    for u in range(2, 3000):
+        edges.append((rnd.randrange(1, u), u))
+    half = len(edges) // 2
+    g = ReferralGraph.from_edges(edges[:half], rebuild_every=10_000)
+    for r, u in edges[half:]:
+        assert g.add(r, u)
+    full = ReferralGraph.from_edges(edges)
+
+    assert g._pending == len(edges) - half
+    assert g.top_subtrees(10) == full.top_subtrees(10)
+    for uid in rnd.sample(range(1, 3000), 200):
+        assert g.descendants(uid) == full.descendants(uid)
+        assert g.depth_of(uid) == full.depth_of(uid)
+        assert g.chain(uid) == full.chain(uid)
+
+
+def test_cycle_is_cut():
+    g = ReferralGraph.from_edges([(1, 2), (2, 3)])
+    assert not g.add(3, 1)
+    assert g.cut == 1
+    assert g.descendants(1) == 2
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramForbiddenError
+
+from adb import AsyncDB
+from db import DB
+from rewards import RewardQueue
+from sender import Sender
+
+
+class FakeBot:
+    def __init__(self):
+        self.blocked = set()
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(None, "Forbidden: bot was blocked by the user")
+        self.sent.append(chat_id)
+
+
+def test_reward_reaches_user_unblocked_on_other_worker(tmp_path):
+    db = DB(str(tmp_path / "bot.db"))
+    adb = AsyncDB(db, readers=1)
+    bot = FakeBot()
+
+    async def run():
+        marks = []
+        sender = Sender(
+            chat_rate=100, chat_burst=10, workers=1, forbidden_recheck=0,
+            on_forbidden=lambda cid: marks.append(asyncio.ensure_future(adb.set_reachable(cid, False))),
+            recheck=adb.is_reachable,
+        )
+        sender.start()
+        rq = RewardQueue(adb, sender, channel_id=-100)
+        await adb.ensure_user(5)
+        await adb.add_invite_links(["https://t.me/+a", "https://t.me/+b"])
+        await rq.enqueue(5, 5)
+
+        # bloklagan: 403 -> 'failed', DB reachable=0
+        bot.blocked.add(5)
+        for job in await adb.claim_reward_jobs(int(time.time())):
+            await rq._process(bot, job)
+        await asyncio.gather(*marks)
+        assert not await adb.is_reachable(5)
+        assert (await adb.reward_stats()).get("failed") == 1
+
+        # boshqa worker /start ni qabul qildi: faqat DB yangilanadi, bu Sender'ning keshi emas
+        bot.blocked.discard(5)
+        assert await adb.set_reachable(5, True)
+        for job in await adb.claim_reward_jobs(int(time.time())):
+            await rq._process(bot, job)
+        await sender.stop()
+        return await adb.reward_stats()
+
+    try:
+        stats = asyncio.run(run())
+        assert bot.sent == [5]
+        assert stats == {"done": 1}
+    finally:
+        adb.close()
+        db.close()
+
+
+def test_refill_keeps_links_created_before_an_error(tmp_path):
+    db = DB(str(tmp_path / "bot.db"))
+    adb = AsyncDB(db, readers=1)
+
+    class LinkBot:
+        def __init__(self):
+            self.n = 0
+
+        async def create_chat_invite_link(self, chat_id, member_limit, name):
+            self.n += 1
+            if self.n == 3:
+                raise TelegramForbiddenError(None, "Forbidden: not enough rights")
+            return SimpleNamespace(invite_link=f"https://t.me/+{self.n}")
+
+    async def run():
+        rq = RewardQueue(adb, Sender(), channel_id=-100, pool_min=5, pool_max=5)
+        task = asyncio.ensure_future(rq._refill(LinkBot()))
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if await adb.invite_pool_size():
+                break
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return await adb.invite_pool_size()
+
+    try:
+        assert asyncio.run(run()) == 2
+    finally:
+        adb.close()
+        db.close()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from sender import BULK, INTERACTIVE, PROGRESS, REWARD, Sender
+
+
+def _sender(**kw) -> Sender:
+    kw.setdefault("global_rate", 1000)
+    kw.setdefault("chat_rate", 1000)
+    kw.setdefault("workers", 1)
+    return Sender(**kw)
+
+
+def test_lanes_are_served_by_priority():
+    async def run():
+        s = _sender()
+        s.start()
+        order = []
+
+        def job(name):
+            async def send():
+                order.append(name)
+            return send
+
+        # worker hali ishlamagan — hammasi navbatda, keyin ustuvorlik bo'yicha olinadi
+        for chat, lane, name in ((1, BULK, "bulk"), (2, PROGRESS, "progress"),
+                                 (3, INTERACTIVE, "interactive"), (4, REWARD, "reward")):
+            await s.submit(chat, job(name), lane=lane, wait=False)
+        await s.stop()
+        return order
+
+    assert asyncio.run(run()) == ["reward", "interactive", "progress", "bulk"]
+
+
+def test_retry_after_blocks_chat_and_global_bucket():
+    async def run():
+        s = _sender()
+        s.start()
+        calls = []
+
+        async def send():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise TelegramRetryAfter(None, "flood", retry_after=1)
+            return "ok"
+
+        t0 = time.monotonic()
+        result = await s.submit(7, send)
+        blocked_until = s.global_bucket.blocked_until
+        await s.stop()
+        return result, calls, t0, blocked_until
+
+    result, calls, t0, blocked_until = asyncio.run(run())
+    assert result == "ok"
+    assert len(calls) == 2
+    assert calls[1] - t0 >= 0.9
+    assert blocked_until >= t0 + 1
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def run():
+        s = _sender(max_retries=0)
+        s.start()
+
+        async def send():
+            raise TelegramRetryAfter(None, "flood", retry_after=0)
+
+        try:
+            with pytest.raises(TelegramRetryAfter):
+                await s.submit(7, send)
+            return s.retry_after_hits, s.lanes[INTERACTIVE].failed
+        finally:
+            await s.stop()
+
+    assert asyncio.run(run()) == (1, 1)
+
+
+def test_forbidden_chat_fails_fast_without_api_call():
+    async def run():
+        marked = []
+        s = _sender(on_forbidden=marked.append)
+        s.start()
+        calls = []
+
+        async def send():
+            calls.append(1)
+            raise TelegramForbiddenError(None, "Forbidden: bot was blocked by the user")
+
+        for _ in range(3):
+            with pytest.raises(TelegramForbiddenError):
+                await s.submit(9, send)
+        s.forget_forbidden(9)
+        with pytest.raises(TelegramForbiddenError):
+            await s.submit(9, send)
+        await s.stop()
+        return marked, len(calls), s.forbidden_skips
+
+    assert asyncio.run(run()) == ([9, 9], 2, 2)
+
+
+def test_stop_waits_for_inflight_sends():
+    async def run():
+        s = _sender()
+        s.start()
+        done = []
+
+        async def slow():
+            await asyncio.sleep(0.3)
+            done.append(1)
+
+        await s.submit(1, slow, wait=False)
+        await asyncio.sleep(0.01)
+        # navbat bo'sh, lekin xabar hali yuborilmoqda
+        assert s.depth() == 0 and s.inflight == 1
+        await s.stop()
+        return done
+
+    assert asyncio.run(run()) == [1]
@@ -0,0 +1,42 @@
+from db import DB
+from settings import SettingsRegistry
+
+
+def test_typed_get_and_listeners():
+    reg = SettingsRegistry()
+    reg.define("invite_target", int, 5)
+    seen = []
+    reg.subscribe(lambda k, old, new: seen.append((k, old, new)), "invite_target")
+    reg.subscribe(lambda k, old, new: 1 / 0)
+
+    assert reg.get("invite_target") == 5
+    reg.apply("invite_target", "7", version=1)
+    reg.apply("invite_target", "7", version=2)
+    reg.apply("invite_target", "x", version=3)
+    assert reg.get("invite_target") == 5
+    assert reg.get("missing", "d") == "d"
+    assert reg.version == 3
+    assert seen == [("invite_target", 5, 7), ("invite_target", 7, 5)]
+
+
+def test_load_notifies_only_changed_keys():
+    reg = SettingsRegistry()
+    reg.load({"a": "1", "b": "2"}, version=1)
+    seen = []
+    reg.subscribe(lambda k, old, new: seen.append((k, old, new)))
+    reg.load({"a": "1", "c": "3"}, version=2)
+    assert sorted(seen) == [("b", "2", None), ("c", None, "3")]
+
+
+def test_other_connection_change_is_picked_up_by_refresh(tmp_path):
+    path = str(tmp_path / "bot.db")
+    a, b = DB(path), DB(path)
+    try:
+        a.set_target(9)
+        assert b.get_target(5) != 9
+        assert b.refresh_settings()
+        assert b.get_target(5) == 9
+        assert not b.refresh_settings()
+    finally:
+        a.close()
+        b.close()
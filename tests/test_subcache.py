@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from subcache import SubscriptionCache
+
+
+def test_concurrent_gets_share_one_fetch_and_cache_result():
+    async def run():
+        cache = SubscriptionCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return True
+
+        results = await asyncio.gather(*(cache.get("@ch", 1, fetch) for _ in range(5)))
+        results.append(await cache.get("@ch", 1, fetch))
+        return results, len(calls), cache.stats()
+
+    results, calls, stats = asyncio.run(run())
+    assert results == [True] * 6
+    assert calls == 1
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+
+def test_negative_result_expires_sooner():
+    async def run():
+        cache = SubscriptionCache(ttl=60, neg_ttl=0.02)
+        answers = iter([False, True])
+
+        async def fetch():
+            return next(answers)
+
+        first = await cache.get("@ch", 1, fetch)
+        await asyncio.sleep(0.03)
+        return first, await cache.get("@ch", 1, fetch)
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_put_during_fetch_wins_over_stale_answer():
+    async def run():
+        cache = SubscriptionCache()
+
+        async def fetch():
+            # javob kelguncha chat_member update keldi
+            cache.put("@ch", 1, False)
+            return True
+
+        fetched = await cache.get("@ch", 1, fetch)
+        return fetched, await cache.get("@ch", 1, fetch)
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_fetch_error_reaches_waiters_and_is_not_cached():
+    async def run():
+        cache = SubscriptionCache()
+
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("api")
+
+        async def ok():
+            return True
+
+        results = await asyncio.gather(cache.get("@ch", 1, boom), cache.get("@ch", 1, boom),
+                                       return_exceptions=True)
+        return results, await cache.get("@ch", 1, ok)
+
+    results, after = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert after is True
+
+
+def test_lru_bound_and_invalidate():
+    cache = SubscriptionCache(maxsize=2)
+    for uid in range(3):
+        cache.put("@ch", uid, True)
+    assert cache.stats()["size"] == 2
+    assert cache._lookup(("@ch", 0)) is None
+    cache.invalidate("@ch", 2)
+    assert cache._lookup(("@ch", 2)) is None
+
+
+def test_cancelled_fetch_does_not_poison_key():
+    async def run():
+        cache = SubscriptionCache()
+
+        async def slow():
+            await asyncio.sleep(1)
+            return True
+
+        async def ok():
+            return False
+
+        task = asyncio.ensure_future(cache.get("@ch", 1, slow))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await cache.get("@ch", 1, ok)
+
+    assert asyncio.run(run()) is False
+
+
+def test_explicit_check_skips_cached_negative():
+    async def run():
+        cache = SubscriptionCache(ttl=60, neg_ttl=60)
+        answers = iter([False, True, False])
+
+        async def fetch():
+            return next(answers)
+
+        first = await cache.get("@ch", 1, fetch)
+        cached = await cache.get("@ch", 1, fetch)
+        explicit = await cache.get("@ch", 1, fetch, trust_negative=False)
+        # ijobiy javob explicit'da ham keshdan
+        again = await cache.get("@ch", 1, fetch, trust_negative=False)
+        return first, cached, explicit, again
+
+    assert asyncio.run(run()) == (False, False, True, True)
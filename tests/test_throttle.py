@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from throttle import ThrottleMiddleware
+
+
+def _data(uid: int) -> dict:
+    return {"event_from_user": SimpleNamespace(id=uid)}
+
+
+def test_single_flight_drops_repeated_press():
+    async def run():
+        mw = ThrottleMiddleware(lambda e: "check_sub", cooldown=0)
+        gate = asyncio.Event()
+        calls = []
+
+        async def handler(event, data):
+            calls.append(event)
+            await gate.wait()
+            return "ok"
+
+        first = asyncio.ensure_future(mw(handler, "a", _data(1)))
+        await asyncio.sleep(0)
+        second = await mw(handler, "b", _data(1))
+        other = asyncio.ensure_future(mw(handler, "c", _data(2)))
+        await asyncio.sleep(0)
+        gate.set()
+        return await first, second, await other, calls, mw.stats()
+
+    first, second, other, calls, stats = asyncio.run(run())
+    assert (first, second, other) == ("ok", None, "ok")
+    assert calls == ["a", "c"]
+    assert stats["coalesced"] == 1 and stats["inflight"] == 0
+
+
+def test_cooldown_then_pass_again():
+    async def run():
+        mw = ThrottleMiddleware(lambda e: None if e == "free" else "start", cooldown=0.05)
+
+        async def handler(event, data):
+            return event
+
+        out = [await mw(handler, "x", _data(1)), await mw(handler, "x", _data(1)),
+               await mw(handler, "free", _data(1))]
+        await asyncio.sleep(0.06)
+        out.append(await mw(handler, "x", _data(1)))
+        return out, mw.throttled
+
+    assert asyncio.run(run()) == (["x", None, "free", "x"], 1)
+
+
+def test_recent_map_is_bounded():
+    async def run():
+        mw = ThrottleMiddleware(lambda e: "start", cooldown=60, maxsize=2)
+
+        async def handler(event, data):
+            return None
+
+        for uid in range(5):
+            await mw(handler, "x", _data(uid))
+        return len(mw)
+
+    assert asyncio.run(run()) == 2
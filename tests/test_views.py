@@ -0,0 +1,43 @@
+import asyncio
+
+from views import ViewCache
+
+
+def test_render_once_then_debounce_invalidations():
+    async def run():
+        views = ViewCache(min_interval=0.05, max_age=60)
+        renders = []
+
+        async def render():
+            renders.append(1)
+            await asyncio.sleep(0.01)
+            return f"v{len(renders)}"
+
+        first = await asyncio.gather(*(views.get("top", render) for _ in range(5)))
+        views.invalidate()
+        debounced = await views.get("top", render)
+        await asyncio.sleep(0.06)
+        fresh = await views.get("top", render)
+        clean = await views.get("top", render)
+        return [h for h, _ in first], debounced[0], fresh[0], clean[0], views.renders
+
+    first, debounced, fresh, clean, renders = asyncio.run(run())
+    assert first == ["v1"] * 5
+    assert debounced == "v1"
+    assert (fresh, clean) == ("v2", "v2")
+    assert renders == 2
+
+
+def test_max_age_forces_rebuild():
+    async def run():
+        views = ViewCache(min_interval=0, max_age=0.02)
+        n = iter(range(10))
+
+        async def render():
+            return str(next(n))
+
+        first = await views.get("report", render)
+        await asyncio.sleep(0.03)
+        return first[0], (await views.get("report", render))[0]
+
+    assert asyncio.run(run()) == ("0", "1")
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from workers import Supervisor, route
+
+
+class FakeProcess:
+    def __init__(self, target, args, name, daemon):
+        self.name = name
+        self.alive = False
+        self.exitcode = None
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeContext:
+    Process = FakeProcess
+
+    def Queue(self):
+        return []
+
+
+def test_admins_and_ownerless_updates_go_to_worker_zero():
+    msg = lambda uid: {"update_id": 1, "message": {"from": {"id": uid}, "chat": {"id": uid}}}
+    assert route(msg(7), 3, [7]) == 0
+    assert route(msg(7), 3, []) == 1
+    assert route({"update_id": 1}, 3, []) == 0
+
+
+def test_dead_worker_is_respawned_with_its_queue():
+    sup = Supervisor(SimpleNamespace(WORKERS=3))
+    sup.ctx = FakeContext()
+    sup.start_workers()
+    queue, old = sup.queues[1], sup.procs[1]
+    old.alive, old.exitcode = False, 1
+
+    assert sup.respawn_dead() == [1]
+    assert sup.procs[1] is not old and sup.procs[1].is_alive()
+    assert sup.queues[1] is queue
+    assert sup.restarts == [0, 1, 0]
+    assert sup.respawn_dead() == []
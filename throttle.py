@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, Message, TelegramObject, User
+
+Key = Tuple[int, str]
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """
+    Outer middleware (message + callback_query): qimmat amallar (obuna tekshiruvi va h.k.)
+    uchun har user bo'yicha:
+    - single-flight: shu amal hali ishlanayotgan bo'lsa takroriy bosish handlerga yetmaydi
+    - cooldown: amal tugagach `cooldown` soniya ichida qayta bosish — "biroz kuting" javobi
+      (callback'ga answer, xabarga esa oynada bir marta reply)
+    `action_of(event)` amal nomini beradi (None — cheklanmaydi); bir xil nomli tugmalar
+    (masalan reply va inline "Obunani tekshirish") bitta amal hisoblanadi.
+    Holat LRU + muddatli map'da: eng ko'pi `maxsize` yozuv, eskirganlari yozishda tozalanadi.
+    """
+
+    def __init__(self, action_of: Callable[[TelegramObject], Optional[str]],
+                 cooldown: float = 3, maxsize: int = 100_000):
+        self.action_of = action_of
+        self.cooldown = cooldown
+        self.maxsize = maxsize
+        # key -> (tugash vaqti, ogohlantirildimi)
+        self._recent: "OrderedDict[Key, Tuple[float, bool]]" = OrderedDict()
+        self._inflight: Set[Key] = set()
+        self.passed = 0
+        self.coalesced = 0
+        self.throttled = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        action = self.action_of(event) if user is not None else None
+        if action is None:
+            return await handler(event, data)
+
+        key = (user.id, action)
+        if key in self._inflight:
+            self.coalesced += 1
+            await self._wait(event, notify=isinstance(event, CallbackQuery))
+            return None
+
+        now = time.monotonic()
+        item = self._recent.get(key)
+        if item is not None and item[0] > now:
+            self.throttled += 1
+            until, warned = item
+            self._recent[key] = (until, True)
+            await self._wait(event, notify=not warned or isinstance(event, CallbackQuery), left=until - now)
+            return None
+
+        self.passed += 1
+        self._inflight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._inflight.discard(key)
+            self._remember(key)
+
+    def _remember(self, key: Key):
+        now = time.monotonic()
+        self._recent.pop(key, None)
+        self._recent[key] = (now + self.cooldown, False)
+        # cooldown bir xil — tartib tugash vaqti bo'yicha, eskirganlar boshida
+        while self._recent:
+            first = next(iter(self._recent.values()))
+            if first[0] > now and len(self._recent) <= self.maxsize:
+                break
+            self._recent.popitem(last=False)
+
+    @staticmethod
+    async def _wait(event: TelegramObject, notify: bool, left: float = 0):
+        text = "⏳ Biroz kuting..." if left < 1 else f"⏳ Biroz kuting ({int(left + 0.999)} s)..."
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(text)
+            elif isinstance(event, Message) and notify:
+                await event.answer(text)
+        except TelegramBadRequest:
+            # callback eskirgan va h.k.
+            pass
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "passed": self.passed,
+            "coalesced": self.coalesced,
+            "throttled": self.throttled,
+            "tracked": len(self._recent),
+            "inflight": len(self._inflight),
+        }
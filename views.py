@@ -0,0 +1,56 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ViewCache:
+    """
+    Og'ir ekranlar (TOP-10, admin hisobot) uchun tayyor HTML keshi — hamma userlar uchun bitta.
+    - invalidate(): referral qo'shilganda/resetda "eskirgan" deb belgilanadi (istalgan thread'dan)
+    - eskirgan bo'lsa ham `min_interval` soniyadan tez qayta qurilmaydi (write storm'da debounce)
+    - `max_age` dan eski bo'lsa baribir yangilanadi (boshqa jarayon yozuvlari, "bugun" chegarasi)
+    """
+
+    def __init__(self, min_interval: float = 3, max_age: float = 60):
+        self.min_interval = min_interval
+        self.max_age = max_age
+        self._views: Dict[str, Tuple[str, float]] = {}
+        self._dirty: Dict[str, bool] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.renders = 0
+
+    def invalidate(self, name: Optional[str] = None):
+        for key in ([name] if name else list(self._views)):
+            self._dirty[key] = True
+
+    def _fresh(self, name: str, now: float) -> Optional[Tuple[str, float]]:
+        item = self._views.get(name)
+        if item is None:
+            return None
+        age = now - item[1]
+        if age < self.min_interval:
+            return item
+        if not self._dirty.get(name) and age < self.max_age:
+            return item
+        return None
+
+    async def get(self, name: str, render: Callable[[], Awaitable[str]]) -> Tuple[str, float]:
+        """(html, generated_at unix) qaytaradi."""
+        item = self._fresh(name, time.time())
+        if item:
+            self.hits += 1
+            return item
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # lock kutayotganda boshqasi qurib qo'ygan bo'lishi mumkin
+            item = self._fresh(name, time.time())
+            if item:
+                self.hits += 1
+                return item
+            self._dirty[name] = False
+            html = await render()
+            item = (html, time.time())
+            self._views[name] = item
+            self.renders += 1
+            return item
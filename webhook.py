@@ -0,0 +1,150 @@
+"""
+Webhook rejimi (aiohttp). Lokal tekshirish uchun Telegram'siz ham ishlaydi:
+WEBHOOK_BASE_URL bo'sh bo'lsa set_webhook chaqirilmaydi, yozib olingan
+update'larni shunchaki POST qilish mumkin:
+
+    python webhook.py replay updates.jsonl http://127.0.0.1:8080/webhook SECRET
+"""
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+from metrics import metrics_handler
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class InflightTracker:
+    """Dispatcher outer middleware: hozir nechta update ishlanayotganini sanaydi."""
+
+    def __init__(self):
+        self.inflight = 0
+        self.handled = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(self, handler: Callable[..., Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
+        self.inflight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.inflight -= 1
+            self.handled += 1
+            if self.inflight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def build_app(dp, bot, cfg, tracker: InflightTracker,
+              health: Optional[Callable[[], Dict[str, Any]]] = None,
+              drain_timeout: float = 25) -> web.Application:
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    app = web.Application()
+    started = time.monotonic()
+    handler = SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=cfg.WEBHOOK_SECRET)
+
+    async def healthz(request: web.Request) -> web.Response:
+        body = {
+            "ok": True,
+            "mode": "webhook",
+            "uptime_s": int(time.monotonic() - started),
+            "inflight": tracker.inflight,
+            "handled": tracker.handled,
+        }
+        if health:
+            body.update(health())
+        return web.json_response(body)
+
+    async def drain(app: web.Application):
+        # site yopilgan, yangi so'rov kelmaydi — boshlanganlarini tugatamiz
+        pending = [t for t in getattr(handler, "_background_feed_update_tasks", ()) if not t.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=drain_timeout)
+        ok = await tracker.drain(drain_timeout)
+        log.info("webhook drain: %s (inflight=%s)", "ok" if ok else "timeout", tracker.inflight)
+
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics_handler)
+    # drain dp.shutdown (setup_application qo'shadi) dan oldin ishlashi kerak
+    app.on_shutdown.append(drain)
+    handler.register(app, path=cfg.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp, bot, cfg, tracker: InflightTracker,
+                      health: Optional[Callable[[], Dict[str, Any]]] = None):
+    app = build_app(dp, bot, cfg, tracker, health=health)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, cfg.WEB_HOST, cfg.WEB_PORT)
+    await site.start()
+    log.info("webhook server: http://%s:%s%s", cfg.WEB_HOST, cfg.WEB_PORT, cfg.WEBHOOK_PATH)
+
+    if cfg.WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            cfg.WEBHOOK_BASE_URL + cfg.WEBHOOK_PATH,
+            secret_token=cfg.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    else:
+        log.warning("WEBHOOK_BASE_URL yo'q — set_webhook chaqirilmadi (lokal rejim)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    try:
+        await stop.wait()
+    finally:
+        # webhook'ni o'chirmaymiz: Telegram update'larni yangi instansga yetkazadi
+        await runner.cleanup()
+
+
+async def replay(path: str, url: str, secret: str = "", delay: float = 0):
+    """JSONL fayldagi update'larni serverga POST qiladi (lokal test)."""
+    import aiohttp
+
+    headers = {SECRET_HEADER: secret} if secret else {}
+    ok = failed = 0
+    async with aiohttp.ClientSession() as session:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                async with session.post(url, data=line, headers={**headers, "Content-Type": "application/json"}) as resp:
+                    if resp.status == 200:
+                        ok += 1
+                    else:
+                        failed += 1
+                        print(resp.status, (await resp.text())[:200])
+                if delay:
+                    await asyncio.sleep(delay)
+    print(json.dumps({"ok": ok, "failed": failed}))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "replay":
+        asyncio.run(replay(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else ""))
+    else:
+        print(__doc__)
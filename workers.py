@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import signal
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# supervisor getUpdates'da so'raydigan update turlari (bot.py dagi handlerlar)
+ALLOWED_UPDATES = ["message", "callback_query", "chat_member", "my_chat_member"]
+
+
+def update_user_id(data: Dict[str, Any]) -> Optional[int]:
+    """Update kimga tegishli: shu user_id bo'yicha jarayon tanlanadi."""
+    for kind, obj in data.items():
+        if kind == "update_id" or not isinstance(obj, dict):
+            continue
+        if kind == "chat_member":
+            # kanal a'zoligi — o'sha userning obuna keshi turgan workerga
+            return int(obj["new_chat_member"]["user"]["id"])
+        user = obj.get("from") or obj.get("user")
+        if user:
+            return int(user["id"])
+        chat = obj.get("chat")
+        if chat:
+            return int(chat["id"])
+    return None
+
+
+def route(data: Dict[str, Any], workers: int, admin_ids: List[int]) -> int:
+    uid = update_user_id(data)
+    if uid is None or uid in admin_ids:
+        # adminlar va "egasiz" update'lar — 0-worker (global holat egasi)
+        return 0
+    return uid % workers
+
+
+# ---------- worker jarayoni ----------
+def worker_main(index: int, queue: "mp.Queue"):
+    os.environ["BOT_WORKER_INDEX"] = str(index)
+    logging.basicConfig(level=logging.INFO, format=f"[w{index}] %(levelname)s %(name)s: %(message)s")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(queue))
+
+
+async def _worker_loop(queue: "mp.Queue"):
+    # spawn bot.py ni `__mp_main__` sifatida ham bajargan — modul tanasida faqat handlerlar;
+    # o'z DB ulanishlari, Sender, keshlar shu yerda, jarayonda bir marta quriladi
+    import bot as app
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.types import Update
+
+    tg = Bot(token=app.cfg.BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+    tg.session.middleware(app.ApiTimingMiddleware())
+    dp = app.setup()
+    await dp.emit_startup(bot=tg)
+    loop = asyncio.get_running_loop()
+    # bitta user update'lari ketma-ket, turli userlar — parallel
+    chains: Dict[int, asyncio.Task] = {}
+
+    async def handle(prev: Optional[asyncio.Task], data: Dict[str, Any]):
+        if prev is not None:
+            await asyncio.gather(prev, return_exceptions=True)
+        update = Update.model_validate(data, context={"bot": tg})
+        await dp.feed_update(tg, update)
+
+    def done(uid: int, task: asyncio.Task):
+        if chains.get(uid) is task:
+            del chains[uid]
+        if not task.cancelled() and task.exception():
+            log.error("update failed", exc_info=task.exception())
+
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            uid = update_user_id(data) or 0
+            task = asyncio.create_task(handle(chains.get(uid), data))
+            chains[uid] = task
+            task.add_done_callback(lambda t, uid=uid: done(uid, t))
+        if chains:
+            await asyncio.gather(*chains.values(), return_exceptions=True)
+    finally:
+        await dp.emit_shutdown(bot=tg)
+        await tg.session.close()
+        app.adb.close()
+
+
+# ---------- supervisor ----------
+class Supervisor:
+    """
+    Update'larni bir marta oladi (polling yoki webhook) va `user_id % N` bo'yicha
+    worker jarayonlarga yuboradi — har user update'lari tartibi saqlanadi.
+
+    SQLite: har jarayonda o'z writer ulanishi (WAL, busy timeout), in-memory
+    leaderboard o'chiq — reyting referral_counts indeksidan olinadi.
+    Global holat (target, broadcast, admin buyruqlari) egasi — 0-worker.
+    Yiqilgan worker `respawn_every` soniyada aniqlanib, o'sha navbat bilan qayta ishga tushadi —
+    uning userlari (`uid % N`) jim tashlanib qolmaydi.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.n = cfg.WORKERS
+        self.ctx = mp.get_context("spawn")
+        self.queues: List["mp.Queue"] = []
+        self.procs: List[mp.Process] = []
+        self.routed = [0] * self.n
+        self.restarts = [0] * self.n
+
+    def _spawn(self, i: int) -> mp.Process:
+        p = self.ctx.Process(target=worker_main, args=(i, self.queues[i]), name=f"bot-worker-{i}", daemon=False)
+        p.start()
+        return p
+
+    def start_workers(self):
+        self.queues = [self.ctx.Queue() for _ in range(self.n)]
+        self.procs = [self._spawn(i) for i in range(self.n)]
+
+    def respawn_dead(self) -> List[int]:
+        """Yiqilgan worker'larni qayta ishga tushiradi; navbatdagi update'lari yangisiga qoladi."""
+        dead = [i for i, p in enumerate(self.procs) if not p.is_alive()]
+        for i in dead:
+            log.error("%s yiqildi (exitcode=%s) — qayta ishga tushiriladi", self.procs[i].name, self.procs[i].exitcode)
+            self.restarts[i] += 1
+            self.procs[i] = self._spawn(i)
+        return dead
+
+    async def _watch(self, stop: asyncio.Event, every: float = 5):
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), every)
+            except asyncio.TimeoutError:
+                self.respawn_dead()
+
+    def dispatch(self, data: Dict[str, Any]):
+        i = route(data, self.n, self.cfg.ADMIN_IDS)
+        self.routed[i] += 1
+        self.queues[i].put(data)
+
+    async def stop_workers(self, timeout: float = 30):
+        for q in self.queues:
+            q.put(None)
+        loop = asyncio.get_running_loop()
+        for p in self.procs:
+            await loop.run_in_executor(None, p.join, timeout)
+            if p.is_alive():
+                log.warning("%s to'xtamadi, terminate", p.name)
+                p.terminate()
+
+    async def run(self):
+        from aiogram import Bot
+
+        bot = Bot(token=self.cfg.BOT_TOKEN)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+
+        self.start_workers()
+        watcher = asyncio.create_task(self._watch(stop))
+        try:
+            if self.cfg.BOT_MODE == "webhook":
+                await self._run_webhook(bot, stop)
+            else:
+                await self._run_polling(bot, stop)
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+            await self.stop_workers()
+            await bot.session.close()
+
+    async def _run_polling(self, bot, stop: asyncio.Event):
+        await bot.delete_webhook()
+        offset = None
+        while not stop.is_set():
+            poll = asyncio.create_task(
+                bot.get_updates(offset=offset, timeout=25, allowed_updates=ALLOWED_UPDATES)
+            )
+            waiter = asyncio.create_task(stop.wait())
+            await asyncio.wait({poll, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if not poll.done():
+                poll.cancel()
+                break
+            try:
+                updates = poll.result()
+            except Exception as e:
+                log.warning("get_updates: %r", e)
+                await asyncio.sleep(1)
+                continue
+            for u in updates:
+                offset = u.update_id + 1
+                self.dispatch(u.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+    async def _run_webhook(self, bot, stop: asyncio.Event):
+        from aiohttp import web
+        from webhook import SECRET_HEADER
+
+        async def receive(request: web.Request) -> web.Response:
+            if request.headers.get(SECRET_HEADER) != self.cfg.WEBHOOK_SECRET:
+                return web.Response(status=401)
+            self.dispatch(await request.json())
+            return web.Response()
+
+        async def healthz(request: web.Request) -> web.Response:
+            alive = [p.is_alive() for p in self.procs]
+            return web.json_response(
+                {"ok": all(alive), "mode": "supervisor", "workers": alive, "routed": self.routed,
+                 "restarts": self.restarts},
+                status=200 if all(alive) else 503,
+            )
+
+        app = web.Application()
+        app.router.add_post(self.cfg.WEBHOOK_PATH, receive)
+        app.router.add_get("/healthz", healthz)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.cfg.WEB_HOST, self.cfg.WEB_PORT).start()
+        if self.cfg.WEBHOOK_BASE_URL:
+            await bot.set_webhook(
+                self.cfg.WEBHOOK_BASE_URL + self.cfg.WEBHOOK_PATH,
+                secret_token=self.cfg.WEBHOOK_SECRET,
+                allowed_updates=ALLOWED_UPDATES,
+            )
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()